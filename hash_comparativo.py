@@ -2,16 +2,46 @@
 from __future__ import annotations
 
 import csv
+import gzip
 import time
 import json
 import hashlib
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List, Tuple
 import os
+import re
+import tempfile
+import sys
+import html
+from html.parser import HTMLParser
+import posixpath
+from urllib.parse import urljoin, urlparse
+import zipfile
+import mmap
+import struct
+import bisect
+import shutil
+import subprocess
+import select
+from array import array
+import threading
+import xml.etree.ElementTree as ET
+from collections.abc import Mapping
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import fcntl  # lock entre procesos para los index.json públicos (no existe en Windows)
+except ImportError:
+    fcntl = None
 
 import requests
+from requests.adapters import HTTPAdapter
 from openpyxl import load_workbook, Workbook
+from openpyxl.styles.numbers import is_date_format, is_timedelta_format, builtin_format_code
+from openpyxl.utils.cell import column_index_from_string, get_column_letter, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -19,6 +49,7 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import SessionNotCreatedException, TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
 # ========= CONFIG (paths portables p/CI) =========
@@ -28,6 +59,10 @@ RUTA_DESCARGA = BASE_DIR / "downloads"
 HASH_DB_DIR   = BASE_DIR / "_hashdb"
 SNAP_DIR      = BASE_DIR / "_snapshots"
 REPORTS_DIR   = BASE_DIR / "_reports"
+HIST_DIR      = BASE_DIR / "_historial"
+CACHE_DIR     = BASE_DIR / "_cache"
+CORRIDAS_PATH = HASH_DB_DIR / "corridas.jsonl"   # ledger: un registro por fuente por corrida
+ARCHIVO_DIR   = BASE_DIR / "_archivo"
 
 # carpetas que publicamos en GitHub Pages
 PUBLIC_REPORTS_DIR = BASE_DIR / "public_reports"
@@ -37,35 +72,121 @@ PUBLIC_LISTAS_DIR  = BASE_DIR / "public_listas"
 DB_DIR        = BASE_DIR / "_db"
 PUBLIC_DB_DIR = BASE_DIR / "public_db"
 
-for d in (RUTA_DESCARGA, HASH_DB_DIR, SNAP_DIR, REPORTS_DIR, PUBLIC_REPORTS_DIR, PUBLIC_LISTAS_DIR, DB_DIR, PUBLIC_DB_DIR):
+for d in (RUTA_DESCARGA, HASH_DB_DIR, SNAP_DIR, REPORTS_DIR, HIST_DIR, CACHE_DIR, ARCHIVO_DIR, PUBLIC_REPORTS_DIR, PUBLIC_LISTAS_DIR, DB_DIR, PUBLIC_DB_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
+# Publicación de artefactos (_db, public_*): "enlace" (hardlink → reflink → copia del kernel) o "copia"
+PUBLICAR_MODO = os.getenv("PUBLICAR_MODO", "enlace").lower()
+
 # Si el hash es igual al previo → se elimina el archivo recién bajado (configurable por ENV).
 BORRAR_DUPLICADO = os.getenv("BORRAR_DUPLICADO", "true").lower() == "true"
 
+# Gate por CONTENIDO: si el binario cambió pero las filas (ID/Stock/Precio/Moneda) no,
+# no se adopta base ni se regeneran Hoja 1 / difs (re-guardados inocuos del proveedor).
+HASH_CONTENIDO = os.getenv("HASH_CONTENIDO", "false").lower() == "true"
+
+# Hoja 1: si sus filas son idénticas a la última escrita, no se re-escribe ni se re-publica
+HOJA1_SOLO_SI_CAMBIA = os.getenv("HOJA1_SOLO_SI_CAMBIA", "true").lower() == "true"
+
 # URLs fuentes (ajustá si cambian)
-URL_TEVELAM = "https://drive.google.com/uc?export=download&id=1hPH3VwQDtMgx_AkC5hFCUbM2MEiwBEpT"
-URL_DISCO_PRO = "https://drive.google.com/uc?id=1-aQ842Dq3T1doA-Enb34iNNzenLGkVkr&export=download"
-URL_PROVEEDOR_EXTRA = "https://docs.google.com/uc?id=1JnUnrpZUniTXUafkAxCInPG7O39yrld5&export=download"
+# (overridables por ENV, p.ej. para apuntar a un servidor HTTP local de prueba)
+URL_TEVELAM = os.getenv("URL_TEVELAM", "https://drive.google.com/uc?export=download&id=1hPH3VwQDtMgx_AkC5hFCUbM2MEiwBEpT")
+URL_DISCO_PRO = os.getenv("URL_DISCO_PRO", "https://drive.google.com/uc?id=1-aQ842Dq3T1doA-Enb34iNNzenLGkVkr&export=download")
+URL_PROVEEDOR_EXTRA = os.getenv("URL_PROVEEDOR_EXTRA", "https://docs.google.com/uc?id=1JnUnrpZUniTXUafkAxCInPG7O39yrld5&export=download")
 
 # IMSA con login embebido en iframe
-IMSA_URL = "https://listaimsa.com.ar/lista-de-precios/"
+IMSA_URL = os.getenv("IMSA_URL", "https://listaimsa.com.ar/lista-de-precios/")
 IMSA_PASSWORD = os.getenv("IMSA_PASSWORD", "lista2021")
+# "auto": login/descarga por HTTP (requests) y Selenium sólo si falla; "http" / "selenium" fuerzan uno
+IMSA_MODO = os.getenv("IMSA_MODO", "auto").lower()
 
 REQ_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
 TIMEOUT = 60
+DOWNLOAD_CHUNK = 256 * 1024
+# GET condicional (If-None-Match / If-Modified-Since): si el server dice "sin cambios" no se baja el cuerpo
+DESCARGA_CONDICIONAL = os.getenv("DESCARGA_CONDICIONAL", "true").lower() == "true"
+# Hilos para bajar en simultáneo las fuentes HTTP (Drive)
+DOWNLOAD_WORKERS = max(1, int(os.getenv("DOWNLOAD_WORKERS", "3")))
+
+# Backend de lectura xlsx: "rapido" (iterparse directo del zip) u "openpyxl"
+LECTOR_XLSX = os.getenv("LECTOR_XLSX", "rapido").lower()
+# Backend de escritura (Hoja 1 y libro de cambios): "rapido" (XML directo al zip) u "openpyxl"
+ESCRITOR_XLSX = os.getenv("ESCRITOR_XLSX", "rapido").lower()
 
 # IMSA: incluir TODO para analizar precio aunque no haya stock
 IMSA_SOLO_CON_STOCK = os.getenv("IMSA_SOLO_CON_STOCK", "false").lower() == "true"
 IMSA_BORRAR_ORIGINAL = os.getenv("IMSA_BORRAR_ORIGINAL", "false").lower() == "true"
+# Plazo total (seg) para que la descarga automática de IMSA termine después del login
+IMSA_TIMEOUT = float(os.getenv("IMSA_TIMEOUT", "120"))
+# Chrome para Selenium: binario (vacío = buscar en PATH) y perfil persistente opcional
+# (cookies/caché entre corridas, p.ej. corriendo como daemon; vacío = perfil nuevo cada vez).
+# Un perfil no se puede abrir desde dos Chrome a la vez: no compartirlo entre corridas simultáneas.
+CHROME_BIN = os.getenv("CHROME_BIN", "")
+CHROME_PERFIL = os.getenv("CHROME_PERFIL", "")
+
+# Snapshots: el binario (.bin, mmap) es el formato de trabajo; con esto se exporta también el CSV
+SNAPSHOT_CSV = os.getenv("SNAPSHOT_CSV", "false").lower() == "true"
+
+# Cache de registros ya extraídos, direccionado por SHA-256 del archivo (LRU acotado en MB; 0 = off)
+CACHE_REGISTROS_MB = float(os.getenv("CACHE_REGISTROS_MB", "64"))
+
+# Salidas legibles por máquina de cada dif, junto al xlsx: "jsonl", "csv.gz" (coma) o "" para ninguna
+DIFF_SALIDAS = [x.strip() for x in os.getenv("DIFF_SALIDAS", "jsonl,csv.gz").lower().split(",") if x.strip()]
+
+# index.json de public_reports / public_listas: se actualiza en cada publicación (upsert atómico);
+# pasado este tope de ítems, los más viejos se archivan en páginas index-NNNN.json
+INDICE_PUBLICO_MAX = max(2, int(os.getenv("INDICE_PUBLICO_MAX", "200")))
+
+# Retención por carpeta (por serie = fuente): últimos N + 1 por día (D días) + 1 por semana (S semanas),
+# con tope total en MB. Lo que sale va a _archivo/<carpeta>/<carpeta>_AAAA-MM_<ts>.zip (+ índice), un zip
+# por corrida que no se reescribe. _archivo/ no se versiona: en CI lo borrado ya queda en el historial de git.
+# RETENCION_JSON pisa/agrega políticas, p.ej. '{"downloads": {"ultimos": 5}}'.
+RETENCION = os.getenv("RETENCION", "true").lower() == "true"
+RETENCION_DRY_RUN = os.getenv("RETENCION_DRY_RUN", "false").lower() == "true"
+POLITICAS_RETENCION: Dict[str, Dict[str, float]] = {
+    "public_reports": {"ultimos": 20, "diarios": 14, "semanales": 8, "max_mb": 100},
+    "public_listas":  {"ultimos": 3,  "diarios": 7,  "semanales": 4, "max_mb": 50},
+    "_reports":       {"ultimos": 20, "diarios": 14, "semanales": 8, "max_mb": 200},
+    "downloads":      {"ultimos": 2,  "diarios": 0,  "semanales": 0, "max_mb": 200},
+}
+for _carpeta, _pol in json.loads(os.getenv("RETENCION_JSON", "{}") or "{}").items():
+    POLITICAS_RETENCION.setdefault(_carpeta, {"ultimos": 0, "diarios": 0, "semanales": 0, "max_mb": 0}).update(_pol)
+
+# Historial append-only de precios: cada versión adoptada guarda sólo lo que cambió;
+# cada N versiones (o si el delta es grande) se escribe una foto completa.
+HISTORIAL = os.getenv("HISTORIAL", "true").lower() == "true"
+HIST_CHECKPOINT_CADA = max(1, int(os.getenv("HIST_CHECKPOINT_CADA", "30")))
+
+# Difs con NumPy (si está instalado): "auto" = sólo catálogos grandes, "true" = siempre, "false" = nunca
+DIFF_NUMPY = os.getenv("DIFF_NUMPY", "auto").lower()
+DIFF_NUMPY_MIN = int(os.getenv("DIFF_NUMPY_MIN", "20000"))
+
+# Procesos worker para correr fuentes en paralelo (1 = en serie, como antes).
+MAX_WORKERS = max(1, int(os.getenv("MAX_WORKERS", "4")))
 
 # ========= LOG / UTILS =========
+# En un worker el log se acumula acá y lo imprime el proceso principal (orden estable).
+_LOG_BUFFER: Optional[List[str]] = None
+_LOG_LOCK = threading.Lock()  # descargas en threads: una línea por vez
+
 def log(msg: str) -> None:
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+    linea = f"[{datetime.now().strftime('%H:%M:%S')}] {msg}"
+    with _LOG_LOCK:
+        if _LOG_BUFFER is not None:
+            _LOG_BUFFER.append(linea)
+        else:
+            print(linea, flush=True)
 
 def ts() -> str:
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
+# Ídem con el registro de la fuente para el ledger de corridas: cada etapa anota lo suyo.
+_CORRIDA: Optional[Dict[str, Any]] = None
+
+def anotar_corrida(**campos: Any) -> None:
+    if _CORRIDA is not None:
+        _CORRIDA.update(campos)
+
 # ========= FECHA LOCAL ARG =========
 try:
     from zoneinfo import ZoneInfo
@@ -101,6 +222,113 @@ def read_prev_hash(source_key: str) -> Optional[str]:
 def write_hash(source_key: str, hexhash: str) -> None:
     _hash_path(source_key).write_text(hexhash, encoding='utf-8')
 
+# Hash de CONTENIDO (filas normalizadas ID/Stock/Precio/Moneda), junto al hash binario
+def _content_hash_path(source_key: str) -> Path:
+    return HASH_DB_DIR / f"{source_key}.content.sha256"
+
+def read_prev_content_hash(source_key: str) -> Optional[str]:
+    p = _content_hash_path(source_key)
+    if p.exists():
+        try:
+            return p.read_text(encoding='utf-8').strip()
+        except Exception:
+            return None
+    return None
+
+def write_content_hash(source_key: str, hexhash: str) -> None:
+    _content_hash_path(source_key).write_text(hexhash, encoding='utf-8')
+
+# Digest de las filas de la última Hoja 1 escrita (en orden: es el contenido exacto del xlsx)
+def _hoja1_hash_path(source_key: str) -> Path:
+    return HASH_DB_DIR / f"{source_key}.hoja1.sha256"
+
+def hoja1_sha256(registros: Registros) -> str:
+    return hashlib.sha256(registros.a_bytes()).hexdigest()
+
+def read_prev_hoja1_hash(source_key: str) -> Optional[str]:
+    p = _hoja1_hash_path(source_key)
+    if p.exists():
+        try:
+            return p.read_text(encoding='utf-8').strip()
+        except Exception:
+            return None
+    return None
+
+def write_hoja1_hash(source_key: str, hexhash: str) -> None:
+    _hoja1_hash_path(source_key).write_text(hexhash, encoding='utf-8')
+
+def content_sha256(registros: Registros) -> str:
+    # Independiente del orden de filas y de cómo el proveedor re-guardó el zip/xlsx
+    filas = sorted(
+        f"{_id}\t{st}\t{pr!r}\t{mo}"
+        for _id, st, pr, mo in registros.filas()
+    )
+    h = hashlib.sha256()
+    for f in filas:
+        h.update(f.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+# Validadores HTTP (ETag / Last-Modified / Content-Length) del archivo cuyo hash está en _hashdb
+def _http_meta_path(source_key: str) -> Path:
+    return HASH_DB_DIR / f"{source_key}.http.json"
+
+def leer_validadores_http(source_key: str) -> Dict[str, Any]:
+    p = _http_meta_path(source_key)
+    if not p.exists(): return {}
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def escribir_validadores_http(source_key: str, headers, sha256_hex: str) -> None:
+    meta = {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "content_length": headers.get("Content-Length"),
+        "sha256": sha256_hex,
+    }
+    if not (meta["etag"] or meta["last_modified"]):
+        _http_meta_path(source_key).unlink(missing_ok=True)
+        return
+    _http_meta_path(source_key).write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+# ========= PUBLICACIÓN DE ARCHIVOS =========
+# Nada pasa por memoria de Python: hardlink si se puede (mismo filesystem), si no reflink
+# (FICLONE: btrfs/xfs) y si no shutil.copyfile (sendfile/copy_file_range). Siempre a un
+# temporal en la carpeta destino + os.replace, y se valida por tamaño en vez de re-leer.
+# Con hardlinks origen y destino comparten inodo: todo lo que escribe este script lo hace
+# con tmp + replace (inodo nuevo), así que una copia publicada nunca cambia por debajo.
+_FICLONE = 0x40049409
+
+def _reflink(src: Path, dst: Path) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        with src.open("rb") as fi, dst.open("wb") as fo:
+            fcntl.ioctl(fo.fileno(), _FICLONE, fi.fileno())
+        return True
+    except OSError:
+        dst.unlink(missing_ok=True)
+        return False
+
+def publicar_archivo(src: Path, dst: Path) -> Path:
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    esperado = src.stat().st_size
+    try:
+        if PUBLICAR_MODO != "enlace":
+            raise OSError("modo copia")
+        os.link(src, tmp)
+    except OSError:
+        if not (PUBLICAR_MODO == "enlace" and _reflink(src, tmp)):
+            shutil.copyfile(src, tmp)
+    if tmp.stat().st_size != esperado:
+        tmp.unlink(missing_ok=True)
+        raise OSError(f"copia incompleta de {src.name} ({esperado} bytes esperados)")
+    os.replace(tmp, dst)
+    return dst
+
 # ========= MANEJO DE BASE (COPIA EXACTA) =========
 def _db_path(source_key: str) -> Path:
     return DB_DIR / f"{source_key}_DB.xlsx"
@@ -123,19 +351,17 @@ def escribir_db_meta(source_key: str, *, sha256: str, saved_at_utc: str) -> None
         "saved_at_utc": saved_at_utc,
         "saved_at_ar": datetime.now(TZ_AR).strftime("%Y-%m-%d %H:%M:%S") if TZ_AR else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
-    _db_meta_path(source_key).write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    # tmp + replace: la copia en public_db puede ser un hardlink de este archivo
+    _escribir_json_atomico(_db_meta_path(source_key), meta, indent=2)
 
 def adoptar_como_base(source_key: str, downloaded: Path, sha256_hex: str) -> Path:
     # Copia exacta a _db y publica en public_db
-    dst = _db_path(source_key)
-    dst.write_bytes(downloaded.read_bytes())
+    dst = publicar_archivo(downloaded, _db_path(source_key))
     escribir_db_meta(source_key, sha256=sha256_hex, saved_at_utc=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
     # publicar en Pages
     try:
-        (PUBLIC_DB_DIR / dst.name).write_bytes(dst.read_bytes())
-        (PUBLIC_DB_DIR / f"{source_key}_DB.meta.json").write_text(
-            _db_meta_path(source_key).read_text(encoding="utf-8"), encoding="utf-8"
-        )
+        publicar_archivo(dst, PUBLIC_DB_DIR / dst.name)
+        publicar_archivo(_db_meta_path(source_key), PUBLIC_DB_DIR / f"{source_key}_DB.meta.json")
     except Exception as e:
         log(f"⚠️ No se pudo publicar base en public_db: {e}")
     log(f"💾 Base actualizada: {dst.name}")
@@ -159,56 +385,183 @@ def skip_por_base_de_hoy(source_key: str) -> bool:
     return False
 
 # ========= DECISIÓN (HASH COMPLETO) =========
-def decide_should_process(source_key: str, path: Optional[Path]) -> bool:
+def _borrar_duplicado(source_key: str, path: Path) -> None:
+    if BORRAR_DUPLICADO:
+        try:
+            path.unlink(missing_ok=True)
+            log(f"🗑️ {source_key}: duplicado eliminado: {path.name}")
+        except Exception as e:
+            log(f"⚠️ {source_key}: no se pudo borrar duplicado: {e}")
+
+def decide_should_process(source_key: str, path: Optional[Path], sha256_hex: Optional[str] = None,
+                          adoptar: bool = True, registrar: bool = True) -> Tuple[bool, Optional[str]]:
     """
     Comparación estricta por SHA-256 del BINARIO COMPLETO.
     Si es distinto al último guardado en _hashdb → adoptamos como base y procesamos.
     Si es igual → (opcionalmente borra descarga) y NO procesamos.
+    sha256_hex: digest ya calculado durante la descarga (evita releer el archivo).
+    adoptar=False / registrar=False: sólo decide; la base y el hash los registra quien llama
+    (run_fuente lo hace recién con las difs hechas, ver registrar_proceso).
+    Devuelve (procesar, digest): el digest sigue hacia la extracción para no volver a hashear.
     """
     if not path or not path.exists():
         log(f"⏭️ {source_key}: no hay archivo para comparar.")
-        return False
+        return False, sha256_hex
+    new_hash = sha256_hex
     try:
-        new_hash = file_sha256(path)
+        if not new_hash:
+            new_hash = file_sha256(path)
         prev_hash = read_prev_hash(source_key)
         log(f"📇 {source_key}: nuevo={new_hash[:12]}… | previo={(prev_hash[:12] + '…') if prev_hash else 'N/A'}")
         if prev_hash == new_hash:
             log(f"⏭️ {source_key}: sin cambios (hash igual) → omito.")
-            if BORRAR_DUPLICADO:
-                try:
-                    path.unlink(missing_ok=True)
-                    log(f"🗑️ {source_key}: duplicado eliminado: {path.name}")
-                except Exception as e:
-                    log(f"⚠️ {source_key}: no se pudo borrar duplicado: {e}")
-            return False
+            _borrar_duplicado(source_key, path)
+            return False, new_hash
 
         # Hash distinto → guardo hash, adopto como base y proceso
-        write_hash(source_key, new_hash)
-        adoptar_como_base(source_key, path, new_hash)
+        if registrar:
+            write_hash(source_key, new_hash)
+        if adoptar:
+            adoptar_como_base(source_key, path, new_hash)
         log(f"🔄 {source_key}: cambios detectados → proceso.")
-        return True
+        return True, new_hash
     except Exception as e:
         log(f"⚠️ {source_key}: error comparando hash: {e} → por las dudas adopto y proceso.")
         try:
-            h = file_sha256(path)
-            write_hash(source_key, h)
-            adoptar_como_base(source_key, path, h)
+            new_hash = new_hash or file_sha256(path)
+            if registrar:
+                write_hash(source_key, new_hash)
+            if adoptar:
+                adoptar_como_base(source_key, path, new_hash)
         except Exception:
             pass
-        return True
+        return True, new_hash
+
+def decide_por_contenido(source_key: str, path: Path, registros: Registros, sha256_hex: str,
+                         registrar: bool = True) -> Tuple[bool, str]:
+    """
+    Segundo gate (HASH_CONTENIDO): el binario ya cambió; sólo seguimos si cambiaron las filas.
+    Si el contenido es igual → NO se adopta base ni se procesa (y se borra la descarga si corresponde).
+    sha256_hex: el digest que devolvió decide_should_process (la base se adopta con ese, sin releer).
+    registrar=False: sólo decide (como en decide_should_process). Devuelve (procesar, digest_contenido).
+    """
+    new_c = content_sha256(registros)
+    prev_c = read_prev_content_hash(source_key)
+    log(f"🧮 {source_key}: contenido nuevo={new_c[:12]}… | previo={(prev_c[:12] + '…') if prev_c else 'N/A'}")
+    if prev_c == new_c:
+        log(f"⏭️ {source_key}: binario distinto pero mismas filas → omito.")
+        _borrar_duplicado(source_key, path)
+        return False, new_c
+    if registrar:
+        write_content_hash(source_key, new_c)
+        adoptar_como_base(source_key, path, sha256_hex)
+    return True, new_c
+
+def registrar_proceso(source_key: str, path: Path, sha256_hex: str, content_hex: Optional[str] = None) -> None:
+    """
+    Cierre de una fuente procesada: adopta la base y registra los hashes. Va después de las difs:
+    si la corrida se corta antes, la siguiente ve un hash distinto, reprocesa y saca los
+    registros del cache por SHA-256 (sin volver a parsear el xlsx).
+    """
+    if path.resolve() != _db_path(source_key).resolve():
+        adoptar_como_base(source_key, path, sha256_hex)
+    if content_hex:
+        write_content_hash(source_key, content_hex)
+    write_hash(source_key, sha256_hex)
 
 # ========= DESCARGAS =========
-def download_simple(url: str, base_name: str) -> Optional[Path]:
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Session única (keep-alive + pool de conexiones) compartida por todas las descargas HTTP."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            s = requests.Session()
+            s.headers.update(REQ_HEADERS)
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS, max_retries=2)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _SESSION = s
+        return _SESSION
+
+def _validadores_vigentes(source_key: str) -> Dict[str, Any]:
+    # Sólo sirven si describen el archivo cuyo hash quedó registrado (si no, se baja completo)
+    val = leer_validadores_http(source_key)
+    prev_hash = read_prev_hash(source_key)
+    if not val or not prev_hash or val.get("sha256") != prev_hash:
+        return {}
+    return val
+
+def _sin_cambios_http(val: Dict[str, Any], r: requests.Response) -> bool:
+    if r.status_code == 304:
+        return True
+    etag = r.headers.get("ETag")
+    if etag and val.get("etag") and not etag.startswith("W/"):
+        return etag == val["etag"]
+    lm, cl = r.headers.get("Last-Modified"), r.headers.get("Content-Length")
+    return bool(lm and cl and lm == val.get("last_modified") and cl == val.get("content_length"))
+
+def download_con_hash(url: str, base_name: str,
+                      session: Optional[requests.Session] = None) -> Tuple[Optional[Path], Optional[str]]:
+    """
+    Stream a disco por chunks (sin cargar el archivo entero en memoria); .part → rename al terminar.
+    El SHA-256 se calcula sobre los mismos chunks que se escriben → (path, sha256_hex).
+    Con DESCARGA_CONDICIONAL manda If-None-Match/If-Modified-Since con los validadores
+    guardados en _hashdb/<base_name>.http.json; si el server indica que no cambió
+    (304, o mismo ETag / Last-Modified+Content-Length) no baja el cuerpo y devuelve
+    (None, hash_previo).
+    """
+    dst = RUTA_DESCARGA / f"{base_name}_{ts()}.xlsx"
+    tmp = dst.with_name(dst.name + ".part")
     try:
-        dst = RUTA_DESCARGA / f"{base_name}_{ts()}.xlsx"
-        r = requests.get(url, headers=REQ_HEADERS, timeout=TIMEOUT)
-        r.raise_for_status()
-        dst.write_bytes(r.content)
+        s = session or get_session()
+        val = _validadores_vigentes(base_name) if DESCARGA_CONDICIONAL else {}
+        cond_headers = {}
+        if val.get("etag"):          cond_headers["If-None-Match"] = val["etag"]
+        if val.get("last_modified"): cond_headers["If-Modified-Since"] = val["last_modified"]
+        h = hashlib.sha256()
+        with s.get(url, timeout=TIMEOUT, stream=True, headers=cond_headers) as r:
+            # 304 sólo significa "sin cambios" si se preguntó con validadores; si no, no hay
+            # cuerpo que guardar (quedaría un archivo de 0 bytes) → error y queda lo anterior
+            if r.status_code == 304 and not cond_headers:
+                raise RuntimeError("HTTP 304 sin haber mandado If-None-Match/If-Modified-Since")
+            if val and _sin_cambios_http(val, r):
+                log(f"⏭️ {base_name}: sin cambios en origen (HTTP {r.status_code}) → no se baja.")
+                return None, val["sha256"]
+            r.raise_for_status()
+            with tmp.open("wb") as f:
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                    if chunk:
+                        f.write(chunk)
+                        h.update(chunk)
+            resp_headers = r.headers
+        tmp.replace(dst)
+        digest = h.hexdigest()
+        try:
+            escribir_validadores_http(base_name, resp_headers, digest)
+        except Exception as e:
+            log(f"⚠️ {base_name}: no se pudieron guardar validadores HTTP: {e}")
         log(f"✅ Descargado: {dst.name}")
-        return dst
+        return dst, digest
     except Exception as e:
+        tmp.unlink(missing_ok=True)
         log(f"❌ Error descarga {base_name}: {e}")
-        return None
+        return None, None
+
+def descargar_concurrente(pedidos: Dict[str, str],
+                          max_workers: int = DOWNLOAD_WORKERS) -> Dict[str, Tuple[Optional[Path], Optional[str]]]:
+    """
+    Baja varias URLs en simultáneo (thread pool + Session compartida).
+    pedidos: {source_key: url} → {source_key: (Path | None, sha256 | None)}, en el mismo orden.
+    """
+    if not pedidos:
+        return {}
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pedidos))) as ex:
+        futuros = {k: ex.submit(download_con_hash, url, k, session) for k, url in pedidos.items()}
+        return {k: fut.result() for k, fut in futuros.items()}
 
 # ========= NORMALIZACIÓN =========
 def _norm_text(s: Any) -> str:
@@ -243,35 +596,673 @@ def detectar_columnas(ws, max_scan_rows: int = 60):
             return r_i, tmp
     return None, {"codigo": None, "stock": None, "precio": None, "moneda": None}
 
-# ========= EXTRACTORES (ID, Precio, Moneda) =========
-def extraer_registros_generico_xlsx(path: Path,
-                                    fila_inicio_fallback: int = 2,
-                                    col_precio_fb: Optional[int] = None,
-                                    col_moneda_fb: Optional[int] = None) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    wb = load_workbook(path, read_only=True, data_only=True)
-    try:
-        ws = wb.active
-        header_row, cols = detectar_columnas(ws)
-        if header_row:
-            max_needed_col = max(v for v in cols.values() if v)
-            for row in ws.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
-                cod = row[cols["codigo"]-1] if cols["codigo"] else None
-                if not _norm_text(cod): continue
-                precio = row[cols["precio"]-1] if cols["precio"] else None
-                moneda = row[cols["moneda"]-1] if cols["moneda"] else None
-                out.append({"ID": _norm_text(cod), "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
-        else:
-            for row in ws.iter_rows(min_row=fila_inicio_fallback, min_col=1, max_col=max(ws.max_column, 1), values_only=True):
-                cod = row[0] if len(row) >= 1 else None
-                if not _norm_text(cod): continue
-                precio = row[col_precio_fb-1] if (col_precio_fb and len(row) >= col_precio_fb) else None
-                moneda = row[col_moneda_fb-1] if (col_moneda_fb and len(row) >= col_moneda_fb) else None
-                out.append({"ID": _norm_text(cod), "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
-    finally:
-        wb.close()
-    return out
+# ========= LECTOR XLSX RÁPIDO (backend alternativo a openpyxl) =========
+# Lee sheet*.xml / sharedStrings.xml directo del zip con iterparse, sin crear objetos
+# openpyxl por celda y decodificando sólo las columnas pedidas. Expone la misma API mínima
+# que usan los extractores (active / worksheets / sheetnames / wb[nombre] / iter_rows(values_only)
+# / max_row / max_column / close) y replica los valores de load_workbook(read_only, data_only).
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_TAG_ROW, _TAG_C, _TAG_V = _NS_MAIN + "row", _NS_MAIN + "c", _NS_MAIN + "v"
+_TAG_IS, _TAG_T, _TAG_R = _NS_MAIN + "is", _NS_MAIN + "t", _NS_MAIN + "r"
+_TAG_SI, _TAG_DIM, _TAG_DATA = _NS_MAIN + "si", _NS_MAIN + "dimension", _NS_MAIN + "sheetData"
+_COLS_CACHE: Dict[str, int] = {}
+
+def _col_idx(letras: str) -> int:
+    n = _COLS_CACHE.get(letras)
+    if n is None:
+        n = _COLS_CACHE[letras] = column_index_from_string(letras)
+    return n
+
+def _texto_si(node) -> str:
+    # Igual que openpyxl Text.content: <t> directo + <r><t> (sin rPh)
+    partes = []
+    t = node.find(_TAG_T)
+    if t is not None and t.text:
+        partes.append(t.text)
+    for r in node.findall(_TAG_R):
+        rt = r.find(_TAG_T)
+        if rt is not None and rt.text:
+            partes.append(rt.text)
+    return "".join(partes)
+
+def _cast_number(value: str):
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+def _rel_target(base_dir: str, target: str) -> str:
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+class HojaRapida:
+    def __init__(self, libro: "LibroRapido", title: str, part: str):
+        self.parent = libro
+        self.title = title
+        self._part = part
+        self._min_column = 1
+        self._min_row = 1
+        self._max_column = self._max_row = None
+        self._leer_dimension()
+
+    def _leer_dimension(self) -> None:
+        with self.parent._zip.open(self._part) as src:
+            for ev, el in ET.iterparse(src, events=("start",)):
+                if el.tag == _TAG_DIM:
+                    ref = el.get("ref")
+                    if ref:
+                        self._min_column, self._min_row, self._max_column, self._max_row = range_boundaries(ref)
+                    return
+                if el.tag == _TAG_DATA:
+                    return
+
+    @property
+    def max_row(self): return self._max_row
+    @property
+    def max_column(self): return self._max_column
+    @property
+    def min_row(self): return self._min_row
+    @property
+    def min_column(self): return self._min_column
+
+    def _decodificar(self, dt: str, v: Optional[str], s: Optional[str]):
+        # Misma conversión que openpyxl WorkSheetParser.parse_cell (data_only)
+        if v is None:
+            return None
+        libro = self.parent
+        if dt == "n":
+            v = _cast_number(v)
+            if s and int(s) in libro._date_formats:
+                try:
+                    v = from_excel(v, libro.epoch, timedelta=int(s) in libro._timedelta_formats)
+                except (OverflowError, ValueError):
+                    v = "#VALUE!"
+        elif dt == "s":
+            v = libro._shared_strings[int(v)]
+        elif dt == "b":
+            v = bool(int(v))
+        elif dt == "d":
+            v = from_ISO8601(v)
+        return v
+
+    def _filas(self, min_col: int, max_col: Optional[int]):
+        """(idx_fila, última_columna, {col: valor}) sólo decodificando columnas en [min_col, max_col]."""
+        hi = max_col if max_col is not None else 1 << 30
+        row_counter = 0
+        with self.parent._zip.open(self._part) as src:
+            for ev, el in ET.iterparse(src):
+                if el.tag != _TAG_ROW:
+                    continue
+                r_attr = el.get("r")
+                if r_attr is not None:
+                    try:
+                        row_counter = int(r_attr)
+                    except ValueError:
+                        row_counter = int(float(r_attr))
+                else:
+                    row_counter += 1
+                col_counter = 0
+                valores: Dict[int, Any] = {}
+                for c in el:
+                    if c.tag != _TAG_C:
+                        continue
+                    ref = c.get("r")
+                    if ref:
+                        col_counter = _col_idx(ref.rstrip("0123456789"))
+                    else:
+                        col_counter += 1
+                    if col_counter < min_col or col_counter > hi:
+                        continue
+                    dt = c.get("t", "n")
+                    if dt == "inlineStr":
+                        node = c.find(_TAG_IS)
+                        valores[col_counter] = _texto_si(node) if node is not None else None
+                        continue
+                    v = c.findtext(_TAG_V) or None
+                    if v is None:
+                        continue
+                    valores[col_counter] = self._decodificar(dt, v, c.get("s"))
+                ultima = col_counter if len(el) else 0
+                el.clear()
+                yield row_counter, ultima, valores
+
+    def iter_rows(self, min_row=None, max_row=None, min_col=None, max_col=None, values_only=True):
+        # Misma semántica de relleno que openpyxl ReadOnlyWorksheet._cells_by_row (sólo values_only)
+        min_col = min_col or 1
+        min_row = min_row or 1
+        max_col = max_col or self.max_column
+        max_row = max_row or self.max_row
+        empty_row: Any = []
+        if max_col is not None:
+            empty_row = (None,) * (max_col + 1 - min_col)
+        counter = min_row
+        idx = 1
+        for idx, ultima, valores in self._filas(min_col, max_col):
+            if max_row is not None and idx > max_row:
+                break
+            for _ in range(counter, idx):
+                counter += 1
+                yield empty_row
+            if counter <= idx:
+                counter += 1
+                if not ultima and not max_col:
+                    yield ()
+                    continue
+                ancho = (max_col or ultima) + 1 - min_col
+                fila = [None] * ancho
+                for col, v in valores.items():
+                    if col - min_col < ancho:
+                        fila[col - min_col] = v
+                yield tuple(fila)
+        if max_row is not None and max_row < idx:
+            for _ in range(counter, max_row + 1):
+                yield empty_row
+
+class LibroRapido:
+    def __init__(self, path: Path):
+        self._zip = zipfile.ZipFile(path)
+        try:
+            self._cargar()
+        except Exception:
+            self._zip.close()
+            raise
+
+    def _leer_rels(self, part: str) -> Dict[str, Tuple[str, str]]:
+        base_dir = posixpath.dirname(part)
+        rels_part = posixpath.join(base_dir, "_rels", posixpath.basename(part) + ".rels")
+        if rels_part not in self._zip.NameToInfo:
+            return {}
+        root = ET.fromstring(self._zip.read(rels_part))
+        return {r.get("Id"): (r.get("Type", ""), _rel_target(base_dir, r.get("Target", "")))
+                for r in root.iter(_NS_PKG + "Relationship")}
+
+    def _cargar(self) -> None:
+        wb_part = next(t for tipo, t in self._leer_rels("").values() if tipo.endswith("/officeDocument"))
+        rels = self._leer_rels(wb_part)
+        root = ET.fromstring(self._zip.read(wb_part))
+
+        pr = root.find(_NS_MAIN + "workbookPr")
+        self.epoch = CALENDAR_WINDOWS_1900
+        if pr is not None and pr.get("date1904") in ("1", "true"):
+            self.epoch = CALENDAR_MAC_1904
+        self._active_index = 0
+        for view in root.iter(_NS_MAIN + "workbookView"):
+            if view.get("activeTab") is not None:
+                self._active_index = int(view.get("activeTab"))
+                break
+
+        self._shared_strings: List[str] = []
+        self._date_formats: set = set()
+        self._timedelta_formats: set = set()
+        for tipo, target in rels.values():
+            if tipo.endswith("/sharedStrings") and target in self._zip.NameToInfo:
+                self._shared_strings = self._leer_shared_strings(target)
+            elif tipo.endswith("/styles") and target in self._zip.NameToInfo:
+                self._leer_estilos(target)
+
+        self._sheets: List[Any] = []   # en orden del libro (chartsheets como None)
+        self.sheetnames: List[str] = []
+        for sh in root.iter(_NS_MAIN + "sheet"):
+            rid = sh.get(_NS_R + "id")
+            if not rid or rid not in rels:
+                continue
+            tipo, target = rels[rid]
+            if target not in self._zip.NameToInfo:
+                continue
+            name = sh.get("name")
+            self.sheetnames.append(name)
+            self._sheets.append(None if "chartsheet" in tipo else HojaRapida(self, name, target))
+
+    def _leer_shared_strings(self, part: str) -> List[str]:
+        out: List[str] = []
+        with self._zip.open(part) as src:
+            for ev, node in ET.iterparse(src):
+                if node.tag == _TAG_SI:
+                    out.append(_texto_si(node).replace("x005F_", ""))
+                    node.clear()
+        return out
+
+    def _leer_estilos(self, part: str) -> None:
+        root = ET.fromstring(self._zip.read(part))
+        custom = {int(n.get("numFmtId")): n.get("formatCode")
+                  for n in root.iter(_NS_MAIN + "numFmt")}
+        xfs = root.find(_NS_MAIN + "cellXfs")
+        if xfs is None:
+            return
+        for idx, xf in enumerate(xfs.findall(_NS_MAIN + "xf")):
+            num_id = int(xf.get("numFmtId", 0))
+            fmt = custom[num_id] if num_id in custom else builtin_format_code(num_id)
+            if is_date_format(fmt):
+                self._date_formats.add(idx)
+            if is_timedelta_format(fmt):
+                self._timedelta_formats.add(idx)
+
+    @property
+    def worksheets(self) -> List[HojaRapida]:
+        return [s for s in self._sheets if s is not None]
+
+    @property
+    def active(self) -> Optional[HojaRapida]:
+        try:
+            return self._sheets[self._active_index]
+        except IndexError:
+            return None
+
+    def __getitem__(self, key: str) -> HojaRapida:
+        for s in self.worksheets:
+            if s.title == key:
+                return s
+        raise KeyError(f"Worksheet {key} does not exist.")
 
+    def close(self) -> None:
+        self._zip.close()
+
+def abrir_libro(path: Path, lector: Optional[str] = None):
+    """Abre el libro con el backend configurado (LECTOR_XLSX); si el rápido falla, cae a openpyxl."""
+    lector = (lector or LECTOR_XLSX).lower()
+    if lector == "rapido":
+        try:
+            return LibroRapido(path)
+        except Exception as e:
+            log(f"⚠️ Lector rápido no pudo abrir {Path(path).name}: {e} → uso openpyxl.")
+    return load_workbook(path, read_only=True, data_only=True)
+
+def bench_lectores(paths: List[Path], repeticiones: int = 3) -> List[Dict[str, Any]]:
+    """
+    Filas/seg de cada backend recorriendo todas las hojas con iter_rows(values_only=True)
+    y verificando que todos devuelvan exactamente los mismos valores que openpyxl.
+    """
+    resultados: List[Dict[str, Any]] = []
+    for p in paths:
+        fila: Dict[str, Any] = {"archivo": p.name}
+        valores: Dict[str, List[Any]] = {}
+        for lector in ("openpyxl", "rapido"):
+            mejor = None
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                wb = abrir_libro(p, lector)
+                try:
+                    filas = [tuple(r) for ws in wb.worksheets for r in ws.iter_rows(values_only=True)]
+                finally:
+                    wb.close()
+                dt = time.perf_counter() - t0
+                mejor = dt if mejor is None else min(mejor, dt)
+            valores[lector] = filas
+            fila["filas"] = len(filas)
+            fila[f"{lector}_filas_seg"] = round(len(filas) / mejor) if mejor else 0
+        fila["identico"] = valores["openpyxl"] == valores["rapido"]
+        fila["speedup"] = round(fila["rapido_filas_seg"] / fila["openpyxl_filas_seg"], 2) if fila["openpyxl_filas_seg"] else None
+        resultados.append(fila)
+    return resultados
+
+def cli_bench_lector(args: List[str]) -> int:
+    # python hash_comparativo.py bench-lector [archivo.xlsx …]  (por defecto: public_listas/*.xlsx y _db/*.xlsx)
+    paths = [Path(a) for a in args] or sorted(PUBLIC_LISTAS_DIR.glob("*.xlsx")) + sorted(DB_DIR.glob("*.xlsx"))
+    if not paths:
+        log("⚠️ No hay .xlsx para medir.")
+        return 1
+    ok = True
+    for r in bench_lectores(paths):
+        ok = ok and r["identico"]
+        log(f"📊 {r['archivo']}: {r['filas']} filas | openpyxl {r['openpyxl_filas_seg']} f/s | "
+            f"rápido {r['rapido_filas_seg']} f/s | x{r['speedup']} | "
+            f"idéntico={r['identico']}")
+    return 0 if ok else 1
+
+# ========= ESCRITOR XLSX RÁPIDO (backend alternativo a openpyxl write_only) =========
+# Sólo lo que usan Hoja 1 y el libro de cambios: hojas con filas de str / int / float / None,
+# sin estilos ni fórmulas. Cada hoja se serializa a mano en un temporal (se puede apendear
+# a varias hojas intercaladas, como hace ReporteCambios) y al guardar se vuelca al zip.
+# Mismos valores que openpyxl: strings inline, números con "%.16g", ""/None/NaN = celda vacía.
+_XML_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_DOC_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XML_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_CT_SHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+_XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_XML_STYLES = (
+    _XML_DECL + f'<styleSheet xmlns="{_XML_MAIN}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>'
+)
+# escape de texto XML; los caracteres de control (inválidos en XML 1.0) van como _xHHHH_, que es
+# como los guarda Excel y los restaura al abrir. Un "_xHHHH_" literal se protege como _x005F_xHHHH_.
+_CTRL_XML = (*range(0, 9), 11, 12, *range(14, 32))
+_XML_TEXTO = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;",
+                            **{chr(c): f"_x{c:04X}_" for c in _CTRL_XML}})
+_RE_CTRL_XML = re.compile("[%s]" % "".join(re.escape(chr(c)) for c in _CTRL_XML))
+_RE_ESCAPE_OOXML = re.compile(r"_x[0-9A-Fa-f]{4}_")
+_MAX_TEXTO_CELDA = 32767
+_XML_ATTR = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+_LETRAS_COL = [get_column_letter(i) for i in range(1, 65)]
+_FILAS_POR_ESCRITURA = 2048
+
+class _HojaXlsxRapida:
+    def __init__(self, title: str):
+        self.title = title
+        self._tmp = tempfile.TemporaryFile()
+        self._n = 0
+        self._pend: List[str] = []
+        self.con_control = 0   # celdas con caracteres de control escapados
+        self.recortadas = 0    # celdas de más de _MAX_TEXTO_CELDA caracteres
+
+    def _texto(self, v: str) -> str:
+        if len(v) > _MAX_TEXTO_CELDA:   # tope de Excel (openpyxl también recorta)
+            v = v[:_MAX_TEXTO_CELDA]
+            self.recortadas += 1
+        if "_x" in v:
+            v = _RE_ESCAPE_OOXML.sub(r"_x005F\g<0>", v)
+        txt = v.translate(_XML_TEXTO)
+        # sólo si algo cambió (&, <, >, \r o control) se busca el control puntual
+        if len(txt) != len(v) and _RE_CTRL_XML.search(v):
+            self.con_control += 1
+        return txt
+
+    def append(self, fila) -> None:
+        self._n += 1
+        r = str(self._n)
+        partes = [f'<row r="{r}">']
+        for i, v in enumerate(fila):
+            if v is None:
+                continue
+            col = _LETRAS_COL[i] if i < 64 else get_column_letter(i + 1)
+            if isinstance(v, str):
+                if not v:
+                    continue
+                txt = v.translate(_XML_TEXTO)
+                if len(txt) != len(v) or "_x" in v or len(v) > _MAX_TEXTO_CELDA:
+                    txt = self._texto(v)   # caso raro: escapes, control o recorte
+                esp = ' xml:space="preserve"' if v[0].isspace() or v[-1].isspace() else ""
+                partes.append(f'<c r="{col}{r}" t="inlineStr"><is><t{esp}>{txt}</t></is></c>')
+            elif isinstance(v, bool):
+                partes.append(f'<c r="{col}{r}" t="b"><v>{int(v)}</v></c>')
+            elif isinstance(v, (int, float)):
+                if v != v or v in (float("inf"), float("-inf")):
+                    continue
+                partes.append(f'<c r="{col}{r}" t="n"><v>{"%.16g" % v}</v></c>')
+            else:
+                txt = self._texto(str(v))
+                partes.append(f'<c r="{col}{r}" t="inlineStr"><is><t>{txt}</t></is></c>')
+        partes.append("</row>")
+        self._pend.append("".join(partes))
+        if len(self._pend) >= _FILAS_POR_ESCRITURA:
+            self._volcar()
+
+    def _volcar(self) -> None:
+        if self._pend:
+            self._tmp.write("".join(self._pend).encode("utf-8"))
+            self._pend = []
+
+    def _a_zip(self, zf: zipfile.ZipFile, nombre: str) -> None:
+        self._volcar()
+        if self.con_control:
+            log(f"⚠️ Hoja '{self.title}': {self.con_control} celda(s) con caracteres de control, "
+                "escritos como _xHHHH_.")
+        if self.recortadas:
+            log(f"⚠️ Hoja '{self.title}': {self.recortadas} celda(s) recortadas a {_MAX_TEXTO_CELDA} caracteres.")
+        self._tmp.seek(0)
+        with zf.open(nombre, "w") as out:
+            out.write((_XML_DECL + f'<worksheet xmlns="{_XML_MAIN}"><sheetData>').encode("utf-8"))
+            for bloque in iter(lambda: self._tmp.read(DOWNLOAD_CHUNK), b""):
+                out.write(bloque)
+            out.write(b"</sheetData></worksheet>")
+
+    def close(self) -> None:
+        self._tmp.close()
+
+class LibroXlsxRapido:
+    """Subconjunto de Workbook(write_only=True): worksheets / create_sheet / remove / save."""
+
+    def __init__(self):
+        self.worksheets: List[_HojaXlsxRapida] = []
+
+    def create_sheet(self, title: str) -> _HojaXlsxRapida:
+        ws = _HojaXlsxRapida(title)
+        self.worksheets.append(ws)
+        return ws
+
+    def remove(self, ws: _HojaXlsxRapida) -> None:
+        self.worksheets.remove(ws)
+        ws.close()
+
+    def save(self, path) -> None:
+        hojas = self.worksheets
+        n = len(hojas)
+        tipos = "".join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{_CT_SHEET}"/>'
+                        for i in range(1, n + 1))
+        partes = {
+            "[Content_Types].xml": (
+                _XML_DECL + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                '<Default Extension="xml" ContentType="application/xml"/>'
+                '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                + tipos + "</Types>"),
+            "_rels/.rels": (
+                _XML_DECL + f'<Relationships xmlns="{_XML_PKG_REL}">'
+                f'<Relationship Id="rId1" Type="{_XML_DOC_REL}/officeDocument" Target="xl/workbook.xml"/></Relationships>'),
+            "xl/workbook.xml": (
+                _XML_DECL + f'<workbook xmlns="{_XML_MAIN}" xmlns:r="{_XML_DOC_REL}"><sheets>'
+                + "".join(f'<sheet name="{ws.title.translate(_XML_ATTR)}" sheetId="{i}" r:id="rId{i}"/>'
+                          for i, ws in enumerate(hojas, 1))
+                + "</sheets></workbook>"),
+            "xl/_rels/workbook.xml.rels": (
+                _XML_DECL + f'<Relationships xmlns="{_XML_PKG_REL}">'
+                + "".join(f'<Relationship Id="rId{i}" Type="{_XML_DOC_REL}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                          for i in range(1, n + 1))
+                + f'<Relationship Id="rId{n + 1}" Type="{_XML_DOC_REL}/styles" Target="styles.xml"/></Relationships>'),
+            "xl/styles.xml": _XML_STYLES,
+        }
+        try:
+            with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for nombre, xml in partes.items():
+                    zf.writestr(nombre, xml)
+                for i, ws in enumerate(hojas, 1):
+                    ws._a_zip(zf, f"xl/worksheets/sheet{i}.xml")
+        finally:
+            for ws in hojas:
+                ws.close()
+
+def nuevo_libro_xlsx():
+    """Libro de sólo escritura con el backend de ESCRITOR_XLSX (misma API para los dos)."""
+    if ESCRITOR_XLSX == "openpyxl":
+        return Workbook(write_only=True)
+    return LibroXlsxRapido()
+
+def _filas_bench_escritor(n_filas: int):
+    monedas = ("USD", "ARS", None)
+    hoja1 = [["ID", "Stock", "Precio", "Moneda"]]
+    hoja1 += [[f"SKU-{i:07d}", (0, 2, 6, None)[i % 4], (None if i % 97 == 0 else round(1000 / (i + 3), 6)),
+               monedas[i % 3]] for i in range(n_filas)]
+    difs = [[f"SKU-{i:07d}", monedas[i % 2], i * 1.1, i * 1.3, round(i * 0.2, 4), round(18.181818 + i % 7, 4)]
+            for i in range(n_filas)]
+    return hoja1, difs
+
+def _escribir_bench(libro, hoja1, difs, p_h1: Path, p_dif: Path) -> None:
+    wb = libro()
+    ws = wb.create_sheet("Hoja 1")
+    for fila in hoja1:
+        ws.append(fila)
+    wb.save(p_h1)
+    wb = libro()
+    res = wb.create_sheet("Resumen")
+    hojas = [wb.create_sheet(t) for t in _HOJAS_DIFF]
+    for sh, enc in zip(hojas, _ENCABEZADOS_DIFF):
+        sh.append(enc)
+    for i, fila in enumerate(difs):
+        cat = i % 4
+        hojas[cat].append(fila if cat < 2 else fila[:3])
+    res.append(["Fuente", "bench"])
+    res.append([])
+    res.append(["Métrica", "Valor"])
+    wb.save(p_dif)
+
+def bench_escritores(n_filas: int = 50000, repeticiones: int = 3) -> Dict[str, Any]:
+    """
+    Segundos de cada backend escribiendo una Hoja 1 y un libro de cambios de n_filas, y si
+    los valores releídos con openpyxl (load_workbook read_only) dan exactamente iguales.
+    """
+    hoja1, difs = _filas_bench_escritor(n_filas)
+    res: Dict[str, Any] = {"filas": n_filas}
+    valores: Dict[str, Any] = {}
+    backends = {"openpyxl": lambda: Workbook(write_only=True), "rapido": LibroXlsxRapido}
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre, libro in backends.items():
+            p_h1, p_dif = Path(tmp) / f"{nombre}_h1.xlsx", Path(tmp) / f"{nombre}_dif.xlsx"
+            mejor = None
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                _escribir_bench(libro, hoja1, difs, p_h1, p_dif)
+                dt = time.perf_counter() - t0
+                mejor = dt if mejor is None else min(mejor, dt)
+            res[f"{nombre}_seg"] = round(mejor, 3)
+            res[f"{nombre}_kb"] = round((p_h1.stat().st_size + p_dif.stat().st_size) / 1024)
+            leidos = []
+            for p in (p_h1, p_dif):
+                wb = load_workbook(p, read_only=True, data_only=True)
+                try:
+                    leidos.append([(ws.title, [tuple(r) for r in ws.iter_rows(values_only=True)]) for ws in wb.worksheets])
+                finally:
+                    wb.close()
+            valores[nombre] = leidos
+    res["identico"] = valores["openpyxl"] == valores["rapido"]
+    res["speedup"] = round(res["openpyxl_seg"] / res["rapido_seg"], 2) if res["rapido_seg"] else None
+    return res
+
+def cli_bench_escritor(args: List[str]) -> int:
+    # python hash_comparativo.py bench-escritor [filas=50000]
+    n = int(args[0]) if args else 50000
+    r = bench_escritores(n)
+    log(f"📊 escritura {r['filas']} filas (Hoja 1 + libro de cambios): openpyxl {r['openpyxl_seg']}s "
+        f"({r['openpyxl_kb']} KB) | rápido {r['rapido_seg']}s ({r['rapido_kb']} KB) | "
+        f"x{r['speedup']} | idéntico={r['identico']}")
+    return 0 if r["identico"] else 1
+
+# ========= REGISTROS COLUMNARES (ID / Stock / Precio / Moneda) =========
+# En vez de un dict por producto: arrays paralelos. IDs internados, precio en array('d')
+# con NaN = sin precio, stock y moneda como códigos chicos (-1 / 0 = None).
+_SIN_PRECIO = float("nan")
+_REGS_MAGIC = b"HCREGS1\n"
+_REGS_HDR = struct.Struct("<8sIIII")
+
+def _a_little_endian(arr: array) -> bytes:
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+class Registros:
+    __slots__ = ("ids", "_stock", "_precio", "_moneda", "_monedas", "_cod_moneda", "_indice")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._stock = array("b")      # convertir_stock_generico: 0/2/6, -1 = None
+        self._precio = array("d")     # NaN = None
+        self._moneda = array("H")     # índice en _monedas; 0 = None
+        self._monedas: List[Optional[str]] = [None]
+        self._cod_moneda: Dict[Optional[str], int] = {None: 0}
+        self._indice: Optional[Dict[str, int]] = None
+
+    def agregar(self, _id: str, stock: Optional[int] = None, precio: Optional[float] = None,
+                moneda: Optional[str] = None) -> None:
+        self.ids.append(sys.intern(_id))
+        self._stock.append(-1 if stock is None else stock)
+        self._precio.append(_SIN_PRECIO if precio is None else precio)
+        cod = self._cod_moneda.get(moneda)
+        if cod is None:
+            cod = self._cod_moneda[moneda] = len(self._monedas)
+            self._monedas.append(moneda)
+        self._moneda.append(cod)
+        self._indice = None
+
+    @classmethod
+    def desde_dicts(cls, filas) -> "Registros":
+        out = cls()
+        for r in filas:
+            out.agregar(r["ID"], r.get("Stock"), r.get("Precio"), r.get("Moneda"))
+        return out
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def stock(self, i: int) -> Optional[int]:
+        v = self._stock[i]
+        return None if v < 0 else v
+
+    def precio(self, i: int) -> Optional[float]:
+        v = self._precio[i]
+        return None if v != v else v
+
+    def moneda(self, i: int) -> Optional[str]:
+        return self._monedas[self._moneda[i]]
+
+    def fila(self, i: int) -> Tuple[str, Optional[int], Optional[float], Optional[str]]:
+        return self.ids[i], self.stock(i), self.precio(i), self.moneda(i)
+
+    def filas(self):
+        """(ID, Stock, Precio, Moneda) por fila, sin armar dicts (para writers en bloque)."""
+        monedas = self._monedas
+        for _id, st, pr, mo in zip(self.ids, self._stock, self._precio, self._moneda):
+            yield _id, (None if st < 0 else st), (None if pr != pr else pr), monedas[mo]
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        _id, st, pr, mo = self.fila(i)
+        return {"ID": _id, "Stock": st, "Precio": pr, "Moneda": mo}
+
+    def __iter__(self):
+        # Compatibilidad con el código que esperaba List[Dict]
+        for _id, st, pr, mo in self.filas():
+            yield {"ID": _id, "Stock": st, "Precio": pr, "Moneda": mo}
+
+    def __eq__(self, otro) -> bool:
+        if not isinstance(otro, Registros):
+            return NotImplemented
+        return list(self.filas()) == list(otro.filas())
+
+    def a_bytes(self) -> bytes:
+        """Serialización binaria compacta (orden y repetidos incluidos)."""
+        heap = "\0".join(self.ids).encode("utf-8")
+        tabla = "\0".join(self._monedas[1:]).encode("utf-8")
+        return b"".join((
+            _REGS_HDR.pack(_REGS_MAGIC, len(self.ids), len(self._monedas) - 1, len(tabla), len(heap)),
+            _a_little_endian(self._precio), _a_little_endian(self._moneda), _a_little_endian(self._stock),
+            tabla, heap,
+        ))
+
+    @classmethod
+    def desde_bytes(cls, data: bytes) -> "Registros":
+        magic, n, n_mon, largo_tabla, largo_heap = _REGS_HDR.unpack_from(data, 0)
+        if magic != _REGS_MAGIC:
+            raise ValueError("registros serializados con formato desconocido")
+        out = cls()
+        off = _REGS_HDR.size
+        for arr, ancho in ((out._precio, 8), (out._moneda, 2), (out._stock, 1)):
+            arr.frombytes(data[off:off + ancho * n])
+            if sys.byteorder != "little":
+                arr.byteswap()
+            off += ancho * n
+        tabla = data[off:off + largo_tabla].decode("utf-8"); off += largo_tabla
+        out._monedas = [None] + (tabla.split("\0") if n_mon else [])
+        out._cod_moneda = {m: i for i, m in enumerate(out._monedas)}
+        out.ids = [sys.intern(x) for x in data[off:off + largo_heap].decode("utf-8").split("\0")] if n else []
+        return out
+
+    def indice(self) -> Dict[str, int]:
+        """ID → posición (la última aparición gana, como el dict por ID de antes)."""
+        if self._indice is None:
+            self._indice = {_id: i for i, _id in enumerate(self.ids) if _id}
+        return self._indice
+
+    def buscar(self, _id: str) -> Optional[Dict[str, Any]]:
+        i = self.indice().get(_id)
+        return None if i is None else self[i]
+
+# ========= EXTRACTORES (ID, Precio, Moneda) =========
 # Para "Hoja 1" (como antes) necesitamos STOCK
 def convertir_stock_generico(valor):
     t = _norm_text_lc(valor)
@@ -289,213 +1280,376 @@ def convertir_stock_generico(valor):
     except Exception:
         return None
 
-def extraer_registros_con_stock_fallback(path: Path, fila_inicio: int, col_stock: int) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    wb = load_workbook(path, read_only=True, data_only=True)
-    try:
-        ws = wb.active
-        # Intento por encabezados primero
-        header_row, cols = detectar_columnas(ws)
-        if header_row and cols["codigo"]:
-            max_needed_col = max(v for v in cols.values() if v)
-            for row in ws.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
-                cod = row[cols["codigo"]-1] if cols["codigo"] else None
-                if not _norm_text(cod): continue
-                stock_raw = row[cols["stock"]-1] if cols["stock"] else None
-                precio = row[cols["precio"]-1] if cols["precio"] else None
-                moneda = row[cols["moneda"]-1] if cols["moneda"] else None
-                out.append({"ID": _norm_text(cod), "Stock": convertir_stock_generico(stock_raw),
-                            "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
-        else:
-            # Fallback histórico
-            max_row = ws.max_row or 1
-            for r in range(fila_inicio, max_row + 1):
-                cod = ws.cell(row=r, column=1).value
-                if not _norm_text(cod): continue
-                raw_stock = ws.cell(row=r, column=col_stock).value
-                out.append({"ID": _norm_text(cod), "Stock": convertir_stock_generico(raw_stock),
-                            "Precio": None, "Moneda": None})
-    finally:
-        wb.close()
+def _registros_por_encabezado(ws, header_row: int, cols: Dict[str, Optional[int]],
+                              id_fn=_norm_text) -> Registros:
+    out = Registros()
+    max_needed_col = max(v for v in cols.values() if v)
+    for row in ws.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
+        cod = row[cols["codigo"]-1] if cols["codigo"] else None
+        if not _norm_text(cod): continue
+        stock_raw = row[cols["stock"]-1] if cols["stock"] else None
+        precio = row[cols["precio"]-1] if cols["precio"] else None
+        moneda = row[cols["moneda"]-1] if cols["moneda"] else None
+        out.agregar(id_fn(cod), convertir_stock_generico(stock_raw), try_float(precio), _norm_text(moneda) or None)
     return out
 
-# TEVELAM (Hoja 1: inicio 11, stock col I=9) + espejo F/T
-def extraer_tevelam_hoja1(path: Path) -> List[Dict[str, Any]]:
-    regs = extraer_registros_con_stock_fallback(path, fila_inicio=11, col_stock=9)
-    out = []
-    for r in regs:
-        out.append(r)
-        s = r["ID"]
-        if len(s) >= 2:
-            if s.startswith("F"):
-                out.append({"ID": "T"+s[1:], "Stock": r["Stock"], "Precio": None, "Moneda": None})
-            elif s.startswith("T"):
-                out.append({"ID": "F"+s[1:], "Stock": r["Stock"], "Precio": None, "Moneda": None})
+def _registros_por_columnas(ws, fila_inicio: int, col_id: int, col_stock: int) -> Registros:
+    """
+    Fallback por posición fija: recorre las filas en streaming proyectando sólo hasta la
+    columna necesaria. En read-only cada ws.cell() re-escanea el XML de la hoja, así que
+    el loop por celda era cuadrático; esto es lineal en filas (y no depende de max_row,
+    que viene en None cuando la hoja no trae <dimension>).
+    """
+    out = Registros()
+    i_id, i_stock = col_id - 1, col_stock - 1
+    for row in ws.iter_rows(min_row=fila_inicio, max_col=max(col_id, col_stock), values_only=True):
+        _id = _norm_text(row[i_id]) if len(row) > i_id else ""
+        if not _id: continue
+        raw = row[i_stock] if len(row) > i_stock else None
+        out.agregar(_id, convertir_stock_generico(raw))
     return out
 
-# DISCO PRO (Hoja 1: inicio 9, stock col G=7) + espejo F/T
-def extraer_disco_hoja1(path: Path) -> List[Dict[str, Any]]:
-    regs = extraer_registros_con_stock_fallback(path, fila_inicio=9, col_stock=7)
-    out = []
-    for r in regs:
-        out.append(r)
-        s = r["ID"]
-        if len(s) >= 2:
-            if s.startswith("F"):
-                out.append({"ID": "T"+s[1:], "Stock": r["Stock"], "Precio": None, "Moneda": None})
-            elif s.startswith("T"):
-                out.append({"ID": "F"+s[1:], "Stock": r["Stock"], "Precio": None, "Moneda": None})
+def _registros_con_stock_ws(ws, fila_inicio: int, col_stock: int) -> Registros:
+    # Intento por encabezados primero
+    header_row, cols = detectar_columnas(ws)
+    if header_row and cols["codigo"]:
+        return _registros_por_encabezado(ws, header_row, cols)
+    # Fallback histórico (col A = código): una sola pasada, sin ws.cell() por fila
+    return _registros_por_columnas(ws, fila_inicio, col_id=1, col_stock=col_stock)
+
+# PROVEEDOR EXTRA: hoja STOCK (encabezados o fallback B/D)
+def _registros_hoja_stock_ws(st) -> Registros:
+    header_row, cols = detectar_columnas(st)
+    if header_row:
+        return _registros_por_encabezado(st, header_row, cols)
+    return _registros_por_columnas(st, fila_inicio=2, col_id=2, col_stock=4)
+
+# IMSA: "AC-AT-KAKITAR" → "KAKITAR"
+def _id_imsa(cod: Any) -> str:
+    s_cod = _norm_text(cod)
+    return s_cod.split("-", 2)[-1] if s_cod.count("-") >= 2 else s_cod
+
+# ========= EXTRACCIÓN UNIFICADA (una sola lectura por archivo) =========
+# Cada fuente abre el libro UNA vez y emite registros ID/Stock/Precio/Moneda;
+# de ese mismo flujo salen la Hoja 1 y las difs de precios.
+def _regs_tevelam(wb) -> Registros:
+    # TEVELAM (inicio 11, stock col I=9)
+    return _registros_con_stock_ws(wb.active, fila_inicio=11, col_stock=9)
+
+def _regs_disco(wb) -> Registros:
+    # DISCO PRO (inicio 9, stock col G=7)
+    return _registros_con_stock_ws(wb.active, fila_inicio=9, col_stock=7)
+
+def _regs_extra(wb) -> Registros:
+    # PROVEEDOR EXTRA (hoja STOCK o fallback inicio 2, stock col H=8)
+    if "STOCK" in wb.sheetnames:
+        return _registros_hoja_stock_ws(wb["STOCK"])
+    return _registros_con_stock_ws(wb.active, fila_inicio=2, col_stock=8)
+
+def _regs_imsa(wb) -> Registros:
+    # IMSA: primera hoja con encabezados; si no hay, activa desde fila 8 (stock col H=8)
+    for ws in wb.worksheets:
+        hr, c = detectar_columnas(ws)
+        if hr:
+            return _registros_por_encabezado(ws, hr, c, id_fn=_id_imsa)
+    out = Registros()
+    target_ws = wb.active
+    for row in target_ws.iter_rows(min_row=8, min_col=1, max_col=max(target_ws.max_column or 1, 1), values_only=True):
+        cod = row[0] if len(row) >= 1 else None
+        stx = row[7] if len(row) >= 8 else None
+        if not _norm_text(cod): continue
+        out.agregar(_norm_text(cod), convertir_stock_generico(stx))
     return out
 
-# PROVEEDOR EXTRA (Hoja 1: hoja STOCK o fallback B/D)
-def extraer_extra_hoja1(path: Path) -> List[Dict[str, Any]]:
-    wb = load_workbook(path, read_only=True, data_only=True)
+EXTRACTORES_FUENTE = {
+    "Tevelam":   _regs_tevelam,
+    "Disco_Pro": _regs_disco,
+    "ARS_Tech":  _regs_extra,
+    "IMSA":      _regs_imsa,
+}
+
+# Fuentes cuya Hoja 1 replica cada código F… como T… (y viceversa)
+FUENTES_ESPEJO_FT = {"Tevelam", "Disco_Pro"}
+
+def extraer_fuente(source_key: str, path: Path) -> Registros:
+    """
+    Lee el libro de la fuente UNA sola vez (detectar_columnas corre una vez por hoja)
+    y devuelve los registros ID/Stock/Precio/Moneda que consumen tanto
+    guardar_hoja1_xlsx (vía registros_hoja1) como iterar_diffs/guardar_snapshot.
+    """
+    wb = abrir_libro(path)
     try:
-        if "STOCK" in wb.sheetnames:
-            st = wb["STOCK"]
-            header_row, cols = detectar_columnas(st)
-            out: List[Dict[str, Any]] = []
-            if header_row:
-                max_needed_col = max(v for v in cols.values() if v)
-                for row in st.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
-                    cod = row[cols["codigo"]-1] if cols["codigo"] else None
-                    if not _norm_text(cod): continue
-                    stock_raw = row[cols["stock"]-1] if cols["stock"] else None
-                    precio = row[cols["precio"]-1] if cols["precio"] else None
-                    moneda = row[cols["moneda"]-1] if cols["moneda"] else None
-                    out.append({"ID": _norm_text(cod), "Stock": convertir_stock_generico(stock_raw),
-                                "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
-                return out
-            else:
-                out = []
-                max_row = st.max_row or 1
-                for r in range(2, max_row + 1):
-                    _id = st.cell(row=r, column=2).value
-                    if not _norm_text(_id): continue
-                    raw = st.cell(row=r, column=4).value
-                    out.append({"ID": _norm_text(_id), "Stock": convertir_stock_generico(raw),
-                                "Precio": None, "Moneda": None})
-                return out
-        else:
-            return extraer_registros_con_stock_fallback(path, fila_inicio=2, col_stock=8)
+        return EXTRACTORES_FUENTE[source_key](wb)
+    except Exception as e:
+        if not isinstance(wb, LibroRapido):
+            raise
+        log(f"⚠️ {source_key}: lector rápido falló ({e}) → reintento con openpyxl.")
     finally:
         wb.close()
-
-# IMSA Hoja 1
-def extraer_imsa_hoja1(path: Path) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
     wb = load_workbook(path, read_only=True, data_only=True)
     try:
-        target_ws = None
-        header_row = None
-        cols = {"codigo": None, "stock": None, "precio": None, "moneda": None}
-        for ws in wb.worksheets:
-            hr, c = detectar_columnas(ws)
-            if hr:
-                target_ws, header_row, cols = ws, hr, c
-                break
-        if not target_ws:
-            target_ws = wb.active
-            for row in target_ws.iter_rows(min_row=8, min_col=1, max_col=max(target_ws.max_column, 1), values_only=True):
-                cod = row[0] if len(row) >= 1 else None
-                stx = row[7] if len(row) >= 8 else None
-                if not _norm_text(cod): continue
-                out.append({"ID": _norm_text(cod), "Stock": convertir_stock_generico(stx),
-                            "Precio": None, "Moneda": None})
-            return out
-
-        max_needed_col = max(v for v in cols.values() if v)
-        for row in target_ws.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
-            cod = row[cols["codigo"]-1] if cols["codigo"] else None
-            if not _norm_text(cod): continue
-            stx = row[cols["stock"]-1] if cols["stock"] else None
-            precio = row[cols["precio"]-1] if cols["precio"] else None
-            moneda = row[cols["moneda"]-1] if cols["moneda"] else None
-            s_cod = _norm_text(cod)
-            cod_final = s_cod.split("-", 2)[-1] if s_cod.count("-") >= 2 else s_cod
-            out.append({"ID": cod_final, "Stock": convertir_stock_generico(stx),
-                        "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
+        return EXTRACTORES_FUENTE[source_key](wb)
     finally:
         wb.close()
+
+def espejar_f_t(regs: Registros) -> Registros:
+    out = Registros()
+    for s, st, pr, mo in regs.filas():
+        out.agregar(s, st, pr, mo)
+        if len(s) >= 2:
+            if s.startswith("F"):
+                out.agregar("T"+s[1:], st)
+            elif s.startswith("T"):
+                out.agregar("F"+s[1:], st)
     return out
 
-# Extractores SOLO para difs (ID, Precio, Moneda)
-def extraer_tevelam(path: Path) -> List[Dict[str, Any]]:
-    return extraer_registros_generico_xlsx(path, fila_inicio_fallback=11)
+def registros_hoja1(source_key: str, regs: Registros) -> Registros:
+    return espejar_f_t(regs) if source_key in FUENTES_ESPEJO_FT else regs
 
-def extraer_disco(path: Path) -> List[Dict[str, Any]]:
-    return extraer_registros_generico_xlsx(path, fila_inicio_fallback=9)
+# ========= CACHE DE REGISTROS (por SHA-256 del archivo) =========
+# _cache/<fuente>_<sha256>.v<N>.regs = Registros.a_bytes(); mismo hash ⇒ mismos registros, sin abrir el
+# xlsx. LRU por mtime (se "toca" en cada acierto) acotado a CACHE_REGISTROS_MB. Se consulta antes de
+# parsear en run_fuente: acierta cuando una corrida cortada se reprocesa (el hash se registra recién con
+# las difs hechas) y en `reprocesar`.
+# Subir _CACHE_REGS_VERSION cuando cambie la lógica de extracción invalida todo lo viejo.
+_CACHE_REGS_VERSION = 1
 
-def extraer_proveedor_extra(path: Path) -> List[Dict[str, Any]]:
-    wb = load_workbook(path, read_only=True, data_only=True)
+def _cache_regs_path(source_key: str, sha256_hex: str) -> Path:
+    return CACHE_DIR / f"{source_key}_{sha256_hex}.v{_CACHE_REGS_VERSION}.regs"
+
+def leer_cache_registros(source_key: str, sha256_hex: str) -> Optional[Registros]:
+    p = _cache_regs_path(source_key, sha256_hex)
     try:
-        if "STOCK" in wb.sheetnames:
-            st = wb["STOCK"]
-            header_row, cols = detectar_columnas(st)
-            out: List[Dict[str, Any]] = []
-            if header_row:
-                max_needed_col = max(v for v in cols.values() if v)
-                for row in st.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
-                    cod = row[cols["codigo"]-1] if cols["codigo"] else None
-                    if not _norm_text(cod): continue
-                    precio = row[cols["precio"]-1] if cols["precio"] else None
-                    moneda = row[cols["moneda"]-1] if cols["moneda"] else None
-                    out.append({"ID": _norm_text(cod), "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
-                return out
-        return extraer_registros_generico_xlsx(path, fila_inicio_fallback=2)
-    finally:
-        wb.close()
+        regs = Registros.desde_bytes(p.read_bytes())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log(f"⚠️ {source_key}: cache de registros ilegible ({e}) → lo descarto.")
+        p.unlink(missing_ok=True)
+        return None
+    try:
+        os.utime(p)
+    except OSError:
+        pass
+    return regs
 
-def extraer_imsa(path: Path) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    wb_in = load_workbook(path, read_only=True, data_only=True)
+def _podar_cache_registros(limite_bytes: int) -> None:
+    archivos = []
+    for p in CACHE_DIR.glob("*.regs"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        archivos.append((st.st_mtime, st.st_size, p))
+    total = sum(a[1] for a in archivos)
+    for _mtime, tam, p in sorted(archivos, key=lambda a: a[0]):
+        if total <= limite_bytes:
+            break
+        p.unlink(missing_ok=True)
+        total -= tam
+
+def guardar_cache_registros(source_key: str, sha256_hex: str, regs: Registros) -> None:
+    if CACHE_REGISTROS_MB <= 0:
+        return
+    p = _cache_regs_path(source_key, sha256_hex)
+    tmp = p.with_name(p.name + f".{os.getpid()}.tmp")
+    tmp.write_bytes(regs.a_bytes())
+    os.replace(tmp, p)
+    _podar_cache_registros(int(CACHE_REGISTROS_MB * 1024 * 1024))
+
+def extraer_fuente_cacheado(source_key: str, path: Path, sha256_hex: Optional[str] = None) -> Registros:
+    """
+    extraer_fuente con cache por hash: punto de entrada para run_fuente y para cualquier
+    re-proceso/backfill sobre archivos ya vistos (si no se pasa el hash, se calcula).
+    """
+    if CACHE_REGISTROS_MB <= 0:
+        return extraer_fuente(source_key, path)
+    sha = sha256_hex or file_sha256(path)
+    regs = leer_cache_registros(source_key, sha)
+    if regs is not None:
+        log(f"⚡ {source_key}: registros desde cache ({sha[:12]}…, {len(regs)} filas).")
+        return regs
+    regs = extraer_fuente(source_key, path)
     try:
-        target_ws = None
-        header_row = None
-        cols = {"codigo": None, "precio": None, "moneda": None}
-        for ws in wb_in.worksheets:
-            hr, c = detectar_columnas(ws)
-            if hr:
-                target_ws, header_row, cols = ws, hr, c
-                break
-        if not target_ws:
-            target_ws = wb_in.active
-            for row in target_ws.iter_rows(min_row=8, min_col=1, max_col=max(target_ws.max_column, 1), values_only=True):
-                cod = row[0] if len(row) >= 1 else None
-                if not _norm_text(cod): continue
-                out.append({"ID": _norm_text(cod), "Precio": None, "Moneda": None})
-            return out
-
-        max_needed_col = max(v for v in cols.values() if v)
-        for row in target_ws.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
-            cod = row[cols["codigo"]-1] if cols["codigo"] else None
-            if not _norm_text(cod): continue
-            precio = row[cols["precio"]-1] if cols["precio"] else None
-            moneda = row[cols["moneda"]-1] if cols["moneda"] else None
-            s_cod = _norm_text(cod)
-            cod_final = s_cod.split("-", 2)[-1] if s_cod.count("-") >= 2 else s_cod
-            out.append({"ID": cod_final, "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
-    finally:
-        wb_in.close()
-    return out
+        guardar_cache_registros(source_key, sha, regs)
+    except Exception as e:
+        log(f"⚠️ {source_key}: no se pudo guardar cache de registros: {e}")
+    return regs
 
 # ========= SNAPSHOTS (ID, Precio, Moneda) =========
+# Formato binario (<fuente>_snapshot.bin), little-endian, pensado para mmap sin parsear:
+#   header  : magic(8) n(u32) n_monedas(u32) largo_monedas(u32) largo_heap(u32)
+#   precios : float64[n]   (NaN = sin precio)
+#   offsets : u32[n+1]     (inicio de cada ID en el heap; IDs ordenados)
+#   monedas : u16[n]       (0 = None, k = k-ésima moneda de la tabla)
+#   tabla   : monedas utf-8 separadas por \0
+#   heap    : IDs utf-8 separados por \0 (orden utf-8 == orden de str)
+# El CSV histórico queda como export (SNAPSHOT_CSV / snapshot-csv) y se sigue leyendo si no hay .bin.
+_SNAP_MAGIC = b"HCSNAP1\n"
+_SNAP_HDR = struct.Struct("<8sIIII")
+
 def _snap_path(source_key: str) -> Path:
     return SNAP_DIR / f"{source_key}_snapshot.csv"
 
-def guardar_snapshot(source_key: str, registros: List[Dict[str, Any]]) -> None:
-    p = _snap_path(source_key)
-    with p.open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["ID","Precio","Moneda"])
-        for r in registros:
-            w.writerow([r.get("ID"), r.get("Precio"), r.get("Moneda")])
+def _snap_bin_path(source_key: str) -> Path:
+    return SNAP_DIR / f"{source_key}_snapshot.bin"
+
+def escribir_snapshot_bin(path: Path, filas) -> int:
+    """filas: iterable de (ID, Precio, Moneda); si un ID se repite gana la última. Escritura atómica."""
+    ultimo: Dict[str, Tuple[Optional[float], Optional[str]]] = {}
+    for _id, pr, mo in filas:
+        if _id:
+            ultimo[_id] = (pr, mo)
+    ids = sorted(ultimo)
+    precios = array("d")
+    codigos = array("H")
+    offsets = array("I")
+    monedas: List[Optional[str]] = [None]
+    cod_moneda: Dict[Optional[str], int] = {None: 0}
+    pos = 0
+    partes: List[bytes] = []
+    for _id in ids:
+        pr, mo = ultimo[_id]
+        precios.append(_SIN_PRECIO if pr is None else pr)
+        cod = cod_moneda.get(mo)
+        if cod is None:
+            cod = cod_moneda[mo] = len(monedas)
+            monedas.append(mo)
+        codigos.append(cod)
+        b = _id.encode("utf-8")
+        offsets.append(pos)
+        partes.append(b)
+        pos += len(b) + 1
+    offsets.append(pos)
+    heap = b"\0".join(partes)
+    tabla = "\0".join(monedas[1:]).encode("utf-8")
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(_SNAP_HDR.pack(_SNAP_MAGIC, len(ids), len(monedas) - 1, len(tabla), len(heap)))
+        f.write(_a_little_endian(precios))
+        f.write(_a_little_endian(offsets))
+        f.write(_a_little_endian(codigos))
+        f.write(tabla)
+        f.write(heap)
+    os.replace(tmp, path)
+    return len(ids)
+
+class SnapshotBinario(Mapping):
+    """
+    Snapshot mapeado en memoria: ID → {"Precio", "Moneda"} como el dict que devolvía el CSV.
+    Abrirlo no parsea nada; los IDs se decodifican recién cuando alguien los recorre.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = path.open("rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # archivo vacío
+            self._f.close()
+            raise ValueError(f"snapshot vacío: {path.name}")
+        magic, n, n_mon, largo_tabla, largo_heap = _SNAP_HDR.unpack_from(self._mm, 0)
+        if magic != _SNAP_MAGIC:
+            self.cerrar()
+            raise ValueError(f"snapshot con formato desconocido: {path.name}")
+        self._n = n
+        mv = memoryview(self._mm)
+        off = _SNAP_HDR.size
+        self._precios = self._columna(mv[off:off + 8 * n], "d"); off += 8 * n
+        self._offsets = self._columna(mv[off:off + 4 * (n + 1)], "I"); off += 4 * (n + 1)
+        self._codigos = self._columna(mv[off:off + 2 * n], "H"); off += 2 * n
+        tabla = bytes(mv[off:off + largo_tabla]).decode("utf-8"); off += largo_tabla
+        self._monedas: List[Optional[str]] = [None] + (tabla.split("\0") if n_mon else [])
+        self._heap = mv[off:off + largo_heap]
+        self._ids: Optional[List[str]] = None
+
+    @staticmethod
+    def _columna(mv: memoryview, typecode: str):
+        if sys.byteorder == "little":
+            return mv.cast(typecode)
+        arr = array(typecode, bytes(mv))
+        arr.byteswap()
+        return arr
+
+    def claves(self) -> List[str]:
+        """IDs ordenados (se decodifica todo el heap de una vez y se cachea)."""
+        if self._ids is None:
+            self._ids = bytes(self._heap).decode("utf-8").split("\0") if self._n else []
+        return self._ids
+
+    def _id(self, i: int) -> str:
+        return bytes(self._heap[self._offsets[i]:self._offsets[i + 1] - 1]).decode("utf-8")
+
+    def posicion(self, _id: str) -> Optional[int]:
+        if self._ids is not None:
+            i = bisect.bisect_left(self._ids, _id)
+            return i if i < self._n and self._ids[i] == _id else None
+        # Búsqueda binaria sobre el heap sin decodificar todo (consultas puntuales)
+        clave = _id.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._heap[self._offsets[mid]:self._offsets[mid + 1] - 1]) < clave:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._id(lo) == _id:
+            return lo
+        return None
+
+    def precio(self, i: int) -> Optional[float]:
+        v = self._precios[i]
+        return None if v != v else v
+
+    def moneda(self, i: int) -> Optional[str]:
+        return self._monedas[self._codigos[i]]
+
+    def __getitem__(self, _id: str) -> Dict[str, Any]:
+        i = self.posicion(_id)
+        if i is None:
+            raise KeyError(_id)
+        return {"Precio": self.precio(i), "Moneda": self.moneda(i)}
+
+    def __iter__(self):
+        return iter(self.claves())
 
-def cargar_snapshot(source_key: str) -> Dict[str, Dict[str, Any]]:
+    def __len__(self) -> int:
+        return self._n
+
+    def filas(self):
+        for i, _id in enumerate(self.claves()):
+            yield _id, self.precio(i), self.moneda(i)
+
+    def cerrar(self) -> None:
+        # Primero se sueltan las vistas sobre el mmap; si alguna sigue exportada (p.ej. un
+        # np.frombuffer vivo sobre _precios) el mmap no se puede cerrar: se avisa y lo cierra el GC.
+        for nombre in ("_precios", "_offsets", "_codigos", "_heap"):
+            v = self.__dict__.pop(nombre, None)
+            if isinstance(v, memoryview):
+                try:
+                    v.release()
+                except BufferError:
+                    pass
+            del v
+        mm = self.__dict__.pop("_mm", None)
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                log(f"⚠️ snapshot {self.path.name}: quedan vistas en uso; el mmap se libera al soltarlas.")
+        self._f.close()
+
+def guardar_snapshot(source_key: str, registros: Registros) -> None:
+    escribir_snapshot_bin(_snap_bin_path(source_key),
+                          ((_id, pr, mo) for _id, _st, pr, mo in registros.filas()))
     p = _snap_path(source_key)
+    if SNAPSHOT_CSV:
+        exportar_snapshot_csv(source_key)
+    elif p.exists():
+        p.unlink()  # CSV viejo: el .bin pasa a ser la fuente de verdad
+
+def _cargar_snapshot_csv(p: Path) -> Dict[str, Dict[str, Any]]:
     data: Dict[str, Dict[str, Any]] = {}
-    if not p.exists():
-        return data
     with p.open("r", newline="", encoding="utf-8") as f:
         rd = csv.DictReader(f)
         for row in rd:
@@ -506,119 +1660,805 @@ def cargar_snapshot(source_key: str) -> Dict[str, Dict[str, Any]]:
             data[row["ID"]] = {"Precio": precio_val, "Moneda": row.get("Moneda") or None}
     return data
 
+def cargar_snapshot(source_key: str):
+    """SnapshotBinario (mmap) si existe el .bin; si no, el CSV histórico como dict; {} si no hay nada."""
+    pb = _snap_bin_path(source_key)
+    if pb.exists():
+        try:
+            return SnapshotBinario(pb)
+        except Exception as e:
+            log(f"⚠️ {source_key}: snapshot binario ilegible ({e}) → pruebo CSV.")
+    p = _snap_path(source_key)
+    if not p.exists():
+        return {}
+    return _cargar_snapshot_csv(p)
+
+def cerrar_snapshot(snap) -> None:
+    if isinstance(snap, SnapshotBinario):
+        snap.cerrar()
+
+def exportar_snapshot_csv(source_key: str, destino: Optional[Path] = None) -> Optional[Path]:
+    """Export del .bin al CSV de siempre (ID, Precio, Moneda)."""
+    pb = _snap_bin_path(source_key)
+    if not pb.exists():
+        return None
+    out = destino or _snap_path(source_key)
+    snap = SnapshotBinario(pb)
+    try:
+        with out.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["ID","Precio","Moneda"])
+            w.writerows(snap.filas())
+    finally:
+        snap.cerrar()
+    return out
+
+def convertir_snapshots_csv() -> List[str]:
+    """Pasa cada <fuente>_snapshot.csv a .bin (deja el CSV; el próximo guardar_snapshot lo limpia)."""
+    convertidos = []
+    for p in sorted(SNAP_DIR.glob("*_snapshot.csv")):
+        source_key = p.name[:-len("_snapshot.csv")]
+        data = _cargar_snapshot_csv(p)
+        n = escribir_snapshot_bin(_snap_bin_path(source_key),
+                                  ((k, v["Precio"], v["Moneda"]) for k, v in data.items()))
+        log(f"🗜️ {source_key}: {p.name} → {_snap_bin_path(source_key).name} ({n} IDs)")
+        convertidos.append(source_key)
+    return convertidos
+
+def cli_snapshot(args: List[str]) -> int:
+    # python hash_comparativo.py snapshot-convertir
+    # python hash_comparativo.py snapshot-csv [fuente …]  (por defecto todas las que tengan .bin)
+    if args[0] == "snapshot-convertir":
+        convertir_snapshots_csv()
+        return 0
+    fuentes = args[1:] or [p.name[:-len("_snapshot.bin")] for p in sorted(SNAP_DIR.glob("*_snapshot.bin"))]
+    for k in fuentes:
+        out = exportar_snapshot_csv(k)
+        log(f"📤 {k}: {out.name}" if out else f"⚠️ {k}: no hay snapshot binario.")
+    return 0
+
+# ========= HISTORIAL DE PRECIOS (append-only: deltas + checkpoints) =========
+# _historial/<fuente>.jsonl : una línea por versión adoptada, nunca se reescribe
+#   {"v", "ts_utc", "ts_ar", "sha256", "tipo": "checkpoint"|"delta", "filas": {ID: [Precio, Moneda, Stock]}, "bajas": [ID…]}
+# _cache/<fuente>.hist.idx.json : [{"v", "ts_ar", "tipo", "offset"}…] + tamaño del .jsonl que cubre;
+#   derivado (si falta o no coincide con el .jsonl se rearma), así que no se versiona
+# Reconstruir la versión V = leer desde el último checkpoint ≤ V y aplicar los deltas hasta V.
+def _hist_path(source_key: str) -> Path:
+    return HIST_DIR / f"{source_key}.jsonl"
+
+def _hist_idx_path(source_key: str) -> Path:
+    return CACHE_DIR / f"{source_key}.hist.idx.json"
+
+def _reindexar_historial(source_key: str) -> Dict[str, Any]:
+    # Si el índice falta o quedó atrás (corte entre append e índice) se rearma recorriendo el .jsonl
+    versiones: List[Dict[str, Any]] = []
+    p = _hist_path(source_key)
+    offset = 0
+    with p.open("rb") as f:
+        for linea in f:
+            if not linea.endswith(b"\n"):
+                break  # append cortado a la mitad: se descarta (y se pisa en el próximo registro)
+            e = json.loads(linea)
+            versiones.append({"v": e["v"], "ts_ar": e["ts_ar"], "tipo": e["tipo"], "offset": offset})
+            offset += len(linea)
+    idx = {"bytes": offset, "versiones": versiones}
+    _escribir_json_atomico(_hist_idx_path(source_key), idx)
+    return idx
+
+def _escribir_json_atomico(path: Path, data: Any, indent: Optional[int] = None) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=indent), encoding="utf-8")
+    os.replace(tmp, path)
+
+def _indice_historial(source_key: str) -> Dict[str, Any]:
+    p = _hist_path(source_key)
+    if not p.exists():
+        return {"bytes": 0, "versiones": []}
+    try:
+        idx = json.loads(_hist_idx_path(source_key).read_text(encoding="utf-8"))
+        if idx.get("bytes") != p.stat().st_size:
+            idx = _reindexar_historial(source_key)
+    except Exception:
+        idx = _reindexar_historial(source_key)
+    return idx
+
+def _fila_hist(f: List[Any]) -> Tuple[Optional[float], Optional[str], Optional[int]]:
+    # [Precio, Moneda, Stock]; las primeras versiones no guardaban Stock
+    return f[0], f[1], (f[2] if len(f) > 2 else None)
+
+def leer_indice_historial(source_key: str) -> List[Dict[str, Any]]:
+    return _indice_historial(source_key)["versiones"]
+
+def reconstruir_version(source_key: str, version: Optional[int] = None,
+                        versiones: Optional[List[Dict[str, Any]]] = None
+                        ) -> Dict[str, Tuple[Optional[float], Optional[str], Optional[int]]]:
+    """Estado ID → (Precio, Moneda, Stock) de la versión pedida (None = la última)."""
+    versiones = versiones if versiones is not None else leer_indice_historial(source_key)
+    if not versiones:
+        return {}
+    if version is None:
+        version = versiones[-1]["v"]
+    hasta = next((i for i in range(len(versiones) - 1, -1, -1) if versiones[i]["v"] <= version), None)
+    if hasta is None:
+        return {}
+    desde = next(i for i in range(hasta, -1, -1) if versiones[i]["tipo"] == "checkpoint")
+    estado: Dict[str, Tuple[Optional[float], Optional[str], Optional[int]]] = {}
+    with _hist_path(source_key).open("rb") as f:
+        f.seek(versiones[desde]["offset"])
+        for _ in range(hasta - desde + 1):
+            e = json.loads(f.readline())
+            if e["tipo"] == "checkpoint":
+                estado = {}
+            for _id in e.get("bajas", ()):
+                estado.pop(_id, None)
+            for _id, fila in e["filas"].items():
+                estado[_id] = _fila_hist(fila)
+    return estado
+
+def version_en_fecha(source_key: str, fecha: str,
+                     versiones: Optional[List[Dict[str, Any]]] = None) -> Optional[int]:
+    """Última versión adoptada hasta `fecha` (hora AR; "YYYY-MM-DD" o "YYYY-MM-DD HH:MM:SS")."""
+    versiones = versiones if versiones is not None else leer_indice_historial(source_key)
+    tope = fecha if len(fecha) > 10 else fecha + " 23:59:59"
+    vigente = None
+    for e in versiones:
+        if e["ts_ar"] > tope:
+            break
+        vigente = e["v"]
+    return vigente
+
+def precio_en_fecha(source_key: str, sku: str, fecha: str
+                    ) -> Optional[Tuple[Optional[float], Optional[str], Optional[int]]]:
+    versiones = leer_indice_historial(source_key)
+    v = version_en_fecha(source_key, fecha, versiones)
+    if v is None:
+        return None
+    return reconstruir_version(source_key, v, versiones).get(sku)
+
+def registrar_version_historial(source_key: str, registros: Registros, sha256_hex: Optional[str]) -> int:
+    """Agrega la versión adoptada al historial (delta contra la anterior o checkpoint)."""
+    idx = _indice_historial(source_key)
+    versiones = idx["versiones"]
+    previo = reconstruir_version(source_key, None, versiones) if versiones else {}
+    actual: Dict[str, Tuple[Optional[float], Optional[str], Optional[int]]] = {
+        _id: (registros.precio(i), registros.moneda(i), registros.stock(i)) for _id, i in registros.indice().items()
+    }
+    cambios = {_id: list(v) for _id, v in actual.items() if previo.get(_id) != v}
+    bajas = sorted(_id for _id in previo if _id not in actual)
+
+    ult_cp = next((e["v"] for e in reversed(versiones) if e["tipo"] == "checkpoint"), None)
+    v = versiones[-1]["v"] + 1 if versiones else 1
+    checkpoint = (ult_cp is None or v - ult_cp >= HIST_CHECKPOINT_CADA
+                  or len(cambios) + len(bajas) > len(actual) // 2)
+    ahora = datetime.now(TZ_AR) if TZ_AR else datetime.now()
+    entrada = {
+        "v": v,
+        "ts_utc": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "ts_ar": ahora.strftime("%Y-%m-%d %H:%M:%S"),
+        "sha256": sha256_hex,
+        "tipo": "checkpoint" if checkpoint else "delta",
+        "filas": {_id: list(x) for _id, x in sorted(actual.items())} if checkpoint else cambios,
+    }
+    if not checkpoint:
+        entrada["bajas"] = bajas
+    p = _hist_path(source_key)
+    linea = (json.dumps(entrada, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+    with p.open("ab") as f:
+        f.truncate(idx["bytes"])
+        offset = idx["bytes"]
+        f.write(linea)
+    versiones.append({"v": v, "ts_ar": entrada["ts_ar"], "tipo": entrada["tipo"], "offset": offset})
+    _escribir_json_atomico(_hist_idx_path(source_key), {"bytes": offset + len(linea), "versiones": versiones})
+    log(f"🗂️ {source_key}: historial v{v} ({entrada['tipo']}, {len(entrada['filas'])} filas"
+        f"{'' if checkpoint else f', {len(bajas)} bajas'}).")
+    return v
+
+# ========= ÍNDICE POR SKU (series de tiempo sobre el historial) =========
+# _cache/<fuente>.series.bin : ID → (ts epoch, Precio, Stock) en arrays paralelos, sólo los
+# puntos donde algo cambió. Se actualiza leyendo únicamente las líneas nuevas del .jsonl; es
+# derivado (se reconstruye desde el historial), por eso vive en _cache/ y no se versiona.
+# Formato: cabecera + cantidad de puntos por ID (I) + ts (d) + precios (d) + stocks (b) + IDs "\0".
+_SKU_BAJA = -2   # en la serie de stock: el ID dejó de estar en la lista
+_SERIES_MAGIC = b"HCSERIE1"
+_SERIES_HDR = struct.Struct("<8sQIIII")   # magic, bytes del .jsonl, v, n IDs, n puntos, largo IDs
+
+def _series_path(source_key: str) -> Path:
+    return CACHE_DIR / f"{source_key}.series.bin"
+
+def _series_a_bytes(cache: Dict[str, Any]) -> bytes:
+    series = cache["series"]
+    ids = list(series)
+    cuantos = array("I", (len(series[_id][0]) for _id in ids))
+    ts, precios, stocks = array("d"), array("d"), array("b")
+    for _id in ids:
+        t, pr, st = series[_id]
+        ts.extend(t); precios.extend(pr); stocks.extend(st)
+    heap = "\0".join(ids).encode("utf-8")
+    return b"".join((
+        _SERIES_HDR.pack(_SERIES_MAGIC, cache["bytes"], cache["v"], len(ids), len(ts), len(heap)),
+        _a_little_endian(cuantos), _a_little_endian(ts), _a_little_endian(precios), _a_little_endian(stocks),
+        heap,
+    ))
+
+def _series_desde_bytes(data: bytes) -> Dict[str, Any]:
+    magic, n_bytes, v, n_ids, n_pts, largo_heap = _SERIES_HDR.unpack_from(data, 0)
+    if magic != _SERIES_MAGIC:
+        raise ValueError("índice por SKU con formato desconocido")
+    off = _SERIES_HDR.size
+    cols = []
+    for tipo, n in (("I", n_ids), ("d", n_pts), ("d", n_pts), ("b", n_pts)):
+        arr = array(tipo)
+        ancho = arr.itemsize * n
+        arr.frombytes(data[off:off + ancho])
+        if sys.byteorder != "little":
+            arr.byteswap()
+        off += ancho
+        cols.append(arr)
+    cuantos, ts, precios, stocks = cols
+    ids = data[off:off + largo_heap].decode("utf-8").split("\0") if n_ids else []
+    series: Dict[str, Tuple[array, array, array]] = {}
+    i = 0
+    for _id, c in zip(ids, cuantos):
+        series[_id] = (ts[i:i + c], precios[i:i + c], stocks[i:i + c])
+        i += c
+    return {"bytes": n_bytes, "v": v, "series": series}
+
+def _ts_epoch(ts_utc: str) -> float:
+    return datetime.strptime(ts_utc, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+def _agregar_punto(series: Dict[str, Tuple[array, array, array]], _id: str, t: float,
+                   precio: Optional[float], stock: int) -> None:
+    s = series.get(_id)
+    if s is None:
+        s = series[_id] = (array("d"), array("d"), array("b"))
+    pr = _SIN_PRECIO if precio is None else precio
+    if s[0]:
+        ult = s[1][-1]
+        if s[2][-1] == stock and (ult == pr or (ult != ult and pr != pr)):
+            return
+    s[0].append(t)
+    s[1].append(pr)
+    s[2].append(stock)
+
+def actualizar_indice_sku(source_key: str) -> Dict[str, Any]:
+    idx = _indice_historial(source_key)
+    cache: Optional[Dict[str, Any]] = None
+    p = _series_path(source_key)
+    if p.exists():
+        try:
+            cache = _series_desde_bytes(p.read_bytes())
+        except Exception:
+            cache = None
+    ult_v = idx["versiones"][-1]["v"] if idx["versiones"] else 0
+    if (cache is None or cache.get("bytes", 0) > idx["bytes"]
+            or (cache["bytes"] == idx["bytes"] and cache.get("v") != ult_v)):
+        cache = {"bytes": 0, "v": 0, "series": {}}
+    if cache["bytes"] == idx["bytes"]:
+        return cache
+    series = cache["series"]
+    with _hist_path(source_key).open("rb") as f:
+        f.seek(cache["bytes"])
+        for linea in f.read(idx["bytes"] - cache["bytes"]).splitlines():
+            e = json.loads(linea)
+            t = _ts_epoch(e["ts_utc"])
+            if e["tipo"] == "checkpoint":
+                vivos = {_id for _id, s in series.items() if s[2][-1] != _SKU_BAJA}
+            else:
+                vivos = set(e.get("bajas", ()))
+            for _id, fila in e["filas"].items():
+                pr, _mo, st = _fila_hist(fila)
+                _agregar_punto(series, _id, t, pr, -1 if st is None else st)
+                vivos.discard(_id)
+            for _id in vivos:
+                _agregar_punto(series, _id, t, None, _SKU_BAJA)
+    cache["bytes"], cache["v"] = idx["bytes"], ult_v
+    tmp = p.with_suffix(".bin.tmp")
+    tmp.write_bytes(_series_a_bytes(cache))
+    os.replace(tmp, p)
+    return cache
+
+def serie_sku(source_key: str, sku: str, desde: Optional[float] = None, hasta: Optional[float] = None,
+              indice: Optional[Dict[str, Any]] = None) -> List[Tuple[float, Optional[float], Optional[int]]]:
+    """
+    Puntos (ts, Precio, Stock) de un ID entre desde/hasta (epoch), con búsqueda binaria.
+    Incluye el valor vigente al inicio de la ventana (último punto ≤ desde). Stock -2 = baja.
+    """
+    indice = indice or actualizar_indice_sku(source_key)
+    s = indice["series"].get(sku)
+    if s is None:
+        return []
+    ts, precios, stocks = s
+    i = bisect.bisect_right(ts, desde) - 1 if desde is not None else 0
+    j = bisect.bisect_right(ts, hasta) if hasta is not None else len(ts)
+    out = []
+    for k in range(max(i, 0), j):
+        pr = precios[k]
+        st = stocks[k]
+        out.append((ts[k], None if pr != pr else pr, None if st == -1 else st))
+    return out
+
+_USO_HISTORIAL = "Uso: hash_comparativo.py historial <ID> [--dias N | N] [fuente …]"
+
+def cli_historial(args: List[str]) -> int:
+    # python hash_comparativo.py historial <ID> [--dias N | N] [fuente …]  (N = 30 por defecto)
+    # El número suelto sólo cuenta justo después del ID; "historial SKU Tevelam" filtra por fuente.
+    args = list(args)
+    dias_txt: Optional[str] = None
+    for i, a in enumerate(args):
+        if a == "--dias" or a.startswith("--dias="):
+            dias_txt = a.partition("=")[2] if "=" in a else (args[i+1] if i + 1 < len(args) else "")
+            del args[i:i + (1 if "=" in a else 2)]
+            break
+    if not args or args[0].startswith("-"):
+        log(_USO_HISTORIAL)
+        return 2
+    sku, resto = args[0], args[1:]
+    if dias_txt is None and resto and resto[0].isdigit():
+        dias_txt, resto = resto[0], resto[1:]
+    dias = int(dias_txt) if dias_txt is not None and dias_txt.isdigit() else (30 if dias_txt is None else 0)
+    if dias <= 0:
+        log(f"Días inválidos: {dias_txt!r}. {_USO_HISTORIAL}")
+        return 2
+    fuentes = resto or list(FUENTES)
+    desde = time.time() - dias * 86400
+    encontrado = False
+    for k in fuentes:
+        if not _hist_path(k).exists():
+            continue
+        puntos = serie_sku(k, sku, desde=desde)
+        if not puntos:
+            continue
+        encontrado = True
+        log(f"📈 {k} · {sku} (últimos {dias} días)")
+        for t, pr, st in puntos:
+            cuando = datetime.fromtimestamp(t, TZ_AR) if TZ_AR else datetime.fromtimestamp(t)
+            estado = "baja" if st == _SKU_BAJA else f"stock {st if st is not None else '-'}"
+            log(f"  {cuando.strftime('%Y-%m-%d %H:%M')} | precio {pr if pr is not None else '-'} | {estado}")
+    if not encontrado:
+        log(f"Sin historial para {sku}.")
+    return 0 if encontrado else 1
+
 # ========= DIFERENCIAS & REPORTE =========
-def calcular_diffs(prev_snap: Dict[str, Dict[str, Any]],
-                   curr_regs: List[Dict[str, Any]]
-                   ) -> Tuple[List[List[Any]], List[List[Any]], List[List[Any]], List[List[Any]]]:
-    curr_map: Dict[str, Dict[str, Any]] = {r["ID"]: r for r in curr_regs if r.get("ID")}
-    prev_ids = set(prev_snap.keys())
-    curr_ids = set(curr_map.keys())
-
-    nuevos_ids = sorted(curr_ids - prev_ids)
-    elim_ids   = sorted(prev_ids - curr_ids)
-    comunes    = sorted(curr_ids & prev_ids)
-
-    precios_up: List[List[Any]] = []
-    precios_dn: List[List[Any]] = []
-    nuevos: List[List[Any]] = []
-    eliminados: List[List[Any]] = []
-
-    for _id in comunes:
-        prev = prev_snap.get(_id, {})
-        curr = curr_map.get(_id, {})
-        p_old = prev.get("Precio")
-        p_new = curr.get("Precio")
-        mon   = curr.get("Moneda") or prev.get("Moneda")
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+def _usar_numpy(n: int) -> bool:
+    if np is None or DIFF_NUMPY == "false":
+        return False
+    return DIFF_NUMPY == "true" or n >= DIFF_NUMPY_MIN
+
+# Categorías que emite iterar_diffs (índice → hoja del reporte)
+DIFF_SUBE, DIFF_BAJA, DIFF_NUEVO, DIFF_ELIMINADO = range(4)
+_HOJAS_DIFF = ("Precios ↑", "Precios ↓", "Nuevos modelos", "Modelos eliminados")
+_ENCABEZADOS_DIFF = (["ID","Moneda","Precio anterior","Precio nuevo","Δ","Δ %"],
+                     ["ID","Moneda","Precio anterior","Precio nuevo","Δ","Δ %"],
+                     ["ID","Moneda","Precio"],
+                     ["ID","Moneda","Precio"])
+
+# Esquema estable de las salidas JSONL / CSV.gz: una fila por cambio, mismas columnas para
+# todas las categorías (null donde no aplica). No reordenar ni renombrar: sólo agregar al final.
+_TIPOS_DIFF = ("sube", "baja", "nuevo", "eliminado")
+CAMPOS_DIFF = ("tipo", "id", "moneda", "precio_anterior", "precio_nuevo", "delta", "delta_pct")
+
+def _finito(x):
+    return None if isinstance(x, float) and (x != x or x in (float("inf"), float("-inf"))) else x
+
+def _fila_diff_plana(cat: int, fila: List[Any]) -> Tuple[Any, ...]:
+    if cat in (DIFF_SUBE, DIFF_BAJA):
+        _id, mon, p_old, p_new, delta, pct = fila
+    elif cat == DIFF_NUEVO:
+        (_id, mon, p_new), p_old, delta, pct = fila, None, None, None
+    else:
+        (_id, mon, p_old), p_new, delta, pct = fila, None, None, None
+    return (_TIPOS_DIFF[cat], _id, mon, _finito(p_old), _finito(p_new), _finito(delta), _finito(pct))
+
+class _SalidaDiff:
+    # Un archivo de salida abierto en modo streaming; se escribe como .tmp y se renombra al cerrar
+    def __init__(self, path: Path, formato: str):
+        self.path = path
+        self.formato = formato
+        self._tmp = path.with_name(path.name + ".tmp")
+        if formato == "jsonl":
+            self._f = self._tmp.open("w", encoding="utf-8", newline="\n")
+        else:
+            self._f = gzip.open(self._tmp, "wt", encoding="utf-8", newline="", compresslevel=6)
+            self._csv = csv.writer(self._f)
+            self._csv.writerow(CAMPOS_DIFF)
+
+    def escribir(self, plana: Tuple[Any, ...]) -> None:
+        if self.formato == "jsonl":
+            self._f.write(json.dumps(dict(zip(CAMPOS_DIFF, plana)), ensure_ascii=False,
+                                     separators=(",", ":")) + "\n")
+        else:
+            self._csv.writerow(plana)
+
+    def cerrar(self) -> Path:
+        self._f.close()
+        os.replace(self._tmp, self.path)
+        return self.path
+
+def iterar_diffs(prev_snap, curr_regs: Registros):
+    """
+    Genera (categoría, fila) sin armar listas, en orden de ID sobre todas las categorías
+    (igual con o sin NumPy).
+    """
+    if _usar_numpy(max(len(prev_snap), len(curr_regs))):
+        return _iterar_diffs_np(prev_snap, curr_regs)
+    return _iterar_diffs_py(prev_snap, curr_regs)
+
+def _iterar_diffs_py(prev_snap, curr_regs: Registros):
+    # Merge de los dos lados ordenados por ID: un solo recorrido, sin sets intermedios
+    curr_idx = curr_regs.indice()
+    c_ids = sorted(curr_idx)
+    binario = isinstance(prev_snap, SnapshotBinario)
+    p_ids = prev_snap.claves() if binario else sorted(prev_snap)
+
+    def prev_en(j: int) -> Tuple[Optional[str], Optional[float]]:
+        if binario:
+            return prev_snap.moneda(j), prev_snap.precio(j)
+        p = prev_snap[p_ids[j]]
+        return p.get("Moneda"), p.get("Precio")
+
+    i = j = 0
+    nc, np_ = len(c_ids), len(p_ids)
+    while i < nc or j < np_:
+        if j >= np_ or (i < nc and c_ids[i] < p_ids[j]):
+            _id = c_ids[i]
+            k = curr_idx[_id]
+            yield DIFF_NUEVO, [_id, curr_regs.moneda(k), curr_regs.precio(k)]
+            i += 1
+            continue
+        if i >= nc or p_ids[j] < c_ids[i]:
+            yield DIFF_ELIMINADO, [p_ids[j], *prev_en(j)]
+            j += 1
+            continue
+        _id = c_ids[i]
+        k = curr_idx[_id]
+        mon_prev, p_old = prev_en(j)
+        i += 1
+        j += 1
+        p_new = curr_regs.precio(k)
         if p_old is None or p_new is None:
             continue
         if p_new != p_old:
+            mon = curr_regs.moneda(k) or mon_prev
             delta = p_new - p_old
             delta_pct = (delta / p_old * 100.0) if p_old != 0 else None
-            row = [_id, mon, p_old, p_new, delta, delta_pct]
-            if delta > 0: precios_up.append(row)
-            else:         precios_dn.append(row)
-
-    for _id in nuevos_ids:
-        c = curr_map[_id]
-        nuevos.append([_id, c.get("Moneda"), c.get("Precio")])
-
-    for _id in elim_ids:
-        p = prev_snap[_id]
-        eliminados.append([_id, p.get("Moneda"), p.get("Precio")])
-
-    return precios_up, precios_dn, nuevos, eliminados
-
-def hay_cambios(precios_up, precios_dn, nuevos, eliminados) -> bool:
-    return any([precios_up, precios_dn, nuevos, eliminados])
-
-def crear_libro_cambios(source_key: str,
-                        precios_up: List[List[Any]],
-                        precios_dn: List[List[Any]],
-                        nuevos: List[List[Any]],
-                        eliminados: List[List[Any]]) -> Path:
-    wb = Workbook(write_only=True)
-    sh_res = wb.create_sheet("Resumen")
-    sh_up  = wb.create_sheet("Precios ↑")
-    sh_dn  = wb.create_sheet("Precios ↓")
-    sh_new = wb.create_sheet("Nuevos modelos")
-    sh_del = wb.create_sheet("Modelos eliminados")
-    try:
-        d = wb.worksheets[0]
-        if d.title not in {"Resumen","Precios ↑","Precios ↓","Nuevos modelos","Modelos eliminados"}:
-            wb.remove(d)
-    except Exception:
-        pass
-
-    sh_up.append(["ID","Moneda","Precio anterior","Precio nuevo","Δ","Δ %"])
-    sh_dn.append(["ID","Moneda","Precio anterior","Precio nuevo","Δ","Δ %"])
-    sh_new.append(["ID","Moneda","Precio"])
-    sh_del.append(["ID","Moneda","Precio"])
-
-    for r in precios_up: sh_up.append(r)
-    for r in precios_dn: sh_dn.append(r)
-    for r in nuevos:     sh_new.append(r)
-    for r in eliminados: sh_del.append(r)
-
-    cnt_up = len(precios_up)
-    cnt_dn = len(precios_dn)
-    cnt_new = len(nuevos)
-    cnt_del = len(eliminados)
-    sum_up = round(sum((x[4] for x in precios_up)), 4) if cnt_up else 0
-    sum_dn = round(sum((x[4] for x in precios_dn)), 4) if cnt_dn else 0
-
-    sh_res.append(["Fuente", source_key])
-    sh_res.append(["Generado", datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
-    sh_res.append([])
-    sh_res.append(["Métrica","Valor"])
-    sh_res.append(["Precios ↑ (cantidad)", cnt_up])
-    sh_res.append(["Precios ↓ (cantidad)", cnt_dn])
-    sh_res.append(["Suma Δ ↑", sum_up])
-    sh_res.append(["Suma Δ ↓", sum_dn])
-    sh_res.append(["Nuevos modelos", cnt_new])
-    sh_res.append(["Modelos eliminados", cnt_del])
-
-    out = REPORTS_DIR / f"{source_key}_DIFF_{ts()}.xlsx"
-    wb.save(out)
-    log(f"🧾 Reporte generado: {out.name}")
-
-    # Bandera/summary y copia pública
-    (BASE_DIR / "CHANGES_FLAG").write_text("1", encoding="utf-8")
-    with (BASE_DIR / "SUMMARY.md").open("a", encoding="utf-8") as f:
-        f.write(f"## {source_key}\n")
-        f.write(f"- Precios ↑: {cnt_up} | Suma Δ: {sum_up}\n")
-        f.write(f"- Precios ↓: {cnt_dn} | Suma Δ: {sum_dn}\n")
-        f.write(f"- Nuevos: {cnt_new} | Eliminados: {cnt_del}\n\n")
+            yield (DIFF_SUBE if delta > 0 else DIFF_BAJA), [_id, mon, p_old, p_new, delta, delta_pct]
 
+def _iterar_diffs_np(prev_snap, curr_regs: Registros):
+    """
+    Mismas filas y en el mismo orden que _iterar_diffs_py, pero alineando precios previos/actuales
+    por ID ordenado (merge join con searchsorted) y calculando Δ / Δ% y los cortes con máscaras.
+    """
+    curr_idx = curr_regs.indice()
+    c_ids = np.array(list(curr_idx), dtype=str)
+    c_pos = np.fromiter(curr_idx.values(), dtype=np.intp, count=len(curr_idx))
+    c_pr = np.frombuffer(curr_regs._precio, dtype=np.float64)[c_pos]   # NaN = sin precio
+
+    if isinstance(prev_snap, SnapshotBinario):
+        # Ya viene ordenado por ID y con los precios en un bloque float64 (sin copiar)
+        prev_keys = prev_snap.claves()
+        p_ids = np.array(prev_keys, dtype=str)
+        p_pr = np.frombuffer(prev_snap._precios, dtype=np.float64)
+        p_none = np.isnan(p_pr)
+        op = np.arange(len(prev_keys))
+
+        def prev_en(x: int) -> Tuple[Optional[str], Optional[float]]:
+            return prev_snap.moneda(x), prev_snap.precio(x)
+    else:
+        prev_keys = list(prev_snap)
+        prev_vals = list(prev_snap.values())
+        p_ids = np.array(prev_keys, dtype=str)
+        p_none = np.fromiter((v.get("Precio") is None for v in prev_vals), dtype=bool, count=len(prev_vals))
+        p_pr = np.fromiter((np.nan if v.get("Precio") is None else v["Precio"] for v in prev_vals),
+                           dtype=np.float64, count=len(prev_vals))
+        op = np.argsort(p_ids, kind="stable")
+        p_ids, p_none, p_pr = p_ids[op], p_none[op], p_pr[op]
+
+        def prev_en(x: int) -> Tuple[Optional[str], Optional[float]]:
+            v = prev_vals[op[x]]
+            return v.get("Moneda"), v.get("Precio")
+
+    oc = np.argsort(c_ids, kind="stable")
+    c_ids, c_pos, c_pr = c_ids[oc], c_pos[oc], c_pr[oc]
+
+    # Para cada ID actual, su posición en los previos (y viceversa)
+    j = np.searchsorted(p_ids, c_ids)
+    en_prev = j < len(p_ids)
+    en_prev[en_prev] = p_ids[j[en_prev]] == c_ids[en_prev]
+    k = np.searchsorted(c_ids, p_ids)
+    en_curr = k < len(c_ids)
+    en_curr[en_curr] = c_ids[k[en_curr]] == p_ids[en_curr]
+
+    ic = np.nonzero(en_prev)[0]
+    jp = j[ic]
+    p_old, p_new = p_pr[jp], c_pr[ic]
+    del p_pr  # en el binario es una vista del mmap: no retenerla mientras se consume el generador
+    with np.errstate(all="ignore"):
+        cambia = ~p_none[jp] & ~np.isnan(p_new) & (p_new != p_old)
+        delta = p_new - p_old
+        delta_pct = np.where(p_old != 0, delta / p_old * 100.0, np.nan)
+    sube = cambia & (delta > 0)
+
+    # Cada ID da a lo sumo una fila: se emiten en orden de ID (como el merge de _iterar_diffs_py),
+    # así los reportes que se escriben en streaming no cambian de orden según el backend.
+    cam = np.nonzero(cambia)[0]
+    nue = np.nonzero(~en_prev)[0]
+    eli = np.nonzero(~en_curr)[0]
+    orden = np.argsort(np.concatenate((c_ids[ic[cam]], c_ids[nue], p_ids[eli])), kind="stable").tolist()
+    n_cam, n_nue = len(cam), len(nue)
+    cam_i, cam_x = c_pos[ic[cam]].tolist(), jp[cam].tolist()
+    cam_o, cam_n = p_old[cam].tolist(), p_new[cam].tolist()
+    cam_d, cam_pct, cam_sube = delta[cam].tolist(), delta_pct[cam].tolist(), sube[cam].tolist()
+    nue_i, eli_x = c_pos[nue].tolist(), eli.tolist()
+    for r in orden:
+        if r < n_cam:
+            i, o = cam_i[r], cam_o[r]
+            mon = curr_regs.moneda(i) or prev_en(cam_x[r])[0]
+            yield (DIFF_SUBE if cam_sube[r] else DIFF_BAJA), [curr_regs.ids[i], mon, o, cam_n[r], cam_d[r],
+                                                              cam_pct[r] if o != 0 else None]
+        elif r < n_cam + n_nue:
+            i = nue_i[r - n_cam]
+            yield DIFF_NUEVO, [curr_regs.ids[i], curr_regs.moneda(i), curr_regs.precio(i)]
+        else:
+            x = eli_x[r - n_cam - n_nue]
+            yield DIFF_ELIMINADO, [prev_keys[op[x]], *prev_en(x)]
+
+# ========= ÍNDICES PÚBLICOS (index.json incremental) =========
+# index.json = {"total", "items" (los más nuevos primero), "paginas" (index-NNNN.json, la más nueva primero)}.
+# Cada publicación hace un upsert del ítem al frente; al pasar INDICE_PUBLICO_MAX, la mitad más
+# vieja se archiva en una página nueva que ya no se vuelve a tocar. El dashboard carga sólo el
+# index.json y pide páginas a demanda; el CI no re-escanea la carpeta.
+_RE_PAGINA_INDICE = re.compile(r"^index-(\d+)\.json$")
+
+def _item_publico(dir_pub: Path, archivo: Path, extra: Dict[str, Any]) -> Dict[str, Any]:
+    st = archivo.stat()
+    rel = f"{dir_pub.name}/{archivo.name}"
+    item = {"name": archivo.name, "href": rel, "url": rel, "bytes": st.st_size,
+            "size_kb": round(st.st_size / 1024), "mtime": int(st.st_mtime)}
+    item.update(extra)
+    return item
+
+def _leer_indice_publico(path: Path) -> Dict[str, Any]:
     try:
-        (PUBLIC_REPORTS_DIR / out.name).write_bytes(out.read_bytes())
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        data = []
     except Exception as e:
-        log(f"⚠️ No se pudo copiar reporte a public_reports: {e}")
+        log(f"⚠️ {path.parent.name}/{path.name} ilegible, se arranca de cero: {e}")
+        data = []
+    if isinstance(data, list):
+        # formato viejo (array plano armado por el workflow)
+        return {"total": len(data), "items": data, "paginas": []}
+    data.setdefault("items", [])
+    data.setdefault("paginas", [])
+    data.setdefault("total", len(data["items"]))
+    return data
 
-    return out
+@contextmanager
+def _bloqueo_indice(dir_pub: Path):
+    # las fuentes corren en procesos distintos y publican sobre el mismo index.json
+    if fcntl is None:
+        yield
+        return
+    # el lock va en _cache/ (ignorado por git): no es estado a versionar
+    with (CACHE_DIR / f"{dir_pub.name}.index.lock").open("a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _proxima_pagina_indice(paginas: List[str]) -> str:
+    nums = [int(m.group(1)) for m in map(_RE_PAGINA_INDICE.match, paginas) if m]
+    return f"index-{max(nums, default=0) + 1:04d}.json"
+
+def publicar_en_indice(dir_pub: Path, archivo: Path, **extra: Any) -> None:
+    """
+    Upsert de `archivo` en dir_pub/index.json (reemplazo atómico). Un nombre con timestamp es
+    único por corrida, así que alcanza con la cabecera; uno fijo (p.ej. ListaImsa_ULTIMA.xlsx)
+    puede haber quedado en una página archivada: se saca de ahí para no listarlo ni contarlo dos veces.
+    """
+    item = _item_publico(dir_pub, archivo, extra)
+    idx_path = dir_pub / "index.json"
+    with _bloqueo_indice(dir_pub):
+        idx = _leer_indice_publico(idx_path)
+        items = [it for it in idx["items"] if it.get("name") != item["name"]]
+        paginas = list(idx["paginas"])
+        nuevo = len(items) == len(idx["items"])
+        if nuevo and not _RE_ARTEFACTO.match(item["name"]):
+            paginas, quitados = _quitar_de_paginas(dir_pub, paginas, {item["name"]})
+            nuevo = not quitados
+        total = idx["total"] + nuevo
+        items.insert(0, item)
+        if len(items) > INDICE_PUBLICO_MAX:
+            corte = INDICE_PUBLICO_MAX // 2
+            pagina = _proxima_pagina_indice(paginas)
+            _escribir_json_atomico(dir_pub / pagina, items[corte:], indent=2)
+            items = items[:corte]
+            paginas.insert(0, pagina)
+        _escribir_json_atomico(idx_path, {"total": total, "items": items, "paginas": paginas}, indent=2)
+
+def _quitar_de_paginas(dir_pub: Path, paginas: List[str], nombres: set) -> Tuple[List[str], int]:
+    # Saca `nombres` de las páginas archivadas (las que quedan vacías se borran) → (páginas, quitados)
+    quedan_paginas, quitados = [], 0
+    for pagina in paginas:
+        p = dir_pub / pagina
+        try:
+            viejos = json.loads(p.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        quedan = [it for it in viejos if it.get("name") not in nombres]
+        quitados += len(viejos) - len(quedan)
+        if not quedan:
+            p.unlink()
+            continue
+        if len(quedan) != len(viejos):
+            _escribir_json_atomico(p, quedan, indent=2)
+        quedan_paginas.append(pagina)
+    return quedan_paginas, quitados
+
+def quitar_de_indice(dir_pub: Path, nombres: set) -> int:
+    """Saca `nombres` de index.json y de las páginas que los tengan (las que quedan vacías se borran)."""
+    idx_path = dir_pub / "index.json"
+    if not nombres or not idx_path.exists():
+        return 0
+    with _bloqueo_indice(dir_pub):
+        idx = _leer_indice_publico(idx_path)
+        items = [it for it in idx["items"] if it.get("name") not in nombres]
+        paginas, quitados = _quitar_de_paginas(dir_pub, idx["paginas"], nombres)
+        quitados += len(idx["items"]) - len(items)
+        _escribir_json_atomico(idx_path, {"total": max(0, idx["total"] - quitados), "items": items,
+                                          "paginas": paginas}, indent=2)
+    return quitados
+
+def reconstruir_indice_publico(dir_pub: Path) -> int:
+    """Índice completo desde el contenido de la carpeta (arranque o reparación; O(archivos))."""
+    with _bloqueo_indice(dir_pub):
+        for viejo in dir_pub.glob("index-*.json"):
+            if _RE_PAGINA_INDICE.match(viejo.name):
+                viejo.unlink()
+        items = []
+        for p in dir_pub.glob("*.xlsx"):
+            extra: Dict[str, Any] = {}
+            alternativas = {fmt: f"{dir_pub.name}/{p.stem}.{fmt}" for fmt in ("jsonl", "csv.gz")
+                            if (dir_pub / f"{p.stem}.{fmt}").exists()}
+            if alternativas:
+                extra["alternativas"] = alternativas
+            items.append(_item_publico(dir_pub, p, extra))
+        items.sort(key=lambda it: (it["mtime"], it["name"]), reverse=True)
+        corte = INDICE_PUBLICO_MAX // 2
+        cabeza, resto = items[:corte], items[corte:]
+        # páginas de `corte` ítems, numeradas de la más vieja (0001) a la más nueva
+        trozos = [resto[i:i + corte] for i in range(0, len(resto), corte)]
+        paginas = []
+        for n, trozo in enumerate(reversed(trozos), 1):
+            pagina = f"index-{n:04d}.json"
+            _escribir_json_atomico(dir_pub / pagina, trozo, indent=2)
+            paginas.insert(0, pagina)
+        _escribir_json_atomico(dir_pub / "index.json",
+                               {"total": len(items), "items": cabeza, "paginas": paginas}, indent=2)
+    return len(items)
+
+def cli_indice_publico(args: List[str]) -> int:
+    # python hash_comparativo.py indice-publico [--forzar]
+    # Sin --forzar sólo arma los index.json que falten (no re-escanea carpetas ya indexadas).
+    forzar = "--forzar" in args
+    for dir_pub in (PUBLIC_REPORTS_DIR, PUBLIC_LISTAS_DIR):
+        if not forzar and (dir_pub / "index.json").exists():
+            log(f"ℹ️ {dir_pub.name}/index.json ya existe (se mantiene incremental).")
+            continue
+        n = reconstruir_indice_publico(dir_pub)
+        log(f"🗂️ {dir_pub.name}/index.json reconstruido: {n} ítems.")
+    return 0
+
+class ReporteCambios:
+    """
+    Libro de cambios incremental: cada fila de iterar_diffs va directo a su hoja (write-only,
+    a disco) y el Resumen se arma con contadores/sumas acumulados al cerrar. El libro se crea
+    recién con la primera fila: si no hubo cambios, cerrar() devuelve None y no escribe nada.
+    """
+
+    def __init__(self, source_key: str):
+        self.source_key = source_key
+        self.cantidades = [0, 0, 0, 0]
+        self.suma_up = 0
+        self.suma_dn = 0
+        self._wb = None
+        self._hojas: List[Any] = []
+        self._res = None
+        self._stem = ""
+        self._salidas: List[_SalidaDiff] = []
+
+    def _abrir(self) -> None:
+        self._stem = f"{self.source_key}_DIFF_{ts()}"
+        # JSONL / CSV.gz en la misma pasada que el xlsx (sin parsear el libro después)
+        for fmt in DIFF_SALIDAS:
+            if fmt in ("jsonl", "csv.gz"):
+                self._salidas.append(_SalidaDiff(REPORTS_DIR / f"{self._stem}.{fmt}", fmt))
+        self._wb = nuevo_libro_xlsx()
+        self._res = self._wb.create_sheet("Resumen")
+        self._hojas = [self._wb.create_sheet(t) for t in _HOJAS_DIFF]
+        try:
+            d = self._wb.worksheets[0]
+            if d.title not in {"Resumen", *_HOJAS_DIFF}:
+                self._wb.remove(d)
+        except Exception:
+            pass
+        for sh, enc in zip(self._hojas, _ENCABEZADOS_DIFF):
+            sh.append(enc)
+
+    def agregar(self, cat: int, fila: List[Any]) -> None:
+        if self._wb is None:
+            self._abrir()
+        self._hojas[cat].append(fila)
+        if self._salidas:
+            plana = _fila_diff_plana(cat, fila)
+            for sal in self._salidas:
+                sal.escribir(plana)
+        self.cantidades[cat] += 1
+        if cat == DIFF_SUBE:
+            self.suma_up += fila[4]
+        elif cat == DIFF_BAJA:
+            self.suma_dn += fila[4]
+
+    def consumir(self, filas) -> "ReporteCambios":
+        for cat, fila in filas:
+            self.agregar(cat, fila)
+        return self
+
+    def cerrar(self) -> Optional[Path]:
+        if self._wb is None:
+            return None
+        source_key = self.source_key
+        cnt_up, cnt_dn, cnt_new, cnt_del = self.cantidades
+        sum_up = round(self.suma_up, 4) if cnt_up else 0
+        sum_dn = round(self.suma_dn, 4) if cnt_dn else 0
+
+        sh_res = self._res
+        sh_res.append(["Fuente", source_key])
+        sh_res.append(["Generado", datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
+        sh_res.append([])
+        sh_res.append(["Métrica","Valor"])
+        sh_res.append(["Precios ↑ (cantidad)", cnt_up])
+        sh_res.append(["Precios ↓ (cantidad)", cnt_dn])
+        sh_res.append(["Suma Δ ↑", sum_up])
+        sh_res.append(["Suma Δ ↓", sum_dn])
+        sh_res.append(["Nuevos modelos", cnt_new])
+        sh_res.append(["Modelos eliminados", cnt_del])
+
+        out = REPORTS_DIR / f"{self._stem}.xlsx"
+        self._wb.save(out)
+        self._wb = None
+        formatos = [sal.formato for sal in self._salidas]
+        extras = [sal.cerrar() for sal in self._salidas]
+        self._salidas = []
+        log(f"🧾 Reporte generado: {out.name}" + (f" (+ {', '.join(formatos)})" if formatos else ""))
+
+        # Bandera, números para el ledger (SUMMARY.md se arma al final de la corrida) y copia pública
+        (BASE_DIR / "CHANGES_FLAG").write_text("1", encoding="utf-8")
+        anotar_corrida(reporte=out.name, sube=cnt_up, baja=cnt_dn, suma_sube=sum_up, suma_baja=sum_dn,
+                       nuevos=cnt_new, eliminados=cnt_del)
+
+        try:
+            for p in (out, *extras):
+                publicar_archivo(p, PUBLIC_REPORTS_DIR / p.name)
+            alternativas = {fmt: f"{PUBLIC_REPORTS_DIR.name}/{p.name}" for fmt, p in zip(formatos, extras)}
+            publicar_en_indice(PUBLIC_REPORTS_DIR, PUBLIC_REPORTS_DIR / out.name, fuente=source_key,
+                               **({"alternativas": alternativas} if alternativas else {}))
+        except Exception as e:
+            log(f"⚠️ No se pudo publicar reporte en public_reports: {e}")
+
+        return out
 
 # ========= SALIDA “Hoja 1” =========
-def guardar_hoja1_xlsx(path_base: Path, registros: List[Dict[str, Any]], nombre_salida: Optional[str] = None) -> Path:
-    wb_out = Workbook(write_only=True)
+def guardar_hoja1_xlsx(path_base: Path, registros: Registros, nombre_salida: Optional[str] = None,
+                       source_key: Optional[str] = None) -> Tuple[Path, bool]:
+    """Escribe la Hoja 1 y la publica en public_listas → (path, publicada)."""
+    wb_out = nuevo_libro_xlsx()
     h1 = wb_out.create_sheet("Hoja 1")
     try:
         d = wb_out.worksheets[0]
@@ -627,23 +2467,62 @@ def guardar_hoja1_xlsx(path_base: Path, registros: List[Dict[str, Any]], nombre_
     except Exception:
         pass
     h1.append(["ID","Stock","Precio","Moneda"])
-    for r in registros:
-        h1.append([r.get("ID"), r.get("Stock"), r.get("Precio"), r.get("Moneda")])
+    for fila in registros.filas():
+        h1.append(fila)
     out = path_base.with_name(path_base.stem + (nombre_salida or "_HOJA1") + ".xlsx")
     wb_out.save(out)
     log(f"✅ {path_base.stem} → {out.name}")
 
-    # Copia la última "Hoja 1" a carpeta pública (una por fuente)
+    # Copia la última "Hoja 1" a carpeta pública (una por fuente; nombre fijo si la fuente lo define)
     try:
-        safe = f"{path_base.stem}_ULTIMA.xlsx"
-        (PUBLIC_LISTAS_DIR / safe).write_bytes(out.read_bytes())
+        safe = FUENTES.get(source_key, {}).get("publica") or f"{path_base.stem}_ULTIMA.xlsx"
+        publicar_archivo(out, PUBLIC_LISTAS_DIR / safe)
+        publicar_en_indice(PUBLIC_LISTAS_DIR, PUBLIC_LISTAS_DIR / safe, fuente=source_key or path_base.stem)
     except Exception as e:
         log(f"⚠️ No se pudo copiar Hoja 1 a public_listas: {e}")
+        return out, False
 
-    return out
+    return out, True
 
 # ========= SELENIUM (headless, CI-friendly) =========
-def _build_chrome() -> webdriver.Chrome:
+# El chromedriver resuelto se guarda por versión de Chrome instalada: mientras Chrome no cambie,
+# no se vuelve a consultar webdriver-manager (ni la red).
+_DRIVER_CACHE = CACHE_DIR / "chromedriver.json"
+_RE_VERSION_CHROME = re.compile(r"(\d+\.\d+\.\d+\.\d+)")
+
+def version_chrome() -> Optional[str]:
+    candidatos = [CHROME_BIN] if CHROME_BIN else ["google-chrome", "google-chrome-stable", "chromium",
+                                                 "chromium-browser", "chrome"]
+    for exe in candidatos:
+        ruta = shutil.which(exe) or (exe if Path(exe).is_file() else None)
+        if not ruta:
+            continue
+        try:
+            salida = subprocess.run([ruta, "--version"], capture_output=True, text=True, timeout=15).stdout
+        except Exception:
+            continue
+        m = _RE_VERSION_CHROME.search(salida)
+        if m:
+            return m.group(1)
+    return None
+
+def resolver_chromedriver(forzar: bool = False) -> str:
+    version = version_chrome()
+    try:
+        cache = json.loads(_DRIVER_CACHE.read_text(encoding="utf-8"))
+    except Exception:
+        cache = {}
+    ruta = cache.get("driver")
+    if (not forzar and version and cache.get("chrome") == version
+            and ruta and os.path.isfile(ruta) and os.access(ruta, os.X_OK)):
+        return ruta
+    ruta = ChromeDriverManager().install()
+    if version:
+        _escribir_json_atomico(_DRIVER_CACHE, {"chrome": version, "driver": ruta}, indent=2)
+        log(f"🧩 chromedriver para Chrome {version} cacheado: {ruta}")
+    return ruta
+
+def _build_chrome(descargas: Path = RUTA_DESCARGA) -> webdriver.Chrome:
     chrome_options = Options()
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--no-sandbox")
@@ -652,77 +2531,133 @@ def _build_chrome() -> webdriver.Chrome:
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_argument("--window-size=1920,1080")
     prefs = {
-        "download.default_directory": str(RUTA_DESCARGA),
+        "download.default_directory": str(descargas),
         "download.prompt_for_download": False,
         "download.directory_upgrade": True,
         "safebrowsing.enabled": True,
     }
     chrome_options.add_experimental_option("prefs", prefs)
-    service = Service(ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=chrome_options)
+    if CHROME_BIN:
+        chrome_options.binary_location = CHROME_BIN
+    if CHROME_PERFIL:
+        perfil = Path(CHROME_PERFIL).resolve()
+        perfil.mkdir(parents=True, exist_ok=True)
+        chrome_options.add_argument(f"--user-data-dir={perfil}")
+    try:
+        driver = webdriver.Chrome(service=Service(resolver_chromedriver()), options=chrome_options)
+    except SessionNotCreatedException:
+        # driver cacheado que ya no sirve para este Chrome → se resuelve de nuevo una vez
+        driver = webdriver.Chrome(service=Service(resolver_chromedriver(forzar=True)), options=chrome_options)
+    try:
+        # headless=new a veces ignora el pref: se fija también por DevTools
+        driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": str(descargas)})
+    except Exception:
+        pass
+    return driver
 
 def _close_driver(driver: webdriver.Chrome):
     try: driver.quit()
     except Exception: pass
 
-def _find_recent_listaimsa(max_age_sec: int = 180) -> Optional[Path]:
-    now = time.time()
-    pats = ("lista", "imsa")
-    exts = (".xlsx", ".xls")
-    candidatos = []
-    for p in RUTA_DESCARGA.iterdir():
-        if not p.is_file(): continue
-        if p.suffix.lower() not in exts: continue
-        name = p.name.lower()
-        if not any(s in name for s in pats): continue
-        try: mtime = p.stat().st_mtime
-        except Exception: continue
-        if now - mtime <= max_age_sec:
-            if (RUTA_DESCARGA / (p.name + ".crdownload")).exists():
-                continue
-            candidatos.append(p)
-    if not candidatos:
+# Descarga detectada por eventos: Chrome baja a X.crdownload en una carpeta propia de la
+# corrida y al terminar renombra a X.xlsx. Con inotify (Linux) se despierta en cada
+# IN_MOVED_TO / IN_CLOSE_WRITE y vuelve apenas el archivo está completo; sin inotify,
+# sondeo corto. Siempre con plazo total.
+_IN_CLOSE_WRITE, _IN_MOVED_TO = 0x8, 0x80
+
+def _abrir_inotify(carpeta: Path) -> Optional[int]:
+    try:
+        import ctypes, ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(str(carpeta)), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception:
         return None
-    return max(candidatos, key=lambda x: x.stat().st_mtime)
+
+def _descarga_completa(carpeta: Path) -> Optional[Path]:
+    listos = []
+    for p in carpeta.iterdir():
+        if p.suffix.lower() not in (".xlsx", ".xls") or not p.is_file():
+            continue
+        if p.with_name(p.name + ".crdownload").exists() or p.stat().st_size == 0:
+            continue
+        listos.append(p)
+    return max(listos, key=lambda x: x.stat().st_mtime) if listos else None
+
+def esperar_descarga(carpeta: Path, timeout: float) -> Optional[Path]:
+    """Primer .xlsx/.xls completo que aparezca en `carpeta` antes de `timeout` segundos (o None)."""
+    deadline = time.monotonic() + timeout
+    fd = _abrir_inotify(carpeta)
+    try:
+        while True:
+            # se re-mira la carpeta al arrancar y tras cada evento (es chica: sólo esta descarga)
+            listo = _descarga_completa(carpeta)
+            if listo:
+                return listo
+            resta = deadline - time.monotonic()
+            if resta <= 0:
+                return None
+            if fd is None:
+                time.sleep(min(0.25, resta))
+                continue
+            if select.select([fd], [], [], resta)[0]:
+                try:
+                    os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    pass
+    finally:
+        if fd is not None:
+            os.close(fd)
 
 def descargar_imsa_web() -> Optional[Path]:
     driver = None
+    carpeta = RUTA_DESCARGA / f"_imsa_{ts()}"
+    carpeta.mkdir(parents=True, exist_ok=True)
     try:
-        driver = _build_chrome()
+        driver = _build_chrome(carpeta)
+        t0 = time.monotonic()
         log("🌐 Abriendo IMSA…")
         driver.get(IMSA_URL)
 
         try:
             iframes = WebDriverWait(driver, 20).until(EC.presence_of_all_elements_located((By.TAG_NAME, "iframe")))
             driver.switch_to.frame(iframes[0])
-            WebDriverWait(driver, 20).until(EC.element_to_be_clickable((By.ID, "pass"))).send_keys(IMSA_PASSWORD)
-            btn = driver.find_element(By.XPATH, "//input[@type='submit' and @value='Login']")
-            driver.execute_script("arguments[0].click();", btn)
-            log("🔑 Login enviado.")
+            try:
+                # con perfil persistente la sesión puede seguir vigente: no se espera de más al #pass
+                campo = WebDriverWait(driver, 5 if CHROME_PERFIL else 20).until(
+                    EC.element_to_be_clickable((By.ID, "pass")))
+            except TimeoutException:
+                if not CHROME_PERFIL:
+                    raise
+                campo = None
+            if campo is None:
+                log("🍪 Sesión IMSA vigente (perfil persistente) → sin login.")
+            else:
+                campo.send_keys(IMSA_PASSWORD)
+                btn = driver.find_element(By.XPATH, "//input[@type='submit' and @value='Login']")
+                driver.execute_script("arguments[0].click();", btn)
+                log("🔑 Login enviado.")
         except Exception as e:
             log(f"⚠️ No se pudo automatizar el login: {e}")
         finally:
             try: driver.switch_to.default_content()
             except Exception: pass
 
-        log("⏳ Esperando 60s para descarga automática…")
-        time.sleep(60)
-
-        cand = _find_recent_listaimsa(max_age_sec=240)
-        if cand:
-            log(f"✅ IMSA detectado: {cand.name}")
-            return cand
-
-        log("🔎 Polling carpeta (hasta 60s)…")
-        deadline = time.time() + 60
-        while time.time() < deadline:
-            cand = _find_recent_listaimsa(max_age_sec=240)
-            if cand:
-                log(f"✅ IMSA detectado: {cand.name}")
-                return cand
-            time.sleep(2)
-        log("⚠️ No se detectó archivo IMSA.")
-        return None
+        log(f"⏳ Esperando la descarga automática (hasta {IMSA_TIMEOUT:.0f}s)…")
+        cand = esperar_descarga(carpeta, IMSA_TIMEOUT)
+        if not cand:
+            log("⚠️ No se detectó archivo IMSA.")
+            return None
+        # mismo esquema de nombre que las descargas HTTP (<fuente>_<ts>)
+        dst = RUTA_DESCARGA / f"IMSA_{ts()}{cand.suffix.lower()}"
+        os.replace(cand, dst)
+        log(f"✅ IMSA detectado: {cand.name} → {dst.name} ({time.monotonic() - t0:.1f}s)")
+        return dst
     except Exception as e:
         log(f"❌ Error en flujo IMSA: {e}")
         return None
@@ -730,94 +2665,596 @@ def descargar_imsa_web() -> Optional[Path]:
         if driver:
             _close_driver(driver)
             log("🧹 Selenium cerrado.")
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+# ========= IMSA POR HTTP (sin navegador) =========
+# Repite lo que hace Chrome: página → iframe → form con #pass → submit "Login" → la planilla,
+# que puede venir directo en la respuesta o detrás de un link / meta refresh / location.href.
+# Se baja por stream a downloads/IMSA_<ts>.xlsx. Si algo no cuadra, Selenium de respaldo.
+_RE_META_URL = re.compile(r'url\s*=\s*[\'"]?([^\'";\s]+)', re.I)
+_RE_JS_LOCATION = re.compile(r'location(?:\.href)?\s*=\s*[\'"]([^\'"]+)[\'"]', re.I)
+_RE_JS_PLANILLA = re.compile(r'[\'"]([^\'"\s<>]+\.xlsx?(?:\?[^\'"\s<>]*)?)[\'"]', re.I)
+_MAGIAS_PLANILLA = (b"PK\x03\x04", b"\xd0\xcf\x11\xe0")  # xlsx (zip) / xls (OLE)
+_SALTOS_IMSA = 5
+
+class _HtmlImsa(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.iframes: List[str] = []
+        self.forms: List[Dict[str, Any]] = []
+        self.links: List[str] = []
+        self.refresh: Optional[str] = None
+        self._form: Optional[Dict[str, Any]] = None
+
+    def handle_starttag(self, tag, attrs):
+        a = {k.lower(): (v or "") for k, v in attrs}
+        if tag == "iframe" and a.get("src"):
+            self.iframes.append(a["src"])
+        elif tag == "form":
+            self._form = {"action": a.get("action", ""), "method": (a.get("method") or "get").lower(), "inputs": []}
+            self.forms.append(self._form)
+        elif tag in ("input", "button") and self._form is not None:
+            self._form["inputs"].append({"type": "submit" if tag == "button" else "text", **a})
+        elif tag == "a" and a.get("href"):
+            self.links.append(a["href"])
+        elif tag == "meta" and a.get("http-equiv", "").lower() == "refresh":
+            m = _RE_META_URL.search(a.get("content", ""))
+            if m:
+                self.refresh = m.group(1)
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._form = None
+
+def _parsear_html(texto: str) -> _HtmlImsa:
+    p = _HtmlImsa()
+    p.feed(texto)
+    p.close()
+    return p
+
+def _form_login(pag: _HtmlImsa) -> Optional[Dict[str, Any]]:
+    for form in pag.forms:
+        if any(i.get("id") == "pass" or i.get("type", "").lower() == "password" for i in form["inputs"]):
+            return form
+    return None
 
-# ========= MAIN =========
-if __name__ == "__main__":
-    log("INICIO — HASH por archivo completo + BASE visible + GATE diario + HOJA1 + DIFERENCIAS")
+def _datos_login(form: Dict[str, Any], password: str) -> Dict[str, str]:
+    # campos ocultos tal cual + la clave + sólo el botón "Login" (como el click de Selenium)
+    datos: Dict[str, str] = {}
+    for i in form["inputs"]:
+        tipo = i.get("type", "text").lower()
+        if i.get("id") == "pass" or tipo == "password":
+            datos[i.get("name") or "pass"] = password
+        elif not i.get("name"):
+            continue
+        elif tipo == "submit":
+            if i.get("value", "").lower() == "login":
+                datos[i["name"]] = i["value"]
+        elif tipo in ("checkbox", "radio"):
+            if "checked" in i:
+                datos[i["name"]] = i.get("value") or "on"
+        else:
+            datos[i["name"]] = i.get("value", "")
+    return datos
+
+def _es_planilla(r: requests.Response) -> bool:
+    ct = r.headers.get("Content-Type", "").lower()
+    cd = r.headers.get("Content-Disposition", "").lower()
+    return ("spreadsheet" in ct or "excel" in ct or "attachment" in cd
+            or urlparse(r.url).path.lower().endswith((".xlsx", ".xls")))
+
+def _siguiente_url(pag: _HtmlImsa, texto: str) -> Optional[str]:
+    for href in pag.links:
+        if re.search(r"\.xlsx?(?:$|\?)", href, re.I):
+            return href
+    for rx in (_RE_JS_PLANILLA, _RE_JS_LOCATION):
+        m = rx.search(texto)
+        if m:
+            return html.unescape(m.group(1))
+    return pag.refresh or (pag.iframes[0] if pag.iframes else None)
+
+def _guardar_planilla(r: requests.Response) -> Tuple[Path, str]:
+    # stream a disco con el SHA-256 sobre los mismos chunks (como download_con_hash)
+    ext = ".xls" if urlparse(r.url).path.lower().endswith(".xls") else ".xlsx"
+    dst = RUTA_DESCARGA / f"IMSA_{ts()}{ext}"
+    tmp = dst.with_name(dst.name + ".part")
+    h = hashlib.sha256()
+    try:
+        with tmp.open("wb") as f:
+            primero = True
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                if not chunk:
+                    continue
+                if primero and not chunk.startswith(_MAGIAS_PLANILLA):
+                    raise ValueError("la respuesta no es una planilla xlsx/xls")
+                primero = False
+                f.write(chunk)
+                h.update(chunk)
+        if primero:
+            raise ValueError("planilla vacía")
+        tmp.replace(dst)
+        return dst, h.hexdigest()
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def descargar_imsa_http(url: Optional[str] = None, password: Optional[str] = None) -> Tuple[Path, str]:
+    """Login + descarga de IMSA con requests → (path, sha256). Levanta excepción si no llega a la planilla."""
+    url = url or IMSA_URL
+    password = IMSA_PASSWORD if password is None else password
+    with requests.Session() as s:
+        s.headers.update(REQ_HEADERS)
+        r = s.get(url, timeout=TIMEOUT)
+        r.raise_for_status()
+        pag = _parsear_html(r.text)
+        form = _form_login(pag)
+        if form is None and pag.iframes:
+            r = s.get(urljoin(r.url, pag.iframes[0]), timeout=TIMEOUT, headers={"Referer": r.url})
+            r.raise_for_status()
+            form = _form_login(_parsear_html(r.text))
+        if form is None:
+            raise RuntimeError("no se encontró el formulario de login (#pass)")
+        accion = urljoin(r.url, form["action"] or r.url)
+        datos = _datos_login(form, password)
+        if form["method"] == "post":
+            r = s.post(accion, data=datos, timeout=TIMEOUT, stream=True, headers={"Referer": r.url})
+        else:
+            r = s.get(accion, params=datos, timeout=TIMEOUT, stream=True, headers={"Referer": r.url})
+        log("🔑 Login IMSA enviado (HTTP).")
+        for _ in range(_SALTOS_IMSA):
+            with r:
+                r.raise_for_status()
+                if _es_planilla(r):
+                    return _guardar_planilla(r)
+                texto = r.text
+                pag = _parsear_html(texto)
+                if _form_login(pag) is not None:
+                    raise RuntimeError("el login fue rechazado (vuelve el formulario)")
+                sig = _siguiente_url(pag, texto)
+                if not sig:
+                    break
+                sig, ref = urljoin(r.url, sig), r.url
+            r = s.get(sig, timeout=TIMEOUT, stream=True, headers={"Referer": ref})
+        else:
+            r.close()   # se agotaron los saltos: la última respuesta quedó sin leer
+        raise RuntimeError("después del login no apareció ninguna planilla")
 
-    # 1) DESCARGAS (respetando gate diario por fuente)
-    tevelam = None
-    if not skip_por_base_de_hoy("Tevelam"):
+def descargar_imsa() -> Tuple[Optional[Path], Optional[str]]:
+    """
+    IMSA_MODO: "auto" (HTTP y, si falla, Selenium), "http" o "selenium".
+    Devuelve (path, sha256); por HTTP el hash sale del stream, con Selenium queda en None.
+    """
+    if IMSA_MODO != "selenium":
         try:
-            log("Descargando Tevelam…")
-            tevelam = download_simple(URL_TEVELAM, "Tevelam")
-            log(f"Tevelam → {tevelam}")
+            t0 = time.monotonic()
+            p, sha = descargar_imsa_http()
+            log(f"✅ IMSA descargado por HTTP: {p.name} ({time.monotonic() - t0:.1f}s)")
+            return p, sha
         except Exception as e:
-            log(f"ERROR Tevelam: {e}")
+            if IMSA_MODO == "http":
+                log(f"❌ IMSA por HTTP: {e}")
+                return None, None
+            log(f"⚠️ IMSA por HTTP falló ({e}) → respaldo con Selenium.")
+    return descargar_imsa_web(), None
+
+# ========= PIPELINE POR FUENTE =========
+def guardar_hoja1(path: Path, registros: Registros, source_key: Optional[str] = None) -> bool:
+    return guardar_hoja1_xlsx(path, registros, source_key=source_key)[1]
+
+def run_fuente(source_key: str, path: Optional[Path], sha256_hex: Optional[str] = None,
+               forzar: bool = False) -> bool:
+    """
+    Hash → extracción → Hoja 1 → difs. Devuelve False si la fuente se omitió por hash igual.
+    La base y los hashes se registran recién con las difs hechas (registrar_proceso).
+    forzar=True saltea los gates (reproceso de un archivo ya visto, p.ej. la base en _db).
+    """
+    if not path:
+        return True
+    if forzar:
+        sha256_hex = sha256_hex or file_sha256(path)
+    else:
+        procesar, sha256_hex = decide_should_process(source_key, path, sha256_hex, adoptar=False, registrar=False)
+        if not procesar:
+            return False
 
-    disco = None
-    if not skip_por_base_de_hoy("Disco_Pro"):
-        try:
-            log("Descargando Disco Pro…")
-            disco = download_simple(URL_DISCO_PRO, "Disco_Pro")
-            log(f"Disco_Pro → {disco}")
-        except Exception as e:
-            log(f"ERROR Disco Pro: {e}")
+    # Una sola lectura del libro alimenta Hoja 1 y difs (o ninguna, si el hash ya está en cache)
+    try:
+        regs = extraer_fuente_cacheado(source_key, path, sha256_hex)
+        anotar_corrida(filas=len(regs))
+    except Exception as e:
+        # sin registrar el hash: la próxima corrida lo vuelve a intentar
+        log(f"⚠️ {source_key}: error leyendo registros: {e}")
+        anotar_corrida(estado="error", error=f"lectura: {e}")
+        return True
+
+    content_hex = None
+    if HASH_CONTENIDO:
+        if forzar:
+            content_hex = content_sha256(regs)
+        else:
+            procesar, content_hex = decide_por_contenido(source_key, path, regs, sha256_hex, registrar=False)
+            if not procesar:
+                write_hash(source_key, sha256_hex)  # mismas filas: este binario ya quedó visto
+                return False
 
-    extra = None
-    if not skip_por_base_de_hoy("ARS_Tech"):
+    # A) HOJA 1 (sólo si cambiaron sus filas respecto de la última publicada)
+    try:
+        hoja1 = registros_hoja1(source_key, regs)
+        digest = hoja1_sha256(hoja1)
+        if HOJA1_SOLO_SI_CAMBIA and digest == read_prev_hoja1_hash(source_key):
+            log(f"⏭️ {source_key}: Hoja 1 sin cambios ({digest[:12]}…) → no se escribe ni se publica.")
+            anotar_corrida(hoja1="sin_cambios")
+        else:
+            # el digest se guarda sólo si quedó publicada: si no, la próxima corrida reintenta
+            if guardar_hoja1(path, hoja1, source_key):
+                write_hoja1_hash(source_key, digest)
+                anotar_corrida(hoja1="generada")
+            else:
+                anotar_corrida(hoja1="sin_publicar")
+    except Exception as e:
+        log(f"⚠️ {source_key}: error generando Hoja 1: {e}")
+
+    # B) DIFERENCIAS (precios/modelos) y libro condicional
+    try:
+        prev = cargar_snapshot(source_key)
         try:
-            log("Descargando Proveedor Extra…")
-            extra = download_simple(URL_PROVEEDOR_EXTRA, "ARS_Tech")
-            log(f"ARS_Tech → {extra}")
-        except Exception as e:
-            log(f"ERROR Proveedor Extra: {e}")
+            # Las filas van del motor de difs directo al libro (sin listas intermedias)
+            reporte = ReporteCambios(source_key).consumir(iterar_diffs(prev, regs))
+        finally:
+            cerrar_snapshot(prev)
+        if reporte.cerrar() is None:
+            log(f"ℹ️ {source_key}: hubo hash nuevo pero sin cambios de precio/modelos → no se genera libro.")
+        guardar_snapshot(source_key, regs)
+    except Exception as e:
+        log(f"⚠️ {source_key}: error calculando/generando diffs: {e} → hash sin registrar, se reprocesa.")
+        anotar_corrida(estado="error", error=f"difs: {e}")
+        return True
+    registrar_proceso(source_key, path, sha256_hex, content_hex)
 
-    imsa = None
-    if not skip_por_base_de_hoy("IMSA"):
+    # C) HISTORIAL de precios (append-only)
+    if HISTORIAL:
         try:
-            log("Lanzando IMSA…")
-            imsa = descargar_imsa_web()
-            log(f"IMSA detectado → {imsa}")
+            registrar_version_historial(source_key, regs, sha256_hex)
+            actualizar_indice_sku(source_key)
         except Exception as e:
-            log(f"ERROR flujo IMSA: {e}")
-
-    # 2) HASH & PROCESO
-    log("Comparando hashes y generando salidas…")
-    omitidos = []
-
-    def guardar_hoja1(path: Path, registros: List[Dict[str, Any]]):
-        guardar_hoja1_xlsx(path, registros)
-
-    def run_fuente(source_key: str, path: Optional[Path],
-                   extractor_diffs, extractor_hoja1):
-        if not path:
-            return
-        if decide_should_process(source_key, path):
-            # A) HOJA 1 (SIEMPRE)
+            log(f"⚠️ {source_key}: error registrando historial: {e}")
+    return True
+
+def cli_reprocesar(args: List[str]) -> int:
+    # python hash_comparativo.py reprocesar <fuente> [archivo.xlsx]  (por defecto: la base _db/<fuente>_DB.xlsx)
+    # Re-arma Hoja 1 y difs de un archivo ya visto (corrida cortada, backfill) sin bajar nada ni pasar
+    # por los gates; los registros salen del cache por SHA-256 si ya se extrajeron.
+    if not args or args[0] not in FUENTES:
+        log(f"Uso: hash_comparativo.py reprocesar <{'|'.join(FUENTES)}> [archivo.xlsx]")
+        return 2
+    source_key = args[0]
+    path = Path(args[1]) if len(args) > 1 else _db_path(source_key)
+    if not path.exists():
+        log(f"⚠️ {source_key}: no existe {path}.")
+        return 1
+    sha = leer_db_meta(source_key).get("sha256") if path.resolve() == _db_path(source_key).resolve() else None
+    log(f"🔁 {source_key}: reproceso de {path.name}")
+    run_fuente(source_key, path, sha, forzar=True)
+    return 0
+
+# Orden de las fuentes = orden del log final.
+# Fuentes con "url" se bajan por HTTP en el proceso principal (threads + Session compartida);
+# las que tienen "descarga" (IMSA) se bajan dentro de su worker: devuelve (path, sha256 | None).
+# "publica": nombre fijo de la Hoja 1 en public_listas (el que busca index.html); sin él, <descarga>_ULTIMA.xlsx.
+FUENTES: Dict[str, Dict[str, Any]] = {
+    "Tevelam":   {"etiqueta": "Tevelam",         "url": URL_TEVELAM},
+    "Disco_Pro": {"etiqueta": "Disco Pro",       "url": URL_DISCO_PRO},
+    "ARS_Tech":  {"etiqueta": "Proveedor Extra", "url": URL_PROVEEDOR_EXTRA},
+    "IMSA":      {"etiqueta": "IMSA",            "descarga": descargar_imsa,
+                  "publica": "ListaImsa_ULTIMA.xlsx"},
+}
+
+def descargar_fuentes_http(fuentes: List[str]) -> Dict[str, Tuple[Optional[Path], Optional[str]]]:
+    pedidos = {s: FUENTES[s]["url"] for s in fuentes if FUENTES[s].get("url")}
+    if pedidos:
+        log(f"Descargando en paralelo: {', '.join(FUENTES[s]['etiqueta'] for s in pedidos)}…")
+    return descargar_concurrente(pedidos)
+
+def procesar_fuente(source_key: str, path: Optional[Path] = None,
+                    sha256_hex: Optional[str] = None) -> Tuple[str, bool, List[str], Dict[str, Any]]:
+    """
+    Cadena de UNA fuente (descarga si corresponde → hash → extracción → difs → publicación).
+    Las fuentes HTTP llegan con `path` ya bajado y su SHA-256 calculado al vuelo
+    (path None + sha256 = el server confirmó que no cambió);
+    las demás se descargan acá (y se hashean una sola vez en decide_should_process).
+    Pensada para correr en un proceso worker: el log se acumula y se devuelve para
+    que el proceso principal lo imprima en orden.
+    Devuelve (source_key, omitido_por_hash_igual, líneas_de_log, registro_para_el_ledger).
+    """
+    global _LOG_BUFFER, _CORRIDA
+    _LOG_BUFFER = []
+    _CORRIDA = {"fuente": source_key, "estado": "procesado"}
+    t0 = time.perf_counter()
+    omitido = False
+    try:
+        fuente = FUENTES[source_key]
+        if path is None and fuente.get("descarga"):
             try:
-                regs_h1 = extractor_hoja1(path)
-                guardar_hoja1(path, regs_h1)
+                log(f"Descargando {fuente['etiqueta']}…")
+                path, sha256_hex = fuente["descarga"]()
             except Exception as e:
-                log(f"⚠️ {source_key}: error generando Hoja 1: {e}")
+                log(f"ERROR {fuente['etiqueta']}: {e}")
+        log(f"{source_key} → {path}")
+        if path:
+            omitido = not run_fuente(source_key, path, sha256_hex)
+        elif sha256_hex:
+            # GET condicional: el server confirmó que el archivo no cambió (no se bajó)
+            omitido = True
+        else:
+            anotar_corrida(estado="error")
+        if omitido:
+            anotar_corrida(estado="omitido")
+        anotar_corrida(sha256=sha256_hex or read_prev_hash(source_key))
+    except Exception as e:
+        log(f"❌ {source_key}: error inesperado en pipeline: {e}")
+        anotar_corrida(estado="error", error=str(e))
+    finally:
+        lineas, _LOG_BUFFER = _LOG_BUFFER, None
+        registro, _CORRIDA = _CORRIDA, None
+        registro["duracion_s"] = round(time.perf_counter() - t0, 3)
+    return source_key, omitido, lineas, registro
 
-            # B) DIFERENCIAS (precios/modelos) y libro condicional
+def ejecutar_fuentes(fuentes: List[str], paths: Optional[Dict[str, Tuple[Optional[Path], Optional[str]]]] = None,
+                     max_workers: int = MAX_WORKERS) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Corre cada fuente en su propio proceso (hasta max_workers en simultáneo) y vuelca
+    los logs de cada una en el orden de `fuentes`. Con max_workers <= 1 corre en serie.
+    `paths` trae lo ya descargado por HTTP: {source_key: (path, sha256)}.
+    Devuelve (fuentes omitidas por hash igual, registros de cada fuente para el ledger).
+    """
+    paths = paths or {}
+    omitidos: List[str] = []
+    registros: List[Dict[str, Any]] = []
+    if max_workers <= 1 or len(fuentes) <= 1:
+        resultados = (procesar_fuente(s, *paths.get(s, (None, None))) for s in fuentes)
+        for source_key, omitido, lineas, registro in resultados:
+            for ln in lineas: print(ln)
+            if omitido: omitidos.append(source_key)
+            registros.append(registro)
+        return omitidos, registros
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(fuentes))) as ex:
+        futuros = [(s, ex.submit(procesar_fuente, s, *paths.get(s, (None, None)))) for s in fuentes]
+        for s, fut in futuros:
             try:
-                regs = extractor_diffs(path)
-                prev = cargar_snapshot(source_key)
-                precios_up, precios_dn, nuevos, eliminados = calcular_diffs(prev, regs)
-                if hay_cambios(precios_up, precios_dn, nuevos, eliminados):
-                    _ = crear_libro_cambios(source_key, precios_up, precios_dn, nuevos, eliminados)
-                else:
-                    log(f"ℹ️ {source_key}: hubo hash nuevo pero sin cambios de precio/modelos → no se genera libro.")
-                guardar_snapshot(source_key, regs)
+                source_key, omitido, lineas, registro = fut.result()
             except Exception as e:
-                log(f"⚠️ {source_key}: error calculando/generando diffs: {e}")
+                log(f"❌ {s}: el worker falló: {e}")
+                registros.append({"fuente": s, "estado": "error", "error": str(e)})
+                continue
+            for ln in lineas: print(ln)
+            if omitido: omitidos.append(source_key)
+            registros.append(registro)
+    return omitidos, registros
+
+# ========= LEDGER DE CORRIDAS =========
+# _hashdb/corridas.jsonl: una línea por fuente por corrida (append-only, lo escribe sólo el
+# proceso principal). SUMMARY.md es siempre la última corrida anotada (se rearma cada vez que
+# se escribe el ledger), así que ya no crece con cada ejecución. Una corrida en la que todo quedó
+# omitido (hash igual / 304) no se anota ni toca SUMMARY.md: los dos están versionados y el cron
+# no tiene que commitear corridas sin novedades.
+def registrar_corrida(registros: List[Dict[str, Any]]) -> Optional[str]:
+    if all(reg.get("estado") == "omitido" for reg in registros):
+        return None
+    # id y fecha salen del mismo instante en hora AR (ts() es hora local del runner, UTC en CI)
+    ahora = datetime.now(TZ_AR) if TZ_AR else datetime.now()
+    corrida = ahora.strftime("%Y%m%d_%H%M%S")
+    fecha = ahora.isoformat(timespec="seconds")
+    lineas = [{"corrida": corrida, "fecha": fecha, **reg} for reg in registros]
+    with CORRIDAS_PATH.open("a", encoding="utf-8") as f:
+        for ln in lineas:
+            f.write(json.dumps(ln, ensure_ascii=False) + "\n")
+    escribir_summary_md(lineas)
+    return corrida
+
+def escribir_summary_md(registros: List[Dict[str, Any]], path: Optional[Path] = None) -> None:
+    path = path or BASE_DIR / "SUMMARY.md"
+    if not registros:
+        return
+    r0 = registros[0]
+    lineas = [f"# Corrida {r0.get('corrida')} ({(r0.get('fecha') or '')[:19]})", ""]
+    for reg in registros:
+        lineas.append(f"## {reg.get('fuente')}")
+        if reg.get("reporte"):
+            lineas.append(f"- Precios ↑: {reg.get('sube', 0)} | Suma Δ: {reg.get('suma_sube', 0)}")
+            lineas.append(f"- Precios ↓: {reg.get('baja', 0)} | Suma Δ: {reg.get('suma_baja', 0)}")
+            lineas.append(f"- Nuevos: {reg.get('nuevos', 0)} | Eliminados: {reg.get('eliminados', 0)}")
+            lineas.append(f"- Reporte: {reg['reporte']}")
         else:
-            omitidos.append(source_key)
+            lineas.append(f"- {reg.get('estado', '?')}, sin reporte")
+        if reg.get("hoja1"):
+            lineas.append(f"- Hoja 1: {reg['hoja1'].replace('_', ' ')}")
+        lineas.append("")
+    tmp = path.with_suffix(".md.tmp")
+    tmp.write_text("\n".join(lineas), encoding="utf-8")
+    os.replace(tmp, path)
+
+# ========= RETENCIÓN =========
+# Artefacto = archivos de una misma corrida de una fuente: <serie>_[DIFF_]AAAAMMDD_HHMMSS* (el xlsx
+# con sus .jsonl/.csv.gz, o la descarga con su _HOJA1). Lo que no lleva timestamp en el nombre
+# (index.json, *_ULTIMA.xlsx fijos, bases) nunca se toca.
+_RE_ARTEFACTO = re.compile(r"^(?P<serie>.+?)_(?:DIFF_)?(?P<ts>\d{8}_\d{6})")
+
+def _artefactos(carpeta: Path) -> Dict[str, List[Tuple[str, List[Path]]]]:
+    # {serie: [(ts, [archivos]), …]} del más nuevo al más viejo
+    grupos: Dict[Tuple[str, str], List[Path]] = {}
+    for p in carpeta.iterdir():
+        m = _RE_ARTEFACTO.match(p.name)
+        if m and p.is_file() and not p.name.endswith(".tmp"):
+            grupos.setdefault((m.group("serie"), m.group("ts")), []).append(p)
+    series: Dict[str, List[Tuple[str, List[Path]]]] = {}
+    for (serie, t), archivos in grupos.items():
+        series.setdefault(serie, []).append((t, sorted(archivos)))
+    for lista in series.values():
+        lista.sort(key=lambda a: a[0], reverse=True)
+    return series
+
+def planificar_retencion(carpeta: Path, politica: Dict[str, float]) -> List[Tuple[str, str, List[Path]]]:
+    """Devuelve los artefactos que salen, como (serie, ts, archivos). No toca nada."""
+    conservar: List[Tuple[str, str, List[Path], int]] = []
+    salen: List[Tuple[str, str, List[Path], int]] = []
+    for serie, lista in _artefactos(carpeta).items():
+        dias: set = set()
+        semanas: set = set()
+        for i, (t, archivos) in enumerate(lista):
+            dia = t[:8]
+            semana = datetime.strptime(dia, "%Y%m%d").isocalendar()[:2]
+            queda = i < max(1, int(politica.get("ultimos", 0)))
+            if dia not in dias and len(dias) < int(politica.get("diarios", 0)):
+                dias.add(dia)
+                queda = True
+            if semana not in semanas and len(semanas) < int(politica.get("semanales", 0)):
+                semanas.add(semana)
+                queda = True
+            (conservar if queda else salen).append((serie, t, archivos, i))
+    # Tope en MB: se van los conservados más viejos (nunca el último de cada serie)
+    max_bytes = float(politica.get("max_mb", 0)) * 1024 * 1024
+    if max_bytes > 0:
+        total = sum(p.stat().st_size for *_, archivos, _ in conservar for p in archivos)
+        for a in sorted(conservar, key=lambda a: a[1]):
+            if total <= max_bytes:
+                break
+            if a[3] == 0:
+                continue
+            conservar.remove(a)
+            salen.append(a)
+            total -= sum(p.stat().st_size for p in a[2])
+    return [(serie, t, archivos) for serie, t, archivos, _ in sorted(salen, key=lambda a: a[1])]
+
+def _archivados_mes(destino: Path, nombre: str, mes: str) -> Dict[str, int]:
+    # {archivo: bytes} de lo que ya quedó en algún zip del mes (los .tmp son corridas cortadas)
+    for viejo in destino.glob(f"{nombre}_{mes}_*.zip.tmp"):
+        viejo.unlink(missing_ok=True)
+    ya: Dict[str, int] = {}
+    for zp in sorted(destino.glob(f"{nombre}_{mes}_*.zip")):
+        try:
+            with zipfile.ZipFile(zp) as z:
+                ya.update((zi.filename, zi.file_size) for zi in z.infolist())
+        except zipfile.BadZipFile:
+            log(f"⚠️ {zp.name}: zip ilegible, no cuenta como archivado.")
+    return ya
+
+def _archivar_mes(carpeta: Path, mes: str, artefactos: List[Tuple[str, str, List[Path]]]) -> Optional[Path]:
+    # Cada corrida escribe SU zip (<carpeta>_AAAA-MM_<ts>.zip + índice json al lado) y no lo vuelve a
+    # tocar; ZIP_STORED porque los xlsx/gz ya vienen comprimidos. Recién después se borran los
+    # originales: si algo se corta, la próxima corrida reconoce lo ya archivado (mismo nombre y
+    # tamaño en algún zip del mes) y sólo termina de borrar.
+    destino = ARCHIVO_DIR / carpeta.name
+    destino.mkdir(parents=True, exist_ok=True)
+    ya = _archivados_mes(destino, carpeta.name, mes)
+    pendientes = [(serie, t, p) for serie, t, archivos in artefactos for p in archivos
+                  if p.exists() and ya.get(p.name) != p.stat().st_size]
+    zpath = None
+    if pendientes:
+        base = f"{carpeta.name}_{mes}_{ts()}"
+        zpath, n = destino / f"{base}.zip", 1
+        while zpath.exists():
+            zpath, n = destino / f"{base}_{n}.zip", n + 1
+        tmp = zpath.with_name(zpath.name + ".tmp")
+        indice = []
+        try:
+            with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as z:
+                for serie, t, p in pendientes:
+                    z.write(p, p.name)
+                    indice.append({"name": p.name, "serie": serie, "ts": t, "bytes": p.stat().st_size,
+                                   "sha256": file_sha256(p), "archivado": ts()})
+            os.replace(tmp, zpath)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+        _escribir_json_atomico(zpath.with_suffix(".index.json"), indice, indent=2)
+    for _, _, archivos in artefactos:
+        for p in archivos:
+            p.unlink(missing_ok=True)
+    return zpath
+
+def aplicar_retencion(dry_run: bool = RETENCION_DRY_RUN) -> Dict[str, int]:
+    """Aplica POLITICAS_RETENCION a cada carpeta. Devuelve {carpeta: artefactos archivados (o a archivar)}."""
+    resumen: Dict[str, int] = {}
+    for nombre, politica in POLITICAS_RETENCION.items():
+        carpeta = BASE_DIR / nombre
+        if not carpeta.is_dir():
+            continue
+        salen = planificar_retencion(carpeta, politica)
+        resumen[nombre] = len(salen)
+        if not salen:
+            continue
+        mb = sum(p.stat().st_size for *_, archivos in salen for p in archivos) / (1024 * 1024)
+        if dry_run:
+            log(f"🧹 [dry-run] {nombre}: {len(salen)} artefactos ({mb:.1f} MB) irían a {ARCHIVO_DIR.name}/{nombre}/")
+            for serie, t, archivos in salen:
+                log(f"    {t} {serie}: {', '.join(p.name for p in archivos)}")
+            continue
+        por_mes: Dict[str, List[Tuple[str, str, List[Path]]]] = {}
+        for a in salen:
+            por_mes.setdefault(f"{a[1][:4]}-{a[1][4:6]}", []).append(a)
+        for mes, artefactos in sorted(por_mes.items()):
+            _archivar_mes(carpeta, mes, artefactos)
+        if carpeta in (PUBLIC_REPORTS_DIR, PUBLIC_LISTAS_DIR):
+            quitar_de_indice(carpeta, {p.name for *_, archivos in salen for p in archivos})
+        log(f"🧹 {nombre}: {len(salen)} artefactos ({mb:.1f} MB) archivados en {ARCHIVO_DIR.name}/{nombre}/ "
+            f"({', '.join(sorted(por_mes))})")
+    return resumen
+
+def cli_retencion(args: List[str]) -> int:
+    # python hash_comparativo.py retencion [--dry-run]
+    aplicar_retencion(dry_run=RETENCION_DRY_RUN or "--dry-run" in args)
+    return 0
 
-    if tevelam: run_fuente("Tevelam", tevelam, extraer_tevelam,        extraer_tevelam_hoja1)
-    if disco:   run_fuente("Disco_Pro", disco, extraer_disco,          extraer_disco_hoja1)
-    if extra:   run_fuente("ARS_Tech", extra, extraer_proveedor_extra, extraer_extra_hoja1)
-    if imsa:    run_fuente("IMSA", imsa,    extraer_imsa,              extraer_imsa_hoja1)
+# ========= MAIN =========
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench-lector"]:
+        sys.exit(cli_bench_lector(sys.argv[2:]))
+    if sys.argv[1:2] == ["bench-escritor"]:
+        sys.exit(cli_bench_escritor(sys.argv[2:]))
+    if sys.argv[1:2] in (["snapshot-convertir"], ["snapshot-csv"]):
+        sys.exit(cli_snapshot(sys.argv[1:]))
+    if sys.argv[1:2] == ["historial"]:
+        sys.exit(cli_historial(sys.argv[2:]))
+    if sys.argv[1:2] == ["indice-publico"]:
+        sys.exit(cli_indice_publico(sys.argv[2:]))
+    if sys.argv[1:2] == ["retencion"]:
+        sys.exit(cli_retencion(sys.argv[2:]))
+    if sys.argv[1:2] == ["reprocesar"]:
+        sys.exit(cli_reprocesar(sys.argv[2:]))
+
+    log("INICIO — HASH por archivo completo + BASE visible + GATE diario + HOJA1 + DIFERENCIAS")
+    log(f"Fuentes en paralelo: hasta {MAX_WORKERS} procesos.")
+
+    # 1) GATE diario + DESCARGAS HTTP concurrentes
+    fuentes = [s for s in FUENTES if not skip_por_base_de_hoy(s)]
+    paths = descargar_fuentes_http(fuentes)
+
+    # 2) HASH & PROCESO por fuente (cada una en su worker; IMSA descarga dentro del suyo)
+    omitidos, registros = ejecutar_fuentes(fuentes, paths)
+    if registros:
+        try:
+            registrar_corrida(registros)
+        except Exception as e:
+            log(f"⚠️ Ledger de corridas: {e}")
 
     # 3) RESUMEN
     log("================ RESUMEN ================")
     if omitidos:
-        log("Omitidos por hash igual (descarga borrada/opcional):")
+        log("Omitidos sin cambios (hash igual o HTTP 304; descarga borrada/opcional):")
         for n in omitidos:
             log(f"  • {n}")
     else:
         log("No hubo fuentes omitidas por hash igual.")
+    noop_h1 = [r["fuente"] for r in registros if r.get("hoja1") == "sin_cambios"]
+    if noop_h1:
+        log(f"Hoja 1 sin cambios (no-op, no se escribió ni publicó): {', '.join(noop_h1)}")
+
+    # 4) RETENCIÓN (archiva lo viejo de public_*/downloads/_reports en _archivo/)
+    if RETENCION:
+        try:
+            aplicar_retencion()
+        except Exception as e:
+            log(f"⚠️ Retención: {e}")
 
     log(f"FIN en: {RUTA_DESCARGA}")
@@ -0,0 +1,9 @@
+# Los tests importan hash_comparativo desde la raíz del repo; WORKDIR apunta a un temporal
+# para que las carpetas de trabajo (_hashdb, public_*, …) no se creen dentro del repo.
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ.setdefault("WORKDIR", tempfile.mkdtemp(prefix="hc_tests_"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,114 @@
+# Cache de registros por SHA-256: acierto / fallo / desalojo LRU, y los caminos que lo usan
+# (reproceso de una corrida cortada antes de las difs, y `reprocesar` sobre la base).
+import hashlib
+import os
+
+import pytest
+
+import hash_comparativo as hc
+
+K = "T_cache"
+
+
+def _regs(n=50, base=1.0):
+    r = hc.Registros()
+    for i in range(n):
+        r.agregar(f"X-{i:03d}", 6, base + i, "USD")
+    return r
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    d = tmp_path / "_cache"
+    d.mkdir()
+    monkeypatch.setattr(hc, "CACHE_DIR", d)
+    monkeypatch.setattr(hc, "CACHE_REGISTROS_MB", 64)
+    return d
+
+
+@pytest.fixture
+def extracciones(monkeypatch):
+    llamadas = []
+    def extraer(source_key, path):
+        llamadas.append(path.name)
+        return _regs()
+    monkeypatch.setattr(hc, "extraer_fuente", extraer)
+    return llamadas
+
+
+def test_acierto_y_fallo(cache, extracciones, tmp_path):
+    p = tmp_path / "lista.xlsx"
+    p.write_bytes(b"contenido uno")
+    assert hc.extraer_fuente_cacheado(K, p, "a" * 64) == _regs()
+    assert hc.extraer_fuente_cacheado(K, p, "a" * 64) == _regs()
+    assert extracciones == ["lista.xlsx"]
+    # otro hash (u otra fuente con el mismo hash) → fallo
+    hc.extraer_fuente_cacheado(K, p, "b" * 64)
+    hc.extraer_fuente_cacheado("T_otra", p, "a" * 64)
+    assert len(extracciones) == 3
+    # sin hash se calcula del archivo
+    hc.extraer_fuente_cacheado(K, p)
+    hc.extraer_fuente_cacheado(K, p, hashlib.sha256(b"contenido uno").hexdigest())
+    assert len(extracciones) == 4
+
+
+def test_entrada_ilegible_se_descarta(cache):
+    hc.guardar_cache_registros(K, "c" * 64, _regs())
+    hc._cache_regs_path(K, "c" * 64).write_bytes(b"basura")
+    assert hc.leer_cache_registros(K, "c" * 64) is None
+    assert not hc._cache_regs_path(K, "c" * 64).exists()
+
+
+def test_desalojo_lru(cache, monkeypatch):
+    tam = len(_regs().a_bytes())
+    monkeypatch.setattr(hc, "CACHE_REGISTROS_MB", 3.5 * tam / (1024 * 1024))  # entran 3
+    for n, sha in enumerate(("a", "b", "c")):
+        hc.guardar_cache_registros(K, sha * 64, _regs())
+        os.utime(hc._cache_regs_path(K, sha * 64), (1000 + n, 1000 + n))
+    assert hc.leer_cache_registros(K, "a" * 64) is not None   # acierto: pasa a ser el más reciente
+    hc.guardar_cache_registros(K, "d" * 64, _regs())
+    quedan = {sha for sha in "abcd" if hc._cache_regs_path(K, sha * 64).exists()}
+    assert quedan == {"a", "c", "d"}
+
+
+@pytest.fixture
+def fuente(cache, monkeypatch):
+    monkeypatch.setitem(hc.FUENTES, K, {"etiqueta": K})
+    monkeypatch.setitem(hc.EXTRACTORES_FUENTE, K, lambda wb: pytest.fail("no debería parsear"))
+    monkeypatch.setattr(hc, "HASH_CONTENIDO", False)
+    monkeypatch.setattr(hc, "HISTORIAL", False)
+    monkeypatch.setattr(hc, "BORRAR_DUPLICADO", False)
+    for p in (hc._hash_path(K), hc._db_meta_path(K), hc._snap_bin_path(K)):
+        p.unlink(missing_ok=True)
+
+
+def test_corrida_cortada_antes_de_las_difs_se_reprocesa_desde_el_cache(fuente, extracciones, tmp_path, monkeypatch):
+    p = tmp_path / f"{K}_20260301_100000.xlsx"
+    p.write_bytes(b"descarga")
+    sha = hashlib.sha256(b"descarga").hexdigest()
+
+    real = hc.guardar_snapshot
+    def corte(*a):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(hc, "guardar_snapshot", corte)
+    assert hc.run_fuente(K, p, sha) is True
+    # nada registrado: ni hash ni base
+    assert hc.read_prev_hash(K) is None and not hc.leer_db_meta(K)
+    assert extracciones == [p.name]
+
+    monkeypatch.setattr(hc, "guardar_snapshot", real)
+    assert hc.run_fuente(K, p, sha) is True
+    assert extracciones == [p.name]                      # acierto: no se volvió a parsear
+    assert hc.read_prev_hash(K) == sha and hc.leer_db_meta(K)["sha256"] == sha
+    assert hc._snap_bin_path(K).exists()
+
+    assert hc.run_fuente(K, p, sha) is False              # ya registrado: hash igual
+
+
+def test_reprocesar_la_base_usa_el_cache(fuente, extracciones, tmp_path):
+    p = tmp_path / f"{K}_20260301_100000.xlsx"
+    p.write_bytes(b"base")
+    assert hc.run_fuente(K, p) is True
+    assert hc.cli_reprocesar([K]) == 0
+    assert extracciones == [p.name]
+    assert hc.cli_reprocesar(["NoExiste"]) == 2
@@ -0,0 +1,72 @@
+# resolver_chromedriver: el driver cacheado por versión de Chrome se reusa sin tocar
+# webdriver-manager, y se resuelve de nuevo si Chrome cambió, el binario no está o se fuerza.
+import json
+import os
+
+import pytest
+
+import hash_comparativo as hc
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    cache = tmp_path / "chromedriver.json"
+    monkeypatch.setattr(hc, "_DRIVER_CACHE", cache)
+    nuevo = tmp_path / "wdm" / "chromedriver"
+    nuevo.parent.mkdir()
+    nuevo.write_text("#!/bin/sh\n")
+    os.chmod(nuevo, 0o755)
+    instalados = []
+
+    class FakeManager:
+        def install(self):
+            instalados.append(str(nuevo))
+            return str(nuevo)
+
+    monkeypatch.setattr(hc, "ChromeDriverManager", FakeManager)
+    monkeypatch.setattr(hc, "version_chrome", lambda: "131.0.6778.85")
+    return cache, nuevo, instalados, tmp_path
+
+
+def _driver_viejo(tmp_path):
+    p = tmp_path / "viejo" / "chromedriver"
+    p.parent.mkdir()
+    p.write_text("#!/bin/sh\n")
+    os.chmod(p, 0o755)
+    return p
+
+
+def test_acierto_no_consulta_webdriver_manager(entorno):
+    cache, _, instalados, tmp_path = entorno
+    viejo = _driver_viejo(tmp_path)
+    cache.write_text(json.dumps({"chrome": "131.0.6778.85", "driver": str(viejo)}))
+    assert hc.resolver_chromedriver() == str(viejo)
+    assert instalados == []
+
+
+def test_cambio_de_version_resuelve_y_reescribe(entorno):
+    cache, nuevo, instalados, tmp_path = entorno
+    viejo = _driver_viejo(tmp_path)
+    cache.write_text(json.dumps({"chrome": "130.0.6723.116", "driver": str(viejo)}))
+    assert hc.resolver_chromedriver() == str(nuevo)
+    assert instalados == [str(nuevo)]
+    assert json.loads(cache.read_text()) == {"chrome": "131.0.6778.85", "driver": str(nuevo)}
+    # la corrida siguiente ya acierta
+    assert hc.resolver_chromedriver() == str(nuevo)
+    assert len(instalados) == 1
+
+
+def test_binario_borrado_o_forzado_resuelve_de_nuevo(entorno):
+    cache, nuevo, instalados, tmp_path = entorno
+    cache.write_text(json.dumps({"chrome": "131.0.6778.85", "driver": str(tmp_path / "no_existe")}))
+    assert hc.resolver_chromedriver() == str(nuevo)
+    assert hc.resolver_chromedriver(forzar=True) == str(nuevo)
+    assert len(instalados) == 2
+
+
+def test_sin_version_de_chrome_no_cachea(entorno, monkeypatch):
+    cache, nuevo, instalados, _ = entorno
+    monkeypatch.setattr(hc, "version_chrome", lambda: None)
+    assert hc.resolver_chromedriver() == str(nuevo)
+    assert hc.resolver_chromedriver() == str(nuevo)
+    assert len(instalados) == 2 and not cache.exists()
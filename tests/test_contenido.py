@@ -0,0 +1,67 @@
+# Gate por contenido (HASH_CONTENIDO): un xlsx re-guardado con las mismas filas no se procesa;
+# si cambia una fila sí, y la base se adopta con el digest de la descarga (sin releer el archivo).
+import hashlib
+
+import pytest
+from openpyxl import Workbook
+
+import hash_comparativo as hc
+
+K = "T_contenido"
+FILAS = [["ID", "Stock", "Precio", "Moneda"], ["X-1", 3, 10.5, "USD"], ["X-2", "Sin stock", 7, "ARS"]]
+
+
+def _openpyxl(path, filas):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Lista"
+    for f in filas:
+        ws.append(f)
+    wb.save(path)
+    return path
+
+
+def _rapido(path, filas):
+    wb = hc.LibroXlsxRapido()
+    ws = wb.create_sheet("Otra hoja")
+    for f in filas:
+        ws.append(f)
+    wb.save(path)
+    return path
+
+
+def _sha(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    monkeypatch.setitem(hc.EXTRACTORES_FUENTE, K, hc._regs_tevelam)
+    monkeypatch.setattr(hc, "HASH_CONTENIDO", True)
+    monkeypatch.setattr(hc, "BORRAR_DUPLICADO", False)
+    monkeypatch.setattr(hc, "HISTORIAL", False)
+    # el digest viaja desde la descarga: nadie tiene que volver a leer el archivo para hashearlo
+    monkeypatch.setattr(hc, "file_sha256", lambda p, *a: pytest.fail(f"se re-hasheó {p.name}"))
+    for p in (hc._hash_path(K), hc._content_hash_path(K)):
+        p.unlink(missing_ok=True)
+
+
+def test_reguardado_igual_se_omite_y_fila_distinta_se_procesa(tmp_path, gate):
+    p1 = _openpyxl(tmp_path / f"{K}_20260301_100000.xlsx", FILAS)
+    assert hc.run_fuente(K, p1, _sha(p1)) is True
+    assert hc.leer_db_meta(K)["sha256"] == _sha(p1)
+    contenido = hc.read_prev_content_hash(K)
+
+    # mismo contenido, otro binario (otro writer, otro nombre de hoja)
+    p2 = _rapido(tmp_path / f"{K}_20260301_110000.xlsx", FILAS)
+    assert _sha(p2) != _sha(p1)
+    assert hc.run_fuente(K, p2, _sha(p2)) is False
+    assert hc.leer_db_meta(K)["sha256"] == _sha(p1)
+    assert hc.read_prev_content_hash(K) == contenido
+
+    # cambia un precio → se procesa y la base pasa a ser esta descarga
+    p3 = _rapido(tmp_path / f"{K}_20260301_120000.xlsx", FILAS[:2] + [["X-2", "Sin stock", 7.5, "ARS"]])
+    assert hc.run_fuente(K, p3, _sha(p3)) is True
+    assert hc.leer_db_meta(K)["sha256"] == _sha(p3)
+    assert hc.read_prev_content_hash(K) != contenido
+    assert hc._db_path(K).read_bytes() == p3.read_bytes()
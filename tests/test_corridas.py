@@ -0,0 +1,43 @@
+# Ledger de corridas (_hashdb/corridas.jsonl, versionado): sólo se anotan corridas con novedades.
+import json
+
+import hash_comparativo as hc
+
+
+def test_corrida_toda_omitida_no_toca_el_ledger(tmp_path, monkeypatch):
+    ledger = tmp_path / "corridas.jsonl"
+    monkeypatch.setattr(hc, "CORRIDAS_PATH", ledger)
+    omitidas = [{"fuente": k, "estado": "omitido"} for k in ("Tevelam", "IMSA")]
+    assert hc.registrar_corrida(omitidas) is None
+    assert not ledger.exists()
+
+    con_error = omitidas + [{"fuente": "ARS_Tech", "estado": "error", "error": "timeout"}]
+    corrida = hc.registrar_corrida(con_error)
+    lineas = [json.loads(x) for x in ledger.read_text(encoding="utf-8").splitlines()]
+    assert [x["fuente"] for x in lineas] == ["Tevelam", "IMSA", "ARS_Tech"]
+    assert {x["corrida"] for x in lineas} == {corrida}
+    assert lineas[0]["fecha"].startswith(f"{corrida[:4]}-{corrida[4:6]}-{corrida[6:8]}T")
+
+
+def test_summary_md_sigue_al_ledger_aunque_no_haya_reportes(tmp_path, monkeypatch):
+    monkeypatch.setattr(hc, "CORRIDAS_PATH", tmp_path / "corridas.jsonl")
+    monkeypatch.setattr(hc, "BASE_DIR", tmp_path)
+    summary = tmp_path / "SUMMARY.md"
+
+    hc.registrar_corrida([{"fuente": "Tevelam", "estado": "procesado", "reporte": "Tevelam_DIFF_x.xlsx",
+                           "sube": 2, "baja": 1, "nuevos": 0, "eliminados": 0},
+                          {"fuente": "IMSA", "estado": "omitido"}])
+    assert "Reporte: Tevelam_DIFF_x.xlsx" in summary.read_text(encoding="utf-8")
+
+    # corrida sin reportes (procesada sin cambios + error): el ledger crece y SUMMARY.md la refleja
+    corrida = hc.registrar_corrida([{"fuente": "Tevelam", "estado": "procesado"},
+                                    {"fuente": "IMSA", "estado": "error", "error": "timeout"}])
+    texto = summary.read_text(encoding="utf-8")
+    assert texto.startswith(f"# Corrida {corrida} ")
+    assert "- procesado, sin reporte" in texto and "- error, sin reporte" in texto
+    assert "Tevelam_DIFF_x.xlsx" not in texto
+
+    # todo omitido: ni ledger ni SUMMARY.md
+    antes = (hc.CORRIDAS_PATH.read_bytes(), texto)
+    assert hc.registrar_corrida([{"fuente": "Tevelam", "estado": "omitido"}]) is None
+    assert (hc.CORRIDAS_PATH.read_bytes(), summary.read_text(encoding="utf-8")) == antes
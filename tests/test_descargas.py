@@ -0,0 +1,160 @@
+# download_con_hash / descargar_concurrente contra un http.server local con ETag fuerte y 304.
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import hash_comparativo as hc
+
+
+class Origen:
+    """Archivos servidos por ruta + registro de pedidos (ruta, If-None-Match, status)."""
+
+    def __init__(self):
+        self.archivos = {}
+        self.pedidos = []
+        self.lock = threading.Lock()
+        self.demora = 0.0
+        self.siempre_304 = set()   # rutas que contestan 304 aunque no lleguen validadores
+        self.en_curso = 0
+        self.max_en_curso = 0
+
+
+@pytest.fixture
+def origen():
+    estado = Origen()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            cuerpo = estado.archivos.get(self.path)
+            inm = self.headers.get("If-None-Match")
+            if cuerpo is None:
+                status = 404
+            else:
+                etag = f'"{hashlib.sha256(cuerpo).hexdigest()[:16]}"'
+                status = 304 if inm == etag or self.path in estado.siempre_304 else 200
+            with estado.lock:
+                estado.pedidos.append((self.path, inm, status))
+                estado.en_curso += 1
+                estado.max_en_curso = max(estado.max_en_curso, estado.en_curso)
+            time.sleep(estado.demora)
+            with estado.lock:
+                estado.en_curso -= 1
+            if status == 404:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            self.send_header("ETag", etag)
+            if status == 200:
+                self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            if status == 200:
+                self.wfile.write(cuerpo)
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    estado.base = f"http://127.0.0.1:{srv.server_address[1]}"
+    yield estado
+    srv.shutdown()
+    srv.server_close()
+
+
+def _cuerpo(n: int) -> bytes:
+    # más de un chunk de DOWNLOAD_CHUNK para que el hash se arme por partes
+    return bytes((i * 31 + n) % 251 for i in range(hc.DOWNLOAD_CHUNK * 2 + 123))
+
+
+def test_200_guarda_etag_y_el_hash_coincide_con_file_sha256(origen):
+    origen.archivos["/lista.xlsx"] = _cuerpo(1)
+    path, sha = hc.download_con_hash(f"{origen.base}/lista.xlsx", "T_200")
+    try:
+        assert path is not None and path.read_bytes() == origen.archivos["/lista.xlsx"]
+        assert sha == hc.file_sha256(path)
+        val = hc.leer_validadores_http("T_200")
+        assert val["etag"].startswith('"') and val["sha256"] == sha
+        assert not path.with_name(path.name + ".part").exists()
+    finally:
+        path.unlink()
+
+
+def test_304_no_baja_el_cuerpo_y_devuelve_el_hash_previo(origen):
+    origen.archivos["/lista.xlsx"] = _cuerpo(2)
+    url = f"{origen.base}/lista.xlsx"
+    path, sha = hc.download_con_hash(url, "T_304")
+    path.unlink()
+    hc.write_hash("T_304", sha)  # lo que deja el pipeline tras procesar ese archivo
+
+    antes = set(hc.RUTA_DESCARGA.iterdir())
+    assert hc.download_con_hash(url, "T_304") == (None, sha)
+    assert origen.pedidos[-1] == ("/lista.xlsx", hc.leer_validadores_http("T_304")["etag"], 304)
+    assert set(hc.RUTA_DESCARGA.iterdir()) == antes
+
+    # cambia el origen → nuevo ETag → se baja completo
+    origen.archivos["/lista.xlsx"] = _cuerpo(3)
+    path, sha_nuevo = hc.download_con_hash(url, "T_304")
+    try:
+        assert origen.pedidos[-1][2] == 200
+        assert sha_nuevo != sha and sha_nuevo == hc.file_sha256(path)
+    finally:
+        path.unlink()
+
+
+def test_304_sin_validadores_es_error_y_no_deja_archivo_vacio(origen):
+    origen.archivos["/roto.xlsx"] = _cuerpo(5)
+    url = f"{origen.base}/roto.xlsx"
+    previo, sha = hc.download_con_hash(url, "T_304_roto")
+    try:
+        hc.write_hash("T_304_roto", sha)
+        hc.escribir_validadores_http("T_304_roto", {}, sha)   # sin ETag/Last-Modified: nada que mandar
+        origen.siempre_304.add("/roto.xlsx")
+
+        assert hc.download_con_hash(url, "T_304_roto") == (None, None)
+        assert origen.pedidos[-1] == ("/roto.xlsx", None, 304)
+        assert [p.name for p in hc.RUTA_DESCARGA.glob("T_304_roto_*")] == [previo.name]
+        assert previo.read_bytes() == _cuerpo(5)
+    finally:
+        previo.unlink()
+
+
+def test_validadores_de_otro_archivo_no_se_usan(origen):
+    # si el hash registrado no es el del ETag guardado, no se manda If-None-Match
+    origen.archivos["/lista.xlsx"] = _cuerpo(4)
+    url = f"{origen.base}/lista.xlsx"
+    path, sha = hc.download_con_hash(url, "T_stale")
+    path.unlink()
+    hc.write_hash("T_stale", "0" * 64)
+    path, _ = hc.download_con_hash(url, "T_stale")
+    try:
+        assert origen.pedidos[-1] == ("/lista.xlsx", None, 200)
+    finally:
+        path.unlink()
+
+
+def test_descargar_concurrente_baja_cada_url_con_su_hash(origen):
+    pedidos = {}
+    for i in range(5):
+        origen.archivos[f"/f{i}.xlsx"] = _cuerpo(10 + i)
+        pedidos[f"T_conc{i}"] = f"{origen.base}/f{i}.xlsx"
+    pedidos["T_conc_404"] = f"{origen.base}/no-existe.xlsx"
+    origen.demora = 0.2  # que los pedidos se solapen si de verdad van en paralelo
+
+    res = hc.descargar_concurrente(pedidos, max_workers=3)
+    try:
+        assert list(res) == list(pedidos)
+        assert res["T_conc_404"] == (None, None)
+        for i in range(5):
+            path, sha = res[f"T_conc{i}"]
+            assert path.read_bytes() == origen.archivos[f"/f{i}.xlsx"]
+            assert sha == hc.file_sha256(path)
+        assert sorted(p for p, _, _ in origen.pedidos) == sorted(
+            [f"/f{i}.xlsx" for i in range(5)] + ["/no-existe.xlsx"])
+        assert 1 < origen.max_en_curso <= 3
+    finally:
+        for path, _ in res.values():
+            if path:
+                path.unlink()
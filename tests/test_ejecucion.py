@@ -0,0 +1,69 @@
+# ejecutar_fuentes con MAX_WORKERS=1 (en serie) y con pool de procesos: mismos omitidos, mismos
+# registros para el ledger y mismo log, volcado en el orden de las fuentes aunque terminen en otro.
+import multiprocessing
+import os
+import re
+import time
+
+import pytest
+
+import hash_comparativo as hc
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="los monkeypatch llegan a los workers sólo con fork")
+
+DEMORAS = {"T_uno": 0.6, "T_dos": 0.3, "T_igual": 0.0, "T_304": 0.0, "T_roto": 0.1}
+
+
+def _run_fuente(source_key, path, sha256_hex=None, forzar=False):
+    time.sleep(DEMORAS[source_key])   # la primera es la que más tarda: en el pool termina última
+    if source_key == "T_roto":
+        raise ValueError("planilla ilegible")
+    log_paso = f"{source_key}: {path.name} sha={sha256_hex}"
+    hc.log(f"{log_paso} · extracción")
+    hc.log(f"{log_paso} · difs")
+    hc.anotar_corrida(filas=len(source_key), pid=os.getpid())
+    return source_key != "T_igual"
+
+
+@pytest.fixture
+def fuentes(tmp_path, monkeypatch):
+    monkeypatch.setattr(hc, "run_fuente", _run_fuente)
+    for k in DEMORAS:
+        monkeypatch.setitem(hc.FUENTES, k, {"etiqueta": k, "url": f"http://x/{k}"})
+    paths = {k: (tmp_path / f"{k}.xlsx", k[2:] * 2) for k in DEMORAS}
+    paths["T_304"] = (None, "cafe")   # GET condicional: no cambió
+    return list(DEMORAS), paths
+
+
+def _correr(capsys, fuentes, paths, max_workers):
+    omitidos, registros = hc.ejecutar_fuentes(fuentes, paths, max_workers=max_workers)
+    lineas = [re.sub(r"^\[\d\d:\d\d:\d\d\] ", "", x) for x in capsys.readouterr().out.splitlines()]
+    pids = {r.pop("pid", None) for r in registros} - {None}
+    for r in registros:
+        assert r.pop("duracion_s") >= 0
+    return omitidos, registros, lineas, pids
+
+
+def test_en_serie_y_en_pool_dan_lo_mismo(fuentes, capsys):
+    nombres, paths = fuentes
+    serie = _correr(capsys, nombres, paths, 1)
+    pool = _correr(capsys, nombres, paths, 4)
+
+    assert serie[:3] == pool[:3]
+    omitidos, registros, lineas = serie[:3]
+    assert omitidos == ["T_igual", "T_304"]
+    assert [(r["fuente"], r["estado"]) for r in registros] == [
+        ("T_uno", "procesado"), ("T_dos", "procesado"), ("T_igual", "omitido"), ("T_304", "omitido"),
+        ("T_roto", "error")]
+    assert registros[0]["filas"] == 5 and registros[0]["sha256"] == "unouno"
+    assert registros[-1]["error"] == "planilla ilegible"
+    # log agrupado por fuente y en el orden de la lista, no en el de terminación
+    assert [x.split(" ")[0] for x in lineas if x.startswith("T_")] == [
+        "T_uno", "T_uno:", "T_uno:", "T_dos", "T_dos:", "T_dos:", "T_igual", "T_igual:", "T_igual:",
+        "T_304", "T_roto"]
+    assert "❌ T_roto: error inesperado en pipeline: planilla ilegible" in lineas
+
+    # en serie todo en este proceso; en el pool, en varios workers
+    assert serie[3] == {os.getpid()}
+    assert os.getpid() not in pool[3] and len(pool[3]) >= 2
@@ -0,0 +1,99 @@
+# LibroXlsxRapido → openpyxl: mismos valores que escribe Workbook(write_only=True), y los
+# caracteres de control quedan escapados como _xHHHH_ (y avisados en el log) en vez de perderse.
+import math
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.escape import unescape
+
+import hash_comparativo as hc
+
+FILAS = [
+    ["ID", "Stock", "Precio", "Moneda"],
+    ["A&B <1>", 0, 0.1 + 0.2, "USD"],
+    ["  espacios  ", -3, 1e-9, None],
+    ["Ñandú “comillas” €", 2, 123456789.123456, "ARS"],
+    ["línea\nnueva\tcon tab", True, False, ""],
+    [None, None, 7, None, None, "después de huecos"],
+    [12345678901234, 1.5e300, -0.0, "x" * 40000],
+    ["sin precio", 1, float("nan"), float("inf")],
+    [f"c{i}" for i in range(80)],   # > 64 columnas
+]
+
+
+def _recortar(fila):
+    # celdas vacías al final (openpyxl escribe "" como celda sin valor; el rápido la omite)
+    fila = list(fila)
+    while fila and fila[-1] is None:
+        fila.pop()
+    return fila
+
+
+def _leer(path, read_only):
+    wb = load_workbook(path, read_only=read_only, data_only=True)
+    try:
+        return {ws.title: [_recortar(f) for f in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def _escribir(wb, path, filas):
+    for titulo in ("Hoja 1", 'Resumen & "otros"'):
+        ws = wb.create_sheet(titulo)
+        for f in filas:
+            ws.append(f)
+    wb.save(path)
+
+
+def _sin_no_finitos(filas):
+    return [[None if isinstance(v, float) and not math.isfinite(v) else v for v in f] for f in filas]
+
+
+@pytest.mark.parametrize("read_only", [True, False])
+def test_ida_y_vuelta_igual_que_openpyxl(tmp_path, read_only, capsys):
+    rapido, ref = tmp_path / "rapido.xlsx", tmp_path / "openpyxl.xlsx"
+    _escribir(hc.LibroXlsxRapido(), rapido, FILAS)
+    _escribir(Workbook(write_only=True), ref, _sin_no_finitos(FILAS))
+    assert "Hoja 'Hoja 1': 1 celda(s) recortadas a 32767 caracteres." in capsys.readouterr().out
+    leido = _leer(rapido, read_only)
+    assert list(leido) == ["Hoja 1", 'Resumen & "otros"']
+    assert leido == _leer(ref, read_only)
+    h = leido["Hoja 1"]
+    assert h[1][:3] == ["A&B <1>", 0, 0.3]   # 16 dígitos significativos, como openpyxl
+    assert h[2][0] == "  espacios  "
+    assert h[4][0] == "línea\nnueva\tcon tab" and h[4][1:3] == [True, False]
+    assert h[6][3] == "x" * 32767   # tope de Excel por celda, igual que openpyxl
+
+
+def test_hoja_quitada_no_se_escribe(tmp_path):
+    wb = hc.LibroXlsxRapido()
+    wb.remove(wb.create_sheet("Sheet"))
+    wb.create_sheet("Hoja 1").append(["ID"])
+    wb.save(tmp_path / "a.xlsx")
+    assert _leer(tmp_path / "a.xlsx", True) == {"Hoja 1": [["ID"]]}
+
+
+def test_caracteres_de_control_se_escapan_y_se_avisan(tmp_path, capsys):
+    textos = ["a\x01b", "\x00\x1f", "lit _x0041_ y _x0001_", "normal & <ok>", "\x0bvt\x0c"]
+    wb = hc.LibroXlsxRapido()
+    ws = wb.create_sheet("Hoja 1")
+    for t in textos:
+        ws.append([t, 1])
+    wb.save(tmp_path / "ctrl.xlsx")
+    assert "Hoja 'Hoja 1': 3 celda(s) con caracteres de control" in capsys.readouterr().out
+
+    leidos = [f[0] for f in _leer(tmp_path / "ctrl.xlsx", True)["Hoja 1"]]
+    assert leidos[0] == "a_x0001_b"
+    # openpyxl no desescapa celdas; desescapando (como Excel) vuelve exactamente lo escrito
+    assert [unescape(x) for x in leidos] == textos
+    with pytest.raises(Exception):   # openpyxl directamente no los acepta
+        Workbook().active.append(["a\x01b"])
+
+
+def test_sin_control_no_avisa_y_conserva_cr(tmp_path, capsys):
+    wb = hc.LibroXlsxRapido()
+    wb.create_sheet("Hoja 1").append(["a & b", "1\r\n2", "x_y"])
+    wb.save(tmp_path / "ok.xlsx")
+    assert "caracteres de control" not in capsys.readouterr().out
+    # \r va como &#13; (openpyxl lo escribe crudo y el parser XML lo normaliza a \n)
+    assert _leer(tmp_path / "ok.xlsx", True) == {"Hoja 1": [["a & b", "1\r\n2", "x_y"]]}
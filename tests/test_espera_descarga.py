@@ -0,0 +1,86 @@
+# esperar_descarga con inotify y con el sondeo de respaldo (sin inotify): Chrome escribe
+# X.xlsx.crdownload (a veces con un X.xlsx vacío de marcador) y al terminar renombra a X.xlsx.
+import os
+import threading
+import time
+
+import pytest
+
+import hash_comparativo as hc
+
+DATOS = os.urandom(200_000)
+
+
+@pytest.fixture(params=["inotify", "sondeo"])
+def modo(request, monkeypatch, tmp_path):
+    if request.param == "sondeo":
+        monkeypatch.setattr(hc, "_abrir_inotify", lambda carpeta: None)
+    else:
+        fd = hc._abrir_inotify(tmp_path)
+        if fd is None:
+            pytest.skip("sin inotify en esta plataforma")
+        os.close(fd)
+    return request.param
+
+
+def _chrome(carpeta, demora=0.3, marcador=True):
+    def bajar():
+        final = carpeta / "ListaImsa.xlsx"
+        parcial = carpeta / "ListaImsa.xlsx.crdownload"
+        if marcador:
+            final.touch()
+        with parcial.open("wb") as f:
+            for i in range(0, len(DATOS), 50_000):
+                f.write(DATOS[i:i + 50_000])
+                f.flush()
+                time.sleep(demora / 4)
+        os.replace(parcial, final)
+
+    t = threading.Thread(target=bajar)
+    t.start()
+    return t
+
+
+@pytest.mark.parametrize("marcador", [True, False])
+def test_devuelve_el_archivo_completo(tmp_path, modo, marcador):
+    (tmp_path / "notas.txt").write_text("no es planilla")
+    t = _chrome(tmp_path, marcador=marcador)
+    t0 = time.monotonic()
+    p = hc.esperar_descarga(tmp_path, timeout=10)
+    dt = time.monotonic() - t0
+    t.join()
+    assert p == tmp_path / "ListaImsa.xlsx" and p.read_bytes() == DATOS
+    assert dt < 5
+
+
+def test_plazo_vencido_devuelve_none(tmp_path, modo):
+    (tmp_path / "ListaImsa.xlsx.crdownload").write_bytes(b"a medias")
+    (tmp_path / "ListaImsa.xlsx").touch()
+    t0 = time.monotonic()
+    assert hc.esperar_descarga(tmp_path, timeout=0.6) is None
+    assert 0.5 <= time.monotonic() - t0 < 3
+
+
+def test_archivo_ya_presente_vuelve_enseguida(tmp_path, modo):
+    (tmp_path / "Lista.xls").write_bytes(b"xls viejo")
+    t0 = time.monotonic()
+    assert hc.esperar_descarga(tmp_path, timeout=10) == tmp_path / "Lista.xls"
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_inotify_se_cierra(tmp_path, monkeypatch):
+    abiertos = []
+    real = hc._abrir_inotify
+
+    def abrir(carpeta):
+        fd = real(carpeta)
+        if fd is not None:
+            abiertos.append(fd)
+        return fd
+
+    monkeypatch.setattr(hc, "_abrir_inotify", abrir)
+    hc.esperar_descarga(tmp_path, timeout=0.1)
+    if not abiertos:
+        pytest.skip("sin inotify en esta plataforma")
+    with pytest.raises(OSError):
+        os.fstat(abiertos[0])
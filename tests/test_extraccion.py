@@ -0,0 +1,183 @@
+# extraer_fuente (una lectura por libro) contra los extractores por propósito que había antes
+# (uno para Hoja 1 y otro para difs, copiados abajo tal como estaban) sobre las bases del repo,
+# y el fallback de ARS_Tech con una hoja STOCK sin encabezados ni <dimension>.
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import hash_comparativo as hc
+from hash_comparativo import _norm_text, convertir_stock_generico, detectar_columnas, try_float
+
+_DB = Path(__file__).resolve().parents[1] / "_db"
+
+
+# ---- extractores de antes (referencia) ----
+def _viejo_generico(path, fila_inicio_fallback=2):
+    out = []
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        header_row, cols = detectar_columnas(ws)
+        if header_row:
+            max_needed_col = max(v for v in cols.values() if v)
+            for row in ws.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
+                cod = row[cols["codigo"]-1] if cols["codigo"] else None
+                if not _norm_text(cod): continue
+                precio = row[cols["precio"]-1] if cols["precio"] else None
+                moneda = row[cols["moneda"]-1] if cols["moneda"] else None
+                out.append({"ID": _norm_text(cod), "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
+        else:
+            for row in ws.iter_rows(min_row=fila_inicio_fallback, min_col=1, max_col=max(ws.max_column, 1), values_only=True):
+                cod = row[0] if len(row) >= 1 else None
+                if not _norm_text(cod): continue
+                out.append({"ID": _norm_text(cod), "Precio": None, "Moneda": None})
+    finally:
+        wb.close()
+    return out
+
+
+def _viejo_con_stock(path, fila_inicio, col_stock):
+    out = []
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        header_row, cols = detectar_columnas(ws)
+        if header_row and cols["codigo"]:
+            max_needed_col = max(v for v in cols.values() if v)
+            for row in ws.iter_rows(min_row=header_row+1, min_col=1, max_col=max_needed_col, values_only=True):
+                cod = row[cols["codigo"]-1] if cols["codigo"] else None
+                if not _norm_text(cod): continue
+                stock_raw = row[cols["stock"]-1] if cols["stock"] else None
+                precio = row[cols["precio"]-1] if cols["precio"] else None
+                moneda = row[cols["moneda"]-1] if cols["moneda"] else None
+                out.append({"ID": _norm_text(cod), "Stock": convertir_stock_generico(stock_raw),
+                            "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None})
+        else:
+            for r in range(fila_inicio, (ws.max_row or 1) + 1):
+                cod = ws.cell(row=r, column=1).value
+                if not _norm_text(cod): continue
+                out.append({"ID": _norm_text(cod), "Stock": convertir_stock_generico(ws.cell(row=r, column=col_stock).value),
+                            "Precio": None, "Moneda": None})
+    finally:
+        wb.close()
+    return out
+
+
+def _viejo_espejo(regs):
+    out = []
+    for r in regs:
+        out.append(r)
+        s = r["ID"]
+        if len(s) >= 2:
+            if s.startswith("F"):
+                out.append({"ID": "T"+s[1:], "Stock": r["Stock"], "Precio": None, "Moneda": None})
+            elif s.startswith("T"):
+                out.append({"ID": "F"+s[1:], "Stock": r["Stock"], "Precio": None, "Moneda": None})
+    return out
+
+
+def _viejo_imsa(path, con_stock):
+    out = []
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            hr, cols = detectar_columnas(ws)
+            if hr:
+                break
+        else:
+            raise AssertionError("las bases del repo tienen encabezados")
+        max_needed_col = max(v for v in cols.values() if v)
+        for row in ws.iter_rows(min_row=hr+1, min_col=1, max_col=max_needed_col, values_only=True):
+            cod = row[cols["codigo"]-1] if cols["codigo"] else None
+            if not _norm_text(cod): continue
+            stx = row[cols["stock"]-1] if cols["stock"] else None
+            precio = row[cols["precio"]-1] if cols["precio"] else None
+            moneda = row[cols["moneda"]-1] if cols["moneda"] else None
+            s_cod = _norm_text(cod)
+            r = {"ID": s_cod.split("-", 2)[-1] if s_cod.count("-") >= 2 else s_cod,
+                 "Precio": try_float(precio), "Moneda": _norm_text(moneda) or None}
+            if con_stock:
+                r = {"ID": r["ID"], "Stock": convertir_stock_generico(stx), "Precio": r["Precio"], "Moneda": r["Moneda"]}
+            out.append(r)
+    finally:
+        wb.close()
+    return out
+
+
+def _viejo_extra_stock(path):
+    # hoja STOCK sin encabezados: B = código, D = stock, hasta max_row (None sin <dimension> → 0 filas)
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        st = wb["STOCK"]
+        out = []
+        for r in range(2, (st.max_row or 1) + 1):
+            _id = st.cell(row=r, column=2).value
+            if not _norm_text(_id): continue
+            out.append({"ID": _norm_text(_id), "Stock": convertir_stock_generico(st.cell(row=r, column=4).value),
+                        "Precio": None, "Moneda": None})
+        return out
+    finally:
+        wb.close()
+
+
+VIEJOS = {
+    "Tevelam":   (lambda p: _viejo_espejo(_viejo_con_stock(p, 11, 9)), lambda p: _viejo_generico(p, 11)),
+    "Disco_Pro": (lambda p: _viejo_espejo(_viejo_con_stock(p, 9, 7)), lambda p: _viejo_generico(p, 9)),
+    "IMSA":      (lambda p: _viejo_imsa(p, True), lambda p: _viejo_imsa(p, False)),
+}
+
+
+@pytest.mark.parametrize("source_key", sorted(VIEJOS))
+def test_extraer_fuente_igual_a_los_extractores_de_antes(source_key):
+    path = _DB / f"{source_key}_DB.xlsx"
+    if not path.exists():
+        pytest.skip(f"no está {path.name}")
+    viejo_h1, viejo_difs = VIEJOS[source_key]
+    regs = hc.extraer_fuente(source_key, path)
+    assert len(regs) > 0
+    assert list(hc.registros_hoja1(source_key, regs)) == viejo_h1(path)
+    assert [{"ID": r["ID"], "Precio": r["Precio"], "Moneda": r["Moneda"]} for r in regs] == viejo_difs(path)
+
+
+@pytest.fixture
+def ars_sin_encabezados(tmp_path):
+    # write_only no escribe <dimension>: max_row queda en None en read-only
+    path = tmp_path / "ARS.xlsx"
+    wb = Workbook(write_only=True)
+    wb.create_sheet("LISTA").append(["otra hoja"])
+    st = wb.create_sheet("STOCK")
+    st.append(["Listado de stock", None, None, "al día"])   # título, sin encabezados
+    for i in range(1, 301):
+        st.append([f"desc {i}", f"ARS-{i:04d}", None, (0, 3, 12, "Sin stock", None)[i % 5]])
+    st.append([None, None, None, 5])            # sin código: no cuenta
+    st.append(["resto", " ARS-9999 ", None, "con stock"])
+    wb.save(path)
+    return path
+
+
+@pytest.mark.parametrize("lector", ["openpyxl", "rapido"])
+def test_ars_hoja_stock_sin_encabezados_ni_dimension(ars_sin_encabezados, lector, monkeypatch):
+    monkeypatch.setattr(hc, "LECTOR_XLSX", lector)
+    regs = hc.extraer_fuente("ARS_Tech", ars_sin_encabezados)
+    assert len(regs) == 301
+    assert regs[0] == {"ID": "ARS-0001", "Stock": 2, "Precio": None, "Moneda": None}
+    assert regs[1] == {"ID": "ARS-0002", "Stock": 6, "Precio": None, "Moneda": None}
+    assert regs[2] == {"ID": "ARS-0003", "Stock": 0, "Precio": None, "Moneda": None}
+    assert regs[3] == {"ID": "ARS-0004", "Stock": None, "Precio": None, "Moneda": None}
+    assert regs[4] == {"ID": "ARS-0005", "Stock": 0, "Precio": None, "Moneda": None}
+    assert regs[-1] == {"ID": "ARS-9999", "Stock": 6, "Precio": None, "Moneda": None}
+    assert list(hc.registros_hoja1("ARS_Tech", regs)) == list(regs)   # ARS no espeja F/T
+    # antes: el loop hasta ws.max_row (None) no leía ninguna fila
+    assert _viejo_extra_stock(ars_sin_encabezados) == []
+
+
+def test_ars_base_del_repo_ahora_tiene_filas():
+    # La base versionada es de este tipo: antes salía vacía y ahora sale completa, así que la
+    # primera corrida después del deploy reporta toda la lista de ARS como "Nuevos modelos".
+    path = _DB / "ARS_Tech_DB.xlsx"
+    if not path.exists():
+        pytest.skip("no está ARS_Tech_DB.xlsx")
+    regs = hc.extraer_fuente("ARS_Tech", path)
+    assert len(regs) > 0 and _viejo_extra_stock(path) == []
+    assert len(set(regs.ids)) == len(regs.indice())
@@ -0,0 +1,61 @@
+# Fallbacks por posición (_registros_hoja_stock_ws / _registros_con_stock_ws) sobre una hoja
+# sintética de 50k filas sin encabezados ni <dimension> (como las que escribe write_only):
+# conteos exactos y una sola pasada por la hoja, sin ws.cell() (el patrón cuadrático de antes).
+import pytest
+from openpyxl import Workbook
+
+import hash_comparativo as hc
+
+N_FILAS = 50000
+
+
+@pytest.fixture(scope="module")
+def hoja_sin_encabezados(tmp_path_factory):
+    path = tmp_path_factory.mktemp("fallback") / "fallback.xlsx"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("STOCK")
+    ws.append(["x", "y"])  # fila 1 sin encabezados reconocibles
+    for i in range(N_FILAS):
+        ws.append([f"A{i}", f"B{i}", None, i % 7 or "Sin stock", None, None, None, i % 5])
+    wb.save(path)
+    return path
+
+
+class _HojaContada:
+    """Envuelve la hoja: cuenta pasadas de iter_rows y filas leídas; ws.cell() falla."""
+
+    def __init__(self, ws):
+        self._ws = ws
+        self.pasadas = 0
+        self.filas = 0
+
+    def iter_rows(self, **kw):
+        self.pasadas += 1
+        for row in self._ws.iter_rows(**kw):
+            self.filas += 1
+            yield row
+
+    def cell(self, *args, **kwargs):
+        raise AssertionError("el fallback no debe leer celda por celda")
+
+    def __getattr__(self, nombre):
+        return getattr(self._ws, nombre)
+
+
+@pytest.mark.parametrize("lector", ["openpyxl", "rapido"])
+@pytest.mark.parametrize("fallback, id_ultimo", [
+    (hc._registros_hoja_stock_ws, f"B{N_FILAS - 1}"),
+    (lambda ws: hc._registros_con_stock_ws(ws, fila_inicio=2, col_stock=8), f"A{N_FILAS - 1}"),
+], ids=["hoja_stock", "con_stock"])
+def test_fallback_una_pasada_y_conteo_exacto(hoja_sin_encabezados, lector, fallback, id_ultimo):
+    rb = hc.abrir_libro(hoja_sin_encabezados, lector)
+    try:
+        ws = _HojaContada(rb["STOCK"])
+        regs = fallback(ws)
+    finally:
+        rb.close()
+    assert len(regs) == N_FILAS
+    assert regs[-1]["ID"] == id_ultimo
+    # detectar_columnas (hasta 60 filas) + una única pasada por las filas de datos
+    assert ws.pasadas == 2
+    assert ws.filas <= 60 + N_FILAS
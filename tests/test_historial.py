@@ -0,0 +1,63 @@
+# Índice por SKU: vive en _cache/ (derivado del .jsonl), sin pickle, y se relee igual que se armó.
+import hash_comparativo as hc
+
+
+def _regs(filas):
+    r = hc.Registros()
+    for _id, st, pr in filas:
+        r.agregar(_id, st, pr, "USD")
+    return r
+
+
+def test_indice_sku_en_cache_sin_pickle_y_relectura_identica():
+    k = "T_series"
+    hc.registrar_version_historial(k, _regs([("A", 5, 10.0), ("B", None, None), ("Ñ-1", 1, 3.5)]), "a" * 64)
+    hc.registrar_version_historial(k, _regs([("A", 4, 12.0), ("Ñ-1", 1, 3.5)]), "b" * 64)
+
+    armado = hc.actualizar_indice_sku(k)
+    p = hc._series_path(k)
+    assert p.parent == hc.CACHE_DIR and p.exists()
+    assert p.read_bytes().startswith(hc._SERIES_MAGIC)
+
+    releido = hc._series_desde_bytes(p.read_bytes())
+    assert (releido["bytes"], releido["v"]) == (armado["bytes"], armado["v"]) == (armado["bytes"], 2)
+    assert list(releido["series"]) == list(armado["series"])
+    for _id, (ts, pr, st) in armado["series"].items():
+        r_ts, r_pr, r_st = releido["series"][_id]
+        assert list(r_ts) == list(ts) and list(r_st) == list(st)
+        assert [x if x == x else None for x in r_pr] == [x if x == x else None for x in pr]
+
+    assert [(pr, st) for _t, pr, st in hc.serie_sku(k, "A")] == [(10.0, 5), (12.0, 4)]
+    assert [(pr, st) for _t, pr, st in hc.serie_sku(k, "B")] == [(None, None), (None, hc._SKU_BAJA)]
+    assert [(pr, st) for _t, pr, st in hc.serie_sku(k, "Ñ-1")] == [(3.5, 1)]
+
+
+def test_indice_de_versiones_en_cache_y_se_rearma_si_falta():
+    k = "T_hist_idx"
+    for n in range(3):
+        hc.registrar_version_historial(k, _regs([("A", n, 10.0 + n)]), str(n) * 64)
+    p = hc._hist_idx_path(k)
+    assert p.parent == hc.CACHE_DIR and not list(hc.HIST_DIR.glob(f"{k}*.idx.json"))
+    versiones = hc.leer_indice_historial(k)
+    assert [v["v"] for v in versiones] == [1, 2, 3]
+
+    p.unlink()  # cache vacío (runner nuevo): se rearma desde el .jsonl
+    assert hc.leer_indice_historial(k) == versiones
+    assert hc.reconstruir_version(k, 2)["A"] == (11.0, "USD", 1)
+
+
+def test_cli_historial_argumentos(capsys):
+    k = "T_cli_hist"
+    hc.registrar_version_historial(k, _regs([("SKU1", 5, 10.0)]), "c" * 64)
+
+    # fuente justo después del ID (antes: ValueError por int("T_cli_hist"))
+    assert hc.cli_historial(["SKU1", k]) == 0
+    assert f"{k} · SKU1 (últimos 30 días)" in capsys.readouterr().out
+    for args in (["SKU1", "--dias", "7", k], ["SKU1", k, "--dias=7"], ["SKU1", "7", k]):
+        assert hc.cli_historial(args) == 0
+        assert "(últimos 7 días)" in capsys.readouterr().out
+
+    assert hc.cli_historial(["SKU2", k]) == 1
+    for args in ([], ["--dias", "7"], ["SKU1", "--dias", "x"], ["SKU1", "--dias=0"], ["SKU1", "--dias"]):
+        assert hc.cli_historial(args) == 2
+        assert "Uso: hash_comparativo.py historial" in capsys.readouterr().out
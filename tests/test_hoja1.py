@@ -0,0 +1,34 @@
+# Hoja 1: el digest de la última publicada sólo se guarda si la publicación salió bien.
+import hash_comparativo as hc
+
+
+def _regs():
+    r = hc.Registros()
+    r.agregar("X-1", 3, 10.0, "USD")
+    r.agregar("X-2", None, None, None)
+    return r
+
+
+def test_publicacion_fallida_no_guarda_digest_y_la_siguiente_reintenta(tmp_path, monkeypatch):
+    k = "T_hoja1"
+    path = tmp_path / f"{k}_20260301_100000.xlsx"
+    path.write_bytes(b"no se lee: extraer_fuente_cacheado va parcheado")
+    monkeypatch.setattr(hc, "HASH_CONTENIDO", False)
+    monkeypatch.setattr(hc, "decide_should_process", lambda *a, **kw: (True, "f" * 64))
+    monkeypatch.setattr(hc, "extraer_fuente_cacheado", lambda *a: _regs())
+    digest = hc.hoja1_sha256(hc.registros_hoja1(k, _regs()))
+
+    real = hc.publicar_archivo
+    def falla(src, dst):
+        if dst.parent == hc.PUBLIC_LISTAS_DIR:
+            raise OSError("disco lleno")
+        return real(src, dst)
+    monkeypatch.setattr(hc, "publicar_archivo", falla)
+    hc.run_fuente(k, path)
+    assert hc.read_prev_hoja1_hash(k) != digest
+    assert not (hc.PUBLIC_LISTAS_DIR / f"{path.stem}_ULTIMA.xlsx").exists()
+
+    monkeypatch.setattr(hc, "publicar_archivo", real)
+    hc.run_fuente(k, path)
+    assert hc.read_prev_hoja1_hash(k) == digest
+    assert (hc.PUBLIC_LISTAS_DIR / f"{path.stem}_ULTIMA.xlsx").exists()
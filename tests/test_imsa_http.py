@@ -0,0 +1,112 @@
+# IMSA por HTTP contra un IMSA falso local (http.server): página con iframe → form con token
+# oculto, #pass y submit Login → cookie de sesión → location.href a la descarga (403 sin cookie).
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+import hash_comparativo as hc
+
+CLAVE = "clave-de-prueba"
+
+
+@pytest.fixture(scope="module")
+def planilla(tmp_path_factory):
+    wb = hc.LibroXlsxRapido()
+    ws = wb.create_sheet("Hoja1")
+    ws.append(["Código", "Descripción", "Precio"])
+    ws.append(["X-1", "Producto", 123.45])
+    origen = tmp_path_factory.mktemp("imsa") / "lista.xlsx"
+    wb.save(origen)
+    return origen.read_bytes()
+
+
+@pytest.fixture(scope="module")
+def imsa_url(planilla):
+    class FakeImsa(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _html(self, cuerpo, cookie=None):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            if cookie:
+                self.send_header("Set-Cookie", cookie)
+            self.end_headers()
+            self.wfile.write(cuerpo.encode("utf-8"))
+
+        def _form(self):
+            self._html('<form method="post" action="login.php"><input type="hidden" name="token" value="t0k">'
+                       '<input type="password" id="pass" name="pass"><input type="submit" name="ok" value="Login">'
+                       '<input type="submit" name="otro" value="Cancelar"></form>')
+
+        def do_GET(self):
+            if self.path.startswith("/lista-de-precios/"):
+                self._html('<html><body><iframe src="/login.php"></iframe></body></html>')
+            elif self.path.startswith("/login.php"):
+                self._form()
+            elif self.path.startswith("/bucle.php"):
+                self._html("<script>window.location.href='bucle.php';</script>")
+            elif self.path.startswith("/descarga.php"):
+                if "sid=ok" not in (self.headers.get("Cookie") or ""):
+                    self.send_error(403)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Disposition", 'attachment; filename="ListaImsa.xlsx"')
+                self.send_header("Content-Length", str(len(planilla)))
+                self.end_headers()
+                self.wfile.write(planilla)
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            datos = parse_qs(self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode())
+            if (datos.get("pass") == [CLAVE] and datos.get("token") == ["t0k"]
+                    and datos.get("ok") == ["Login"] and "otro" not in datos):
+                self._html("<script>window.location.href='descarga.php?f=lista';</script>", "sid=ok; Path=/")
+            elif datos.get("pass") == ["bucle"]:
+                self._html("<script>window.location.href='bucle.php';</script>", "sid=ok; Path=/")
+            else:
+                self._form()
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FakeImsa)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}/lista-de-precios/"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_descarga_llega_byte_a_byte_con_su_hash(imsa_url, planilla):
+    p, sha = hc.descargar_imsa_http(imsa_url, CLAVE)
+    try:
+        assert p.read_bytes() == planilla
+        assert sha == hc.file_sha256(p)
+        assert not p.with_name(p.name + ".part").exists()
+    finally:
+        p.unlink()
+
+
+def test_clave_erronea_se_rechaza(imsa_url):
+    antes = set(hc.RUTA_DESCARGA.iterdir())
+    with pytest.raises(RuntimeError):
+        hc.descargar_imsa_http(imsa_url, "otra")
+    assert set(hc.RUTA_DESCARGA.iterdir()) == antes
+
+
+def test_saltos_agotados_cierran_todas_las_respuestas(imsa_url, monkeypatch):
+    respuestas = []
+    send = hc.requests.Session.send
+
+    def espia(self, req, **kw):
+        r = send(self, req, **kw)
+        respuestas.append(r)
+        return r
+
+    monkeypatch.setattr(hc.requests.Session, "send", espia)
+    with pytest.raises(RuntimeError, match="ninguna planilla"):
+        hc.descargar_imsa_http(imsa_url, "bucle")
+    bucle = [r for r in respuestas if "/bucle.php" in r.url]
+    assert len(bucle) == hc._SALTOS_IMSA
+    assert all(r.raw.closed for r in respuestas)
@@ -0,0 +1,40 @@
+# index.json incremental: upsert de nombres fijos que ya quedaron en una página archivada.
+import json
+
+import hash_comparativo as hc
+
+
+def _todos(dir_pub):
+    idx = json.loads((dir_pub / "index.json").read_text(encoding="utf-8"))
+    nombres = [it["name"] for it in idx["items"]]
+    for pagina in idx["paginas"]:
+        nombres += [it["name"] for it in json.loads((dir_pub / pagina).read_text(encoding="utf-8"))]
+    return idx, nombres
+
+
+def test_nombre_fijo_archivado_no_se_duplica_ni_se_cuenta_dos_veces(tmp_path, monkeypatch):
+    monkeypatch.setattr(hc, "INDICE_PUBLICO_MAX", 4)
+    dir_pub = tmp_path / "public_listas"
+    dir_pub.mkdir()
+
+    def publicar(nombre):
+        (dir_pub / nombre).write_bytes(b"x")
+        hc.publicar_en_indice(dir_pub, dir_pub / nombre, fuente="IMSA")
+
+    publicar("ListaImsa_ULTIMA.xlsx")
+    for h in range(10):
+        publicar(f"Tevelam_20260301_{h:02d}0000_ULTIMA.xlsx")
+    idx, nombres = _todos(dir_pub)
+    assert "ListaImsa_ULTIMA.xlsx" not in [it["name"] for it in idx["items"]]   # quedó archivado
+    assert idx["total"] == len(nombres) == 11
+
+    publicar("ListaImsa_ULTIMA.xlsx")
+    idx, nombres = _todos(dir_pub)
+    assert idx["items"][0]["name"] == "ListaImsa_ULTIMA.xlsx"
+    assert nombres.count("ListaImsa_ULTIMA.xlsx") == 1
+    assert idx["total"] == len(nombres) == 11
+
+    # y quitar_de_indice sigue limpiando cabecera + páginas
+    assert hc.quitar_de_indice(dir_pub, {"ListaImsa_ULTIMA.xlsx", "Tevelam_20260301_000000_ULTIMA.xlsx"}) == 2
+    idx, nombres = _todos(dir_pub)
+    assert idx["total"] == len(nombres) == 9
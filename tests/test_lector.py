@@ -0,0 +1,76 @@
+import zipfile
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+
+import hash_comparativo as hc
+
+_NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+_REPO = Path(__file__).resolve().parents[1]
+# Planillas reales de proveedores versionadas en el repo (bases y Hojas 1 publicadas)
+_LIBROS_REPO = sorted(_REPO.glob("_db/*.xlsx")) + sorted(_REPO.glob("public_listas/*.xlsx"))
+
+
+def _xlsx_crudo(path, sheet_xml: str):
+    """Libro mínimo con el XML de la hoja tal cual (para probar variantes que openpyxl no escribe)."""
+    wb = hc.LibroXlsxRapido()
+    wb.create_sheet("Hoja1").append(["x"])
+    wb.save(path)
+    with zipfile.ZipFile(path) as z:
+        partes = {n: z.read(n) for n in z.namelist()}
+    partes["xl/worksheets/sheet1.xml"] = sheet_xml.encode("utf-8")
+    with zipfile.ZipFile(path, "w") as z:
+        for n, data in partes.items():
+            z.writestr(n, data)
+    return path
+
+
+def _valores(path, lector):
+    if lector == "openpyxl":
+        wb = load_workbook(path, read_only=True, data_only=True)
+    else:
+        wb = hc.LibroRapido(path)
+    try:
+        return [tuple(r) for ws in wb.worksheets for r in ws.iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+def test_atributos_en_v_y_c_no_pierden_valores(tmp_path):
+    # <v xml:space="preserve"> y atributos extra en <c>: mismo valor que openpyxl
+    filas = "".join(f'<row r="{i}"><c r="A{i}" t="inlineStr"><is><t>X{i}</t></is></c>'
+                    f'<c r="B{i}"><v>{i}</v></c></row>' for i in range(1, 4))
+    filas += ('<row r="4"><c r="A4" t="inlineStr"><is><t>X4</t></is></c>'
+              '<c r="B4" s="0" xml:space="preserve"><v xml:space="preserve">11</v></c></row>')
+    filas += '<row r="5"><c r="A5" t="inlineStr"><is><t>X5</t></is></c><c r="B5"><v>5</v></c></row>'
+    p = _xlsx_crudo(tmp_path / "attrs.xlsx", f'<worksheet {_NS}><sheetData>{filas}</sheetData></worksheet>')
+    esperado = _valores(p, "openpyxl")
+    assert esperado[3] == ("X4", 11)
+    assert _valores(p, "rapido") == esperado
+
+
+def test_igual_a_openpyxl_en_libro_normal(tmp_path):
+    wb = hc.LibroXlsxRapido()
+    ws = wb.create_sheet("Hoja 1")
+    ws.append(["ID", "Stock", "Precio", "Moneda"])
+    for i in range(500):
+        ws.append([f"SKU{i}", i % 7 or None, (i * 1.25) if i % 3 else None, "USD" if i % 2 else "$"])
+    p = tmp_path / "normal.xlsx"
+    wb.save(p)
+    esperado = _valores(p, "openpyxl")
+    assert _valores(p, "rapido") == esperado
+
+
+@pytest.mark.parametrize("path", _LIBROS_REPO, ids=lambda p: f"{p.parent.name}/{p.name}")
+def test_igual_a_openpyxl_en_planillas_del_repo(path):
+    esperado = _valores(path, "openpyxl")
+    assert esperado
+    assert _valores(path, "rapido") == esperado
+
+
+@pytest.mark.skipif(not _LIBROS_REPO, reason="no hay planillas en el repo")
+def test_bench_compara_rapido_con_openpyxl():
+    (r,) = hc.bench_lectores(_LIBROS_REPO[:1], repeticiones=1)
+    assert r["identico"] and r["filas"] > 0
+    assert {k for k in r if k.endswith("_filas_seg")} == {"openpyxl_filas_seg", "rapido_filas_seg"}
@@ -0,0 +1,105 @@
+# publicar_archivo: hardlink en el mismo filesystem; si el enlace falla (otro dispositivo, permisos)
+# cae a reflink y después a copia, siempre vía temporal + os.replace y validando el tamaño.
+import errno
+import os
+import shutil
+
+import pytest
+
+import hash_comparativo as hc
+
+
+@pytest.fixture
+def origen(tmp_path, monkeypatch):
+    monkeypatch.setattr(hc, "PUBLICAR_MODO", "enlace")
+    src = tmp_path / "src" / "lista.xlsx"
+    src.parent.mkdir()
+    src.write_bytes(os.urandom(300_000))
+    pub = tmp_path / "pub"
+    pub.mkdir()
+    return src, pub
+
+
+def _sin_temporales(pub):
+    return not [p for p in pub.iterdir() if p.name.endswith(".tmp")]
+
+
+def test_mismo_filesystem_es_hardlink(origen):
+    src, pub = origen
+    dst = hc.publicar_archivo(src, pub / "lista.xlsx")
+    assert os.path.samefile(src, dst) and dst.read_bytes() == src.read_bytes()
+    assert _sin_temporales(pub)
+
+
+@pytest.mark.parametrize("falla", [errno.EXDEV, errno.EPERM, errno.EMLINK])
+def test_enlace_fallido_cae_a_reflink_y_copia(origen, monkeypatch, falla):
+    src, pub = origen
+    intentos = []
+
+    def link(a, b):
+        intentos.append("link")
+        raise OSError(falla, os.strerror(falla))
+
+    def reflink(a, b):
+        intentos.append("reflink")
+        return False
+
+    monkeypatch.setattr(hc.os, "link", link)
+    monkeypatch.setattr(hc, "_reflink", reflink)
+    dst = hc.publicar_archivo(src, pub / "lista.xlsx")
+    assert intentos == ["link", "reflink"]
+    assert not os.path.samefile(src, dst) and dst.read_bytes() == src.read_bytes()
+    assert _sin_temporales(pub)
+
+
+def test_otro_dispositivo_con_reflink_real(origen, monkeypatch):
+    # FICLONE real: en tmpfs/ext4 falla y deja el terreno limpio para la copia; en btrfs/xfs clona
+    src, pub = origen
+
+    def link(a, b):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(hc.os, "link", link)
+    dst = hc.publicar_archivo(src, pub / "lista.xlsx")
+    assert not os.path.samefile(src, dst) and dst.read_bytes() == src.read_bytes()
+    assert _sin_temporales(pub)
+
+
+def test_modo_copia_no_enlaza(origen, monkeypatch):
+    src, pub = origen
+    monkeypatch.setattr(hc, "PUBLICAR_MODO", "copia")
+    monkeypatch.setattr(hc.os, "link", lambda a, b: pytest.fail("no debería enlazar"))
+    monkeypatch.setattr(hc, "_reflink", lambda a, b: pytest.fail("no debería clonar"))
+    dst = hc.publicar_archivo(src, pub / "lista.xlsx")
+    assert not os.path.samefile(src, dst) and dst.read_bytes() == src.read_bytes()
+
+
+def test_copia_incompleta_no_pisa_lo_publicado(origen, monkeypatch):
+    src, pub = origen
+    dst = pub / "lista.xlsx"
+    dst.write_bytes(b"version anterior")
+    monkeypatch.setattr(hc, "PUBLICAR_MODO", "copia")
+
+    def copia_cortada(a, b):
+        with open(a, "rb") as fi, open(b, "wb") as fo:
+            fo.write(fi.read(1000))
+
+    monkeypatch.setattr(hc.shutil, "copyfile", copia_cortada)
+    with pytest.raises(OSError, match="copia incompleta"):
+        hc.publicar_archivo(src, dst)
+    assert dst.read_bytes() == b"version anterior"
+    assert _sin_temporales(pub)
+
+
+def test_republicar_no_modifica_la_copia_anterior(origen):
+    # con hardlink el destino comparte inodo: la versión nueva del origen llega por tmp + replace
+    src, pub = origen
+    viejo = src.read_bytes()
+    dst = hc.publicar_archivo(src, pub / "lista.xlsx")
+    guardada = pub / "guardada.xlsx"
+    os.link(dst, guardada)
+    nuevo = src.with_name("nuevo.xlsx")
+    nuevo.write_bytes(b"otra lista")
+    shutil.move(nuevo, src)
+    hc.publicar_archivo(src, dst)
+    assert dst.read_bytes() == b"otra lista" and guardada.read_bytes() == viejo
@@ -0,0 +1,106 @@
+# ReporteCambios en streaming: contadores y sumas del Resumen, líneas JSONL, contenido del csv.gz
+# y hojas del xlsx salen de la misma pasada sobre iterar_diffs, y sin cambios no se escribe nada.
+import csv
+import gzip
+import json
+
+import pytest
+from openpyxl import load_workbook
+
+import hash_comparativo as hc
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    for nombre in ("REPORTS_DIR", "PUBLIC_REPORTS_DIR"):
+        d = tmp_path / nombre.lower()
+        d.mkdir()
+        monkeypatch.setattr(hc, nombre, d)
+    monkeypatch.setattr(hc, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(hc, "DIFF_SALIDAS", ["jsonl", "csv.gz"])
+    return tmp_path
+
+
+PREV = {
+    "A": {"Precio": 10.0, "Moneda": "USD"},   # sube
+    "B": {"Precio": 20.0, "Moneda": "USD"},   # baja
+    "C": {"Precio": 0.0, "Moneda": "ARS"},    # sube desde 0 → Δ% vacío
+    "D": {"Precio": 5.0, "Moneda": "USD"},    # eliminado
+    "E": {"Precio": 7.0, "Moneda": "USD"},    # igual
+    "F": {"Precio": None, "Moneda": None},    # sin precio antes → no es cambio
+}
+
+
+def _actual():
+    r = hc.Registros()
+    for _id, pr, mon in (("A", 12.5, "USD"), ("B", 15.0, "USD"), ("C", 3.0, None), ("E", 7.0, "USD"),
+                         ("F", 9.0, "USD"), ("Ñ-1", 4.0, "USD")):
+        r.agregar(_id, 1, pr, mon)
+    return r
+
+
+ESPERADO = [
+    ("sube", "A", "USD", 10.0, 12.5, 2.5, 25.0),
+    ("baja", "B", "USD", 20.0, 15.0, -5.0, -25.0),
+    ("sube", "C", "ARS", 0.0, 3.0, 3.0, None),
+    ("eliminado", "D", "USD", 5.0, None, None, None),
+    ("nuevo", "Ñ-1", "USD", None, 4.0, None, None),
+]
+
+
+def test_reporte_en_streaming(dirs):
+    rep = hc.ReporteCambios("T_rep").consumir(hc.iterar_diffs(PREV, _actual()))
+    assert rep.cantidades == [2, 1, 1, 1]
+    out = rep.cerrar()
+    assert out.parent == hc.REPORTS_DIR and out.name.startswith("T_rep_DIFF_")
+    stem = out.name[:-len(".xlsx")]
+    assert not list(hc.REPORTS_DIR.glob("*.tmp"))
+
+    lineas = (hc.REPORTS_DIR / f"{stem}.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(x) for x in lineas] == [dict(zip(hc.CAMPOS_DIFF, e)) for e in ESPERADO]
+    assert '"Ñ-1"' in lineas[-1]   # sin escapar
+
+    with gzip.open(hc.REPORTS_DIR / f"{stem}.csv.gz", "rt", encoding="utf-8", newline="") as f:
+        filas = list(csv.reader(f))
+    assert filas[0] == list(hc.CAMPOS_DIFF)
+    assert filas[1:] == [["" if v is None else str(v) for v in e] for e in ESPERADO]
+
+    wb = load_workbook(out, read_only=True)
+    try:
+        assert wb.sheetnames == ["Resumen", *hc._HOJAS_DIFF]
+        hojas = {t: [list(f) for f in wb[t].iter_rows(values_only=True)] for t in hc._HOJAS_DIFF}
+        resumen = dict(f[:2] for f in wb["Resumen"].iter_rows(values_only=True) if f and f[0])
+    finally:
+        wb.close()
+    assert hojas["Precios ↑"] == [hc._ENCABEZADOS_DIFF[0], ["A", "USD", 10, 12.5, 2.5, 25],
+                                  ["C", "ARS", 0, 3, 3]]   # Δ% vacío: la celda no se escribe
+    assert hojas["Precios ↓"] == [hc._ENCABEZADOS_DIFF[1], ["B", "USD", 20, 15, -5, -25]]
+    assert hojas["Nuevos modelos"] == [hc._ENCABEZADOS_DIFF[2], ["Ñ-1", "USD", 4]]
+    assert hojas["Modelos eliminados"] == [hc._ENCABEZADOS_DIFF[3], ["D", "USD", 5]]
+    assert resumen["Fuente"] == "T_rep"
+    assert (resumen["Precios ↑ (cantidad)"], resumen["Suma Δ ↑"]) == (2, 5.5)
+    assert (resumen["Precios ↓ (cantidad)"], resumen["Suma Δ ↓"]) == (1, -5)
+    assert (resumen["Nuevos modelos"], resumen["Modelos eliminados"]) == (1, 1)
+
+    # copia pública de las tres salidas, con las alternativas en el índice
+    assert {p.name for p in hc.PUBLIC_REPORTS_DIR.glob(f"{stem}.*")} == {
+        f"{stem}.xlsx", f"{stem}.jsonl", f"{stem}.csv.gz"}
+    idx = json.loads((hc.PUBLIC_REPORTS_DIR / "index.json").read_text(encoding="utf-8"))
+    assert idx["items"][0]["alternativas"] == {"jsonl": f"{hc.PUBLIC_REPORTS_DIR.name}/{stem}.jsonl",
+                                               "csv.gz": f"{hc.PUBLIC_REPORTS_DIR.name}/{stem}.csv.gz"}
+    assert (dirs / "CHANGES_FLAG").read_text() == "1"
+
+
+def test_sin_cambios_no_escribe_nada(dirs):
+    prev = {"E": {"Precio": 7.0, "Moneda": "USD"}}
+    r = hc.Registros()
+    r.agregar("E", 3, 7.0, "USD")
+    rep = hc.ReporteCambios("T_rep_vacio").consumir(hc.iterar_diffs(prev, r))
+    assert rep.cerrar() is None
+    assert not any(hc.REPORTS_DIR.iterdir()) and not (dirs / "CHANGES_FLAG").exists()
+
+
+def test_salidas_configurables(dirs, monkeypatch):
+    monkeypatch.setattr(hc, "DIFF_SALIDAS", [])
+    out = hc.ReporteCambios("T_rep_xlsx").consumir(hc.iterar_diffs(PREV, _actual())).cerrar()
+    assert [p.name for p in hc.REPORTS_DIR.iterdir()] == [out.name]
@@ -0,0 +1,147 @@
+# Retención: qué artefactos salen según la política y cómo se archivan (zip por corrida, retomable).
+import os
+import zipfile
+from datetime import datetime, timedelta
+
+import pytest
+
+import hash_comparativo as hc
+
+
+def _artefacto(carpeta, serie, cuando, tam=10, extras=()):
+    t = cuando.strftime("%Y%m%d_%H%M%S")
+    archivos = [carpeta / f"{serie}_{t}.xlsx"] + [carpeta / f"{serie}_{t}{x}" for x in extras]
+    for p in archivos:
+        p.write_bytes(os.urandom(tam))
+    return t
+
+
+def _salen(carpeta, **politica):
+    base = {"ultimos": 0, "diarios": 0, "semanales": 0, "max_mb": 0}
+    base.update(politica)
+    return [(serie, t) for serie, t, _ in hc.planificar_retencion(carpeta, base)]
+
+
+@pytest.fixture
+def carpeta(tmp_path):
+    c = tmp_path / "downloads"
+    c.mkdir()
+    return c
+
+
+def test_ultimos_por_serie_y_nunca_el_mas_nuevo(carpeta):
+    t0 = datetime(2026, 3, 2, 10)
+    a = [_artefacto(carpeta, "A", t0 + timedelta(hours=h)) for h in range(4)]
+    b = [_artefacto(carpeta, "B", t0 + timedelta(hours=h)) for h in range(1)]
+    (carpeta / "index.json").write_text("{}")          # sin timestamp: nunca se toca
+    (carpeta / "A_ULTIMA.xlsx").write_bytes(b"x")
+    assert _salen(carpeta, ultimos=2) == [("A", a[0]), ("A", a[1])]
+    # ultimos=0 igual conserva el más nuevo de cada serie
+    assert _salen(carpeta) == [("A", a[0]), ("A", a[1]), ("A", a[2])]
+    assert ("B", b[0]) not in _salen(carpeta)
+
+
+def test_archivos_de_la_misma_corrida_salen_juntos(carpeta):
+    t0 = datetime(2026, 3, 2, 10)
+    viejo = _artefacto(carpeta, "A", t0, extras=(".jsonl", ".csv.gz"))
+    _artefacto(carpeta, "A", t0 + timedelta(hours=1))
+    (plan,) = hc.planificar_retencion(carpeta, {"ultimos": 1})
+    assert plan[:2] == ("A", viejo)
+    assert sorted(p.name for p in plan[2]) == sorted(f"A_{viejo}{x}" for x in (".csv.gz", ".jsonl", ".xlsx"))
+
+
+def test_diarios_y_semanales_conservan_el_mas_nuevo_de_cada_dia_y_semana(carpeta):
+    # lunes 2026-03-02 … domingo 2026-03-15, dos por día (09 y 18 h)
+    dias = [datetime(2026, 3, 2) + timedelta(days=d) for d in range(14)]
+    ts_ = {(d.date(), h): _artefacto(carpeta, "A", d + timedelta(hours=h)) for d in dias for h in (9, 18)}
+    salen = {t for _, t in _salen(carpeta, ultimos=1, diarios=3)}
+    quedan = {t for t in ts_.values()} - salen
+    assert quedan == {ts_[(d.date(), 18)] for d in dias[-3:]}
+
+    salen = {t for _, t in _salen(carpeta, ultimos=1, semanales=2)}
+    quedan = {t for t in ts_.values()} - salen
+    # el último de cada una de las 2 semanas ISO más nuevas: domingos 08 y 15
+    assert quedan == {ts_[(dias[6].date(), 18)], ts_[(dias[13].date(), 18)]}
+
+
+def test_max_mb_saca_los_conservados_mas_viejos_pero_no_el_ultimo_de_cada_serie(carpeta):
+    t0 = datetime(2026, 3, 2, 10)
+    mb = 1024 * 1024
+    a = [_artefacto(carpeta, "A", t0 + timedelta(hours=h), tam=mb) for h in range(3)]
+    b = _artefacto(carpeta, "B", t0 - timedelta(days=1), tam=mb)    # el más viejo, pero único de su serie
+    assert _salen(carpeta, ultimos=10, max_mb=2) == [("A", a[0]), ("A", a[1])]
+    assert ("B", b) not in _salen(carpeta, ultimos=10, max_mb=0.5)
+
+
+@pytest.fixture
+def archivo(tmp_path, monkeypatch):
+    d = tmp_path / "_archivo"
+    monkeypatch.setattr(hc, "ARCHIVO_DIR", d)
+    return d / "downloads"
+
+
+def _plan(carpeta):
+    return hc.planificar_retencion(carpeta, {"ultimos": 1})
+
+
+def _contenido(archivo):
+    out = {}
+    for zp in sorted(archivo.glob("*.zip")):
+        with zipfile.ZipFile(zp) as z:
+            for zi in z.infolist():
+                assert zi.compress_type == zipfile.ZIP_STORED
+                out[zi.filename] = z.read(zi)
+    return out
+
+
+def test_archivar_escribe_un_zip_por_corrida_sin_reescribir_los_anteriores(carpeta, archivo):
+    t0 = datetime(2026, 3, 2, 10)
+    _artefacto(carpeta, "A", t0)
+    _artefacto(carpeta, "A", t0 + timedelta(hours=1))
+    datos = {p.name: p.read_bytes() for _, _, ps in _plan(carpeta) for p in ps}
+    primero = hc._archivar_mes(carpeta, "2026-03", _plan(carpeta))
+    antes = (primero.stat().st_mtime_ns, primero.read_bytes())
+
+    _artefacto(carpeta, "A", t0 + timedelta(hours=2))
+    datos.update({p.name: p.read_bytes() for _, _, ps in _plan(carpeta) for p in ps})
+    segundo = hc._archivar_mes(carpeta, "2026-03", _plan(carpeta))
+
+    assert segundo != primero and (primero.stat().st_mtime_ns, primero.read_bytes()) == antes
+    assert _contenido(archivo) == datos
+    assert [p.name for p in carpeta.iterdir()] == [f"A_{(t0 + timedelta(hours=2)):%Y%m%d_%H%M%S}.xlsx"]
+    assert primero.with_suffix(".index.json").exists() and segundo.with_suffix(".index.json").exists()
+
+
+def test_archivar_retoma_una_corrida_cortada(carpeta, archivo, monkeypatch):
+    t0 = datetime(2026, 3, 2, 10)
+    for h in range(4):
+        _artefacto(carpeta, "A", t0 + timedelta(hours=h))
+    plan = _plan(carpeta)
+    datos = {p.name: p.read_bytes() for _, _, ps in plan for p in ps}
+
+    # 1) se corta después de escribir el zip, antes de borrar los originales
+    real_unlink = type(carpeta).unlink
+    def corte(self, *a, **k):
+        if self.parent == carpeta:
+            raise KeyboardInterrupt
+        return real_unlink(self, *a, **k)
+    monkeypatch.setattr(type(carpeta), "unlink", corte)
+    with pytest.raises(KeyboardInterrupt):
+        hc._archivar_mes(carpeta, "2026-03", plan[:2])
+    monkeypatch.undo()
+    monkeypatch.setattr(hc, "ARCHIVO_DIR", archivo.parent)
+
+    # 2) un zip a medio escribir de otra corrida cortada
+    (archivo / "downloads_2026-03_19990101_000000.zip.tmp").write_bytes(b"basura")
+
+    # la corrida siguiente: no duplica lo ya archivado, archiva el resto y borra todo
+    zp = hc._archivar_mes(carpeta, "2026-03", _plan(carpeta))
+    with zipfile.ZipFile(zp) as z:
+        assert sorted(z.namelist()) == sorted(p.name for _, _, ps in plan[2:] for p in ps)
+    assert _contenido(archivo) == datos
+    assert not list(archivo.glob("*.tmp"))
+    assert len(list(carpeta.iterdir())) == 1
+
+    # y si ya estaba todo archivado, no escribe otro zip
+    assert hc._archivar_mes(carpeta, "2026-03", []) is None
+    assert len(list(archivo.glob("*.zip"))) == 2
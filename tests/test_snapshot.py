@@ -0,0 +1,129 @@
+# Snapshot binario sin NumPy: escribir → mmap → búsquedas → export/import CSV (ida y vuelta).
+import csv
+
+import pytest
+
+import hash_comparativo as hc
+
+
+@pytest.fixture
+def snap_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(hc, "SNAP_DIR", tmp_path)
+    return tmp_path
+
+
+def _regs():
+    r = hc.Registros()
+    r.agregar("B-2", 6, 20.5, "USD")
+    r.agregar("A-1", 0, None, "ARS")
+    r.agregar("ñandú", 2, 3.25, None)
+    r.agregar("C-3", None, 7.0, "USD")
+    r.agregar("B-2", 2, 21.0, "USD")     # repetido: gana el último
+    return r
+
+
+ESPERADO = {
+    "A-1": {"Precio": None, "Moneda": "ARS"},
+    "B-2": {"Precio": 21.0, "Moneda": "USD"},
+    "C-3": {"Precio": 7.0, "Moneda": "USD"},
+    "ñandú": {"Precio": 3.25, "Moneda": None},
+}
+
+
+def test_binario_mmap_busquedas(tmp_path):
+    p = tmp_path / "s.bin"
+    assert hc.escribir_snapshot_bin(p, ((i, pr, mo) for i, _st, pr, mo in _regs().filas())) == 4
+    snap = hc.SnapshotBinario(p)
+    try:
+        # búsqueda binaria sobre el heap, antes de decodificar los IDs
+        assert snap.posicion("C-3") == 2 and snap._ids is None
+        assert snap.posicion("B-1") is None and snap.posicion("zzz") is None and snap.posicion("") is None
+        assert snap.claves() == ["A-1", "B-2", "C-3", "ñandú"]
+        # y con los IDs ya decodificados (bisect)
+        assert [snap.posicion(k) for k in ESPERADO] == [0, 1, 2, 3]
+        assert snap.posicion("B-1") is None
+        assert len(snap) == 4 and dict(snap) == ESPERADO
+        with pytest.raises(KeyError):
+            snap["no-está"]
+    finally:
+        snap.cerrar()
+
+
+def test_vacio_y_basura(tmp_path):
+    p = tmp_path / "vacio.bin"
+    hc.escribir_snapshot_bin(p, [])
+    snap = hc.SnapshotBinario(p)
+    try:
+        assert len(snap) == 0 and snap.claves() == [] and snap.posicion("x") is None
+    finally:
+        snap.cerrar()
+    (tmp_path / "basura.bin").write_bytes(b"no es un snapshot, pero tiene largo suficiente")
+    with pytest.raises(ValueError):
+        hc.SnapshotBinario(tmp_path / "basura.bin")
+
+
+def test_ida_y_vuelta_binario_csv(snap_dir, monkeypatch):
+    k = "T_snap"
+    monkeypatch.setattr(hc, "SNAPSHOT_CSV", False)
+    hc.guardar_snapshot(k, _regs())
+    snap = hc.cargar_snapshot(k)
+    try:
+        assert isinstance(snap, hc.SnapshotBinario) and dict(snap) == ESPERADO
+    finally:
+        hc.cerrar_snapshot(snap)
+
+    # export al CSV de siempre
+    out = hc.exportar_snapshot_csv(k)
+    with out.open(newline="", encoding="utf-8") as f:
+        filas = list(csv.reader(f))
+    assert filas == [["ID", "Precio", "Moneda"], ["A-1", "", "ARS"], ["B-2", "21.0", "USD"],
+                     ["C-3", "7.0", "USD"], ["ñandú", "3.25", ""]]
+
+    # sin .bin, cargar_snapshot cae al CSV (dict) con los mismos valores
+    hc._snap_bin_path(k).unlink()
+    assert hc.cargar_snapshot(k) == ESPERADO
+    assert hc.exportar_snapshot_csv(k) is None
+
+    # y snapshot-convertir arma el .bin de nuevo desde el CSV
+    assert hc.convertir_snapshots_csv() == [k]
+    snap = hc.cargar_snapshot(k)
+    try:
+        assert isinstance(snap, hc.SnapshotBinario) and dict(snap) == ESPERADO
+    finally:
+        hc.cerrar_snapshot(snap)
+
+    # el próximo guardar_snapshot deja sólo el .bin (o exporta el CSV con SNAPSHOT_CSV)
+    hc.guardar_snapshot(k, _regs())
+    assert not hc._snap_path(k).exists()
+    monkeypatch.setattr(hc, "SNAPSHOT_CSV", True)
+    hc.guardar_snapshot(k, _regs())
+    assert hc._cargar_snapshot_csv(hc._snap_path(k)) == ESPERADO
+
+
+def test_binario_ilegible_cae_al_csv(snap_dir):
+    k = "T_snap_roto"
+    hc._snap_bin_path(k).write_bytes(b"\0" * 64)
+    assert hc.cargar_snapshot(k) == {}
+    with hc._snap_path(k).open("w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows([["ID", "Precio", "Moneda"], ["X", "1.5", "USD"]])
+    assert hc.cargar_snapshot(k) == {"X": {"Precio": 1.5, "Moneda": "USD"}}
+
+
+def test_diff_sin_numpy_contra_el_binario(snap_dir, monkeypatch):
+    monkeypatch.setattr(hc, "DIFF_NUMPY", "false")
+    k = "T_snap_diff"
+    hc.guardar_snapshot(k, _regs())
+    actual = hc.Registros()
+    actual.agregar("A-1", 0, 5.0, "ARS")      # antes sin precio: no cuenta como cambio
+    actual.agregar("B-2", 2, 19.0, None)      # baja; moneda del snapshot previo
+    actual.agregar("D-4", 6, 1.0, "USD")      # nuevo
+    actual.agregar("ñandú", 2, 3.25, None)    # igual
+    snap = hc.cargar_snapshot(k)
+    try:
+        assert list(hc.iterar_diffs(snap, actual)) == [
+            (hc.DIFF_BAJA, ["B-2", "USD", 21.0, 19.0, -2.0, -2.0 / 21.0 * 100.0]),
+            (hc.DIFF_ELIMINADO, ["C-3", "USD", 7.0]),
+            (hc.DIFF_NUEVO, ["D-4", "USD", 1.0]),
+        ]
+    finally:
+        hc.cerrar_snapshot(snap)
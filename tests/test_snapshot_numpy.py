@@ -0,0 +1,86 @@
+# Snapshot binario + NumPy: cerrar() libera el mmap aunque el diff haya tomado vistas, y el diff
+# vectorizado da las mismas filas y en el mismo orden que el camino Python.
+import pytest
+
+import hash_comparativo as hc
+
+np = pytest.importorskip("numpy")  # opcional: sin NumPy el diff va por el camino Python
+
+
+def _snapshot(tmp_path, n=200):
+    p = tmp_path / "s.bin"
+    hc.escribir_snapshot_bin(p, ((f"ID{i:04d}", float(i), "USD") for i in range(n)))
+    return p
+
+
+def _regs(n=200):
+    r = hc.Registros()
+    for i in range(1, n + 1):
+        r.agregar(f"ID{i:04d}", 1, float(i) + (i % 3), "USD")
+    return r
+
+
+def test_cerrar_a_mitad_del_diff_numpy_libera_el_mmap(tmp_path, capsys):
+    snap = hc.SnapshotBinario(_snapshot(tmp_path))
+    mm = snap._mm
+    gen = hc._iterar_diffs_np(snap, _regs())
+    primero = next(gen)  # generador a medias: su frame sigue vivo
+    assert primero == (hc.DIFF_ELIMINADO, ["ID0000", "USD", 0.0])
+    snap.cerrar()
+    assert mm.closed
+    assert "quedan vistas en uso" not in capsys.readouterr().out
+    gen.close()
+
+
+def test_cerrar_con_vista_ajena_viva_avisa_y_no_revienta(tmp_path, capsys):
+    snap = hc.SnapshotBinario(_snapshot(tmp_path))
+    mm = snap._mm
+    vista = np.frombuffer(snap._precios, dtype=np.float64)
+    snap.cerrar()
+    assert not mm.closed
+    assert "quedan vistas en uso" in capsys.readouterr().out
+    del vista
+    mm.close()
+
+
+def _caso_diff(tmp_path):
+    # precios previos: 0, None, iguales, suben, bajan, eliminados; actuales: nuevos y sin precio
+    prev = {f"ID{i:04d}": (float(i % 5), "USD") for i in range(300)}
+    prev["ID0007"] = (None, "USD")             # sin precio antes
+    prev["ID0010"] = (0.0, "ARS")              # p_old == 0 → Δ% None
+    prev["Z-solo-prev"] = (9.0, "USD")         # eliminado, ordena después de los actuales
+    regs = hc.Registros()
+    for i in range(5, 320):                    # 0..4 eliminados, 300..319 nuevos
+        _id = f"ID{i:04d}"
+        if i == 12:
+            regs.agregar(_id, 1, None, None)   # sin precio ahora
+        elif i % 3 == 0:
+            regs.agregar(_id, 1, float(i % 5) + 2.5, None if i % 2 else "EUR")
+        elif i % 3 == 1:
+            regs.agregar(_id, 1, float(i % 5) - 1.0, "USD")
+        else:
+            regs.agregar(_id, 1, float(i % 5), "USD")
+    regs.agregar("A-nuevo", 1, 3.0, "USD")     # nuevo, ordena antes que todo
+    p = tmp_path / "prev.bin"
+    hc.escribir_snapshot_bin(p, ((k, pr, mo) for k, (pr, mo) in prev.items()))
+    dict_prev = {k: {"Precio": pr, "Moneda": mo} for k, (pr, mo) in reversed(list(prev.items()))}
+    return p, dict_prev, regs
+
+
+def test_diff_numpy_mismas_filas_y_mismo_orden_que_python(tmp_path):
+    p, dict_prev, regs = _caso_diff(tmp_path)
+    snap = hc.SnapshotBinario(p)
+    try:
+        esperado = list(hc._iterar_diffs_py(snap, regs))
+        assert list(hc._iterar_diffs_np(snap, regs)) == esperado
+        assert list(hc._iterar_diffs_py(dict_prev, regs)) == esperado
+        assert list(hc._iterar_diffs_np(dict_prev, regs)) == esperado
+    finally:
+        snap.cerrar()
+
+    ids = [fila[0] for _, fila in esperado]
+    assert ids == sorted(ids) and ids[0] == "A-nuevo" and ids[-1] == "Z-solo-prev"
+    por_id = {fila[0]: (cat, fila) for cat, fila in esperado}
+    assert por_id["ID0010"] == (hc.DIFF_BAJA, ["ID0010", "USD", 0.0, -1.0, -1.0, None])
+    assert "ID0007" not in por_id and "ID0012" not in por_id
+    assert {cat for cat, _ in esperado} == {hc.DIFF_SUBE, hc.DIFF_BAJA, hc.DIFF_NUEVO, hc.DIFF_ELIMINADO}